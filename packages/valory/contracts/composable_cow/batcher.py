@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2023 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""This module contains the batching of JSON-RPC requests."""
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from requests.exceptions import HTTPError
+from web3 import HTTPProvider
+
+from packages.valory.contracts.composable_cow.sweep import (
+    JsonRpcError,
+    SweepContext,
+    SweepTimeout,
+    post_json_rpc,
+)
+
+
+# the errors with which providers reject requests because of their limits
+JSON_RPC_LIMIT_ERROR_CODES = (-32005, 429)
+# the http statuses with which providers reject a batch that is too large
+BATCH_REJECTED_STATUS_CODES = (413, 429)
+
+
+def is_batch_rejected(error: Exception) -> bool:
+    """Check whether a batch failed because of its size or its response, rather than because of the endpoint."""
+    if isinstance(error, HTTPError):
+        return (
+            error.response is not None
+            and error.response.status_code in BATCH_REJECTED_STATUS_CODES
+        )
+    # e.g. a batch answered with a single error, or a response that is not JSON
+    return isinstance(error, (JsonRpcError, ValueError))
+
+
+class JsonRpcBatcher:
+    """
+    Sends JSON-RPC requests as batch arrays to an HTTP provider.
+
+    Providers cap batch sizes, either by rejecting the whole batch or by failing
+    or dropping part of it. The batcher learns the size each endpoint accepts:
+    it halves the batch size when a batch is rejected or partially failed, and
+    grows it again by one after every batch that fully succeeds. The learned
+    sizes are shared by all the batchers of an endpoint. A batch that fails
+    because of the endpoint, e.g. on a connection error or a timeout, fails all
+    the requests left at once, as smaller batches would fail the same way.
+    """
+
+    _batch_sizes: Dict[str, int] = {}
+
+    def __init__(self, provider: HTTPProvider, max_batch_size: int) -> None:
+        """Initialize the batcher."""
+        self.provider = provider
+        self.endpoint_uri = str(provider.endpoint_uri)
+        self.max_batch_size = max_batch_size
+
+    @property
+    def batch_size(self) -> int:
+        """Get the current batch size of the endpoint."""
+        batch_size = self._batch_sizes.get(self.endpoint_uri, self.max_batch_size)
+        return max(1, min(batch_size, self.max_batch_size))
+
+    def _resize(self, batch_size: int) -> None:
+        """Set the batch size of the endpoint."""
+        self._batch_sizes[self.endpoint_uri] = max(
+            1, min(batch_size, self.max_batch_size)
+        )
+
+    def _post(
+        self, payload: List[Dict[str, Any]], timeout: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """Post a batch, and return its responses."""
+        responses = post_json_rpc(self.provider, payload, timeout)
+        if not isinstance(responses, list):
+            # some providers answer a batch they do not accept with a single error
+            raise JsonRpcError(f"Batch rejected: {responses}")
+        return responses
+
+    def request(
+        self,
+        requests_: List[Tuple[str, List[Any]]],
+        context: Optional[SweepContext] = None,
+    ) -> List[Union[Any, Exception]]:
+        """
+        Send requests in batches.
+
+        :param requests_: the requests to send, as `(method, params)`.
+        :param context: if set, the sweep whose call timeout and deadline bound the batches.
+        :return: the result of each request, or the exception it failed with.
+        """
+        results: List[Union[Any, Exception]] = [
+            JsonRpcError("not sent") for _ in requests_
+        ]
+        pending = list(range(len(requests_)))
+        while len(pending) > 0:
+            timeout = None
+            if context is not None:
+                if context.expired:
+                    for index in pending:
+                        results[index] = SweepTimeout("not sent")
+                    break
+                timeout = context.get_call_timeout()
+            batch_size = self.batch_size
+            batch = pending[:batch_size]
+            payload = [
+                {
+                    "jsonrpc": "2.0",
+                    "id": index,
+                    "method": requests_[index][0],
+                    "params": requests_[index][1],
+                }
+                for index in batch
+            ]
+            try:
+                responses = self._post(payload, timeout)
+            except Exception as e:
+                if not is_batch_rejected(e):
+                    for index in pending:
+                        results[index] = e
+                    break
+                if batch_size > 1:
+                    self._resize(batch_size // 2)
+                    continue
+                results[batch[0]] = e
+                pending = pending[1:]
+                continue
+
+            by_id = {
+                response.get("id"): response
+                for response in responses
+                if isinstance(response, dict)
+            }
+            retry = []
+            for index in batch:
+                response = by_id.get(index, None)
+                error = None if response is None else response.get("error", None)
+                if response is None or (
+                    error is not None
+                    and error.get("code", None) in JSON_RPC_LIMIT_ERROR_CODES
+                ):
+                    # dropped or rate limited, the request is retried in a smaller batch
+                    retry.append(index)
+                elif error is not None:
+                    results[index] = JsonRpcError(error)
+                else:
+                    results[index] = response.get("result", None)
+            if len(retry) == 0:
+                self._resize(batch_size + 1)
+            elif batch_size > 1:
+                self._resize(batch_size // 2)
+            else:
+                # a single request cannot be split further
+                results[retry[0]] = JsonRpcError("Request dropped by the provider")
+                retry = []
+            pending = retry + pending[len(batch) :]
+        return results
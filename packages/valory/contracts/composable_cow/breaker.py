@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2023 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""This module contains the circuit breaker of the endpoints."""
+import threading
+import time
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+
+def redact_endpoint(endpoint: str) -> str:
+    """
+    Get the scheme and host of an endpoint, to be logged or reported.
+
+    The path, query and credentials of an endpoint URI often hold an API key, so
+    only the scheme, the host and the port are kept.
+
+    :param endpoint: the URI of the endpoint, or the name of its provider.
+    :return: the redacted endpoint.
+    """
+    parts = urlsplit(endpoint)
+    if parts.netloc == "":
+        # e.g. the name of a provider that is not reached through a URI
+        return endpoint
+    host = parts.netloc.rsplit("@", 1)[-1]
+    return f"{parts.scheme}://{host}"
+
+
+class CircuitBreaker:
+    """
+    Stops the sweeps from calling an endpoint that keeps failing.
+
+    The breaker opens after `threshold` sweeps in a row fail because of the
+    endpoint, e.g. because its calls time out or it answers with node errors,
+    while reverts count as answers. While open, the sweeps return without calling
+    the endpoint. Once `cooldown` seconds have passed, the breaker is half open
+    and lets a single sweep through at a time: it closes if the endpoint answers,
+    and opens again otherwise. A probe that never reports is given up on after
+    `cooldown` seconds. The breakers are shared by all the sweeps of an
+    endpoint, which may run concurrently.
+
+    The breakers are keyed by the full URI of their endpoint, which is only
+    reported redacted.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    _breakers: Dict[str, "CircuitBreaker"] = {}
+
+    def __init__(self, endpoint: str, threshold: int, cooldown: float) -> None:
+        """Initialize the breaker."""
+        self.endpoint = endpoint
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self._opened_at: Optional[float] = None
+        # when the sweep probing the endpoint while half open started, if any
+        self._probe_started_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def get(cls, endpoint: str, threshold: int, cooldown: float) -> "CircuitBreaker":
+        """Get the breaker of an endpoint, with the given settings."""
+        breaker = cls._breakers.get(endpoint, None)
+        if breaker is None:
+            breaker = cls(endpoint, threshold, cooldown)
+            cls._breakers[endpoint] = breaker
+        breaker.threshold = threshold
+        breaker.cooldown = cooldown
+        return breaker
+
+    @property
+    def redacted_endpoint(self) -> str:
+        """Get the endpoint without its path, query or credentials."""
+        return redact_endpoint(self.endpoint)
+
+    @property
+    def state(self) -> str:
+        """Get the state of the breaker."""
+        if self._opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self._opened_at >= self.cooldown:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self) -> bool:
+        """Check whether a sweep can call the endpoint, taking the probe if half open."""
+        with self._lock:
+            state = self.state
+            if state == self.OPEN:
+                return False
+            if state == self.HALF_OPEN:
+                now = time.monotonic()
+                if (
+                    self._probe_started_at is not None
+                    and now - self._probe_started_at < self.cooldown
+                ):
+                    # another sweep is probing the endpoint
+                    return False
+                self._probe_started_at = now
+            return True
+
+    def record_success(self) -> None:
+        """Record that the endpoint answered, closing the breaker."""
+        with self._lock:
+            self.failures = 0
+            self._opened_at = None
+            self._probe_started_at = None
+
+    def record_failure(self) -> None:
+        """Record that a sweep failed because of the endpoint."""
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.threshold or self.state == self.HALF_OPEN:
+                self._opened_at = time.monotonic()
+            self._probe_started_at = None
+
+    def release(self) -> None:
+        """Release the probe of a sweep that did not call the endpoint."""
+        with self._lock:
+            self._probe_started_at = None
+
+    def status(self) -> Dict[str, Any]:
+        """Get the state of the endpoint, for the health checks."""
+        state = self.state
+        return {
+            "endpoint": self.redacted_endpoint,
+            "state": state,
+            "failures": self.failures,
+            "degraded": state != self.CLOSED,
+        }
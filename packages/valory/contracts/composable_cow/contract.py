@@ -19,16 +19,38 @@
 
 """This module contains the class to connect to an Gnosis Safe contract."""
 import logging
+import math
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass
 from enum import Enum
-from typing import Any, Optional, Dict, List, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union, cast
 
 from aea.common import JSONLike
 from aea.configurations.base import PublicId
 from aea.contracts.base import Contract
 from aea.crypto.base import LedgerApi
-from aea_ledger_ethereum import EthereumApi
-from web3 import Web3
+from hexbytes import HexBytes
+from web3 import HTTPProvider, Web3
+
+from packages.valory.contracts.composable_cow.batcher import JsonRpcBatcher
+from packages.valory.contracts.composable_cow.breaker import CircuitBreaker
+from packages.valory.contracts.composable_cow.order_types import (
+    OrderType,
+    decode_static_data,
+    get_order_type,
+)
+from packages.valory.contracts.composable_cow.sweep import (
+    ContractRevert,
+    ENDPOINT_ERRORS,
+    JsonRpcError,
+    SweepContext,
+    SweepTimeout,
+    TradeableOrderCache,
+    get_call_error,
+)
+from packages.valory.contracts.composable_cow.twap import TWAPData
+
 
 PUBLIC_ID = PublicId.from_str("valory/composable_cow:0.1.0")
 
@@ -37,32 +59,88 @@ _logger = logging.getLogger(
 )
 
 
-TWAP_STRUCT_ABI = [
-    ('address', 'sellToken'),
-    ('address', 'buyToken'),
-    ('address', 'receiver'),
-    ('uint256', 'partSellAmount'),
-    ('uint256', 'minPartLimit'),
-    ('uint256', 't0'),
-    ('uint256', 'n'),
-    ('uint256', 't'),
-    ('uint256', 'span'),
-    ('bytes32', 'appData'),
+# Multicall3 is deployed at the same address on all the supported chains
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+MULTICALL3_ABI = [
+    {
+        "inputs": [
+            {
+                "components": [
+                    {"internalType": "address", "name": "target", "type": "address"},
+                    {"internalType": "bool", "name": "allowFailure", "type": "bool"},
+                    {"internalType": "bytes", "name": "callData", "type": "bytes"},
+                ],
+                "internalType": "struct Multicall3.Call3[]",
+                "name": "calls",
+                "type": "tuple[]",
+            }
+        ],
+        "name": "aggregate3",
+        "outputs": [
+            {
+                "components": [
+                    {"internalType": "bool", "name": "success", "type": "bool"},
+                    {"internalType": "bytes", "name": "returnData", "type": "bytes"},
+                ],
+                "internalType": "struct Multicall3.Result[]",
+                "name": "returnData",
+                "type": "tuple[]",
+            }
+        ],
+        "stateMutability": "payable",
+        "type": "function",
+    }
 ]
+# the outputs of aggregate3: whether each call succeeded, and its return data
+MULTICALL3_OUTPUT_TYPES = ["(bool,bytes)[]"]
+# the ConditionalOrderParams struct: handler, salt and staticInput
+CONDITIONAL_ORDER_PARAMS_TYPE = "(address,bytes32,bytes)"
+# the outputs of getTradeableOrderWithSignature: a GPv2Order.Data and a signature
+TRADEABLE_ORDER_OUTPUT_TYPES = [
+    "(address,address,address,uint256,uint256,uint32,bytes32,uint256,bytes32,bool,bytes32,bytes32)",
+    "bytes",
+]
+# the default number of results of getTradeableOrderWithSignature cached, by order and block
+TRADEABLE_ORDER_CACHE_SIZE = 4096
+
+
+# the errors with which ComposableCoW and the conditional order handlers tell
+# when an order should be checked again, by name and argument types
+POLL_ERROR_TYPES: Dict[str, List[str]] = {
+    "PollTryNextBlock": ["string"],
+    "PollTryAtBlock": ["uint256", "string"],
+    "PollTryAtEpoch": ["uint256", "string"],
+    "PollNever": ["string"],
+    "OrderNotValid": ["string"],
+    "ProofNotAuthed": [],
+    "SingleOrderNotAuthed": [],
+    "InterfaceNotSupported": [],
+    "InvalidHandler": [],
+}
+POLL_ERROR_SELECTORS: Dict[bytes, str] = {
+    bytes(Web3.keccak(text=f"{name}({','.join(types)})")[:4]): name
+    for name, types in POLL_ERROR_TYPES.items()
+}
+# the errors after which an order will never be tradeable, e.g. because its owner
+# removed it, which ComposableCoW does not emit, or because its handler cannot
+# produce orders; the others only hold for the block, e.g. `OrderNotValid` when
+# a balance or price condition is not met yet
+POLL_NEVER_ERRORS = (
+    "PollNever",
+    "ProofNotAuthed",
+    "SingleOrderNotAuthed",
+    "InterfaceNotSupported",
+    "InvalidHandler",
+)
 
 
 @dataclass
-class TWAPData:
-    sellToken: str
-    buyToken: str
-    receiver: str
-    partSellAmount: int
-    minPartLimit: int
-    t0: int
-    n: int
-    t: int
-    span: int
-    appData: bytes
+class PollError:
+    """A decoded poll error."""
+
+    name: str
+    value: Optional[int]
+    reason: str
 
 
 class CallType(Enum):
@@ -84,6 +162,9 @@ class ComposableCowContract(Contract):
     """The ComposableCow contract."""
 
     contract_id = PUBLIC_ID
+    # the thread pools of the concurrent reads, by size
+    _executors: Dict[int, ThreadPoolExecutor] = {}
+    _tradeable_order_cache = TradeableOrderCache(TRADEABLE_ORDER_CACHE_SIZE)
 
     @classmethod
     def get_raw_transaction(
@@ -130,127 +211,676 @@ class ComposableCowContract(Contract):
         ledger_api: LedgerApi,
         contract_address: str,
         orders: List[Dict[str, Any]],
+        multicall_chunk_size: Optional[int] = None,
+        rpc_batch_size: Optional[int] = None,
+        max_workers: Optional[int] = None,
+        call_timeout: float = 10.0,
+        seconds_per_block: int = 12,
+        sweep_timeout: Optional[float] = None,
+        breaker_threshold: int = 3,
+        breaker_cooldown: float = 60.0,
+        cache_size: int = TRADEABLE_ORDER_CACHE_SIZE,
     ) -> Optional[JSONLike]:
-        """Get tradeable order."""
-        tradeable_orders: List[Dict[str, Any]] = []
+        """
+        Get tradeable order.
+
+        :param ledger_api: the ledger api.
+        :param contract_address: the address of ComposableCoW.
+        :param orders: the orders to check, with their params, off-chain input and proof as hex strings, the name of their `orderType` if their handler is known, and the `submittedParts` of TWAPs, which are not checked again.
+        :param multicall_chunk_size: if set, the orders are checked in batches of this size through Multicall3.
+        :param rpc_batch_size: if set, the reads are sent as JSON-RPC batches of up to this size.
+        :param max_workers: if set, the reads of the orders are made concurrently by up to this many threads.
+        :param call_timeout: the time, in seconds, after which a read is given up on.
+        :param seconds_per_block: the average block time, to schedule the orders that ask to be checked at a block.
+        :param sweep_timeout: if set, the time, in seconds, after which no read is made anymore and the orders checked so far are returned.
+        :param breaker_threshold: the number of sweeps in a row failing because of the endpoint after which it is not called anymore.
+        :param breaker_cooldown: the time, in seconds, after which an endpoint that is not called anymore is tried again.
+        :param cache_size: the number of results of the calls cached by order and block.
+        :return: the tradeable orders, the orders to drop, the end timestamps of the orders, when to check the orders that are between windows, and the state of the endpoint.
+        """
+        cls._tradeable_order_cache.resize(cache_size)
+        provider = ledger_api.api.provider
+        breaker = CircuitBreaker.get(
+            str(getattr(provider, "endpoint_uri", None) or type(provider).__name__),
+            breaker_threshold,
+            breaker_cooldown,
+        )
+        if not breaker.allow():
+            # the orders are checked again once the endpoint has cooled down
+            _logger.warning(
+                f"Endpoint {breaker.redacted_endpoint} is degraded, not called."
+            )
+            data = dict(
+                tradeable_orders=[],
+                drop_orders=[],
+                rpc=breaker.status(),
+                cache=cls._tradeable_order_cache.stats(),
+            )
+            return dict(data=data, type=CallType.GET_TRADEABLE_ORDER.value)
+
+        orders = [cls.decode_order(order) for order in orders]
         drop_orders: List[Dict[str, Any]] = []
+        expiries: List[Dict[str, Any]] = []
+        candidates: List[Dict[str, Any]] = []
+        context = SweepContext(cls, ledger_api, call_timeout, sweep_timeout)
+        batcher = cls._get_batcher(ledger_api, rpc_batch_size)
+        start_timestamps: Dict[Any, int] = {}
+        # all the orders are checked against the same block
+        try:
+            if batcher is None:
+                context.load_latest_block()
+            else:
+                start_timestamps = cls._get_start_timestamps_batched(
+                    context, batcher, orders
+                )
+        except Exception:
+            breaker.record_failure()
+            raise
+        executor = cls._get_executor(max_workers) if batcher is None else None
+        if executor is not None:
+            start_timestamps = cls._get_start_timestamps_concurrently(
+                context, executor, cast(int, max_workers), orders, call_timeout
+            )
+        # the start timestamps read from the cabinet, for the skill to cache
+        new_start_timestamps: List[Dict[str, Any]] = []
+        # the orders that were not called because they cannot be traded yet
+        next_checks: List[Dict[str, Any]] = []
+        # when to check the tradeable orders again, e.g. when the next TWAP part opens
+        tradeable_next_checks: Dict[Any, int] = {}
         for order in orders:
             try:
-                static_input = order["params"][2]
-                composable_cow = order["composableCow"]
-                instance = cls.get_instance(ledger_api, order["composableCow"])
-                (
-                    order_data,
-                    signature,
-                ) = instance.functions.getTradeableOrderWithSignature(
-                    order["owner"],
-                    order["params"],
-                    order["offchainInput"],
-                    order["proof"],
-                ).call()
-                twap_data = cls.decode_twap_struct(
-                    ledger_api,
-                    static_input,
+                order_type, static_data = cls.get_static_data(order)
+                if order_type is None or static_data is None:
+                    # the orders of unknown handlers can only be polled
+                    candidates.append(order)
+                    continue
+                start_timestamp = None
+                if order_type.needs_start_timestamp(static_data):
+                    start_timestamp = order.get("startTimestamp", None)
+                    if start_timestamp is None:
+                        start_timestamp = start_timestamps.get(order["id"], None)
+                        if start_timestamp is None:
+                            if context.expired:
+                                # checked again by the next sweep
+                                continue
+                            start_timestamp = cls.get_start_timestamp(
+                                context, order["composableCow"], order, static_data
+                            )
+                        new_start_timestamps.append(
+                            {"id": order["id"], "start_timestamp": start_timestamp}
+                        )
+                end_timestamp = order_type.get_end_timestamp(
+                    static_data, start_timestamp
                 )
-                should_drop_order = cls.should_drop_order(
-                    ledger_api,
-                    composable_cow,
-                    order,
-                    twap_data,
+                if end_timestamp is not None:
+                    expiries.append({"id": order["id"], "end_timestamp": end_timestamp})
+                check = order_type.pre_check(
+                    static_data,
+                    context.block_timestamp,
+                    start_timestamp,
+                    order.get("submittedParts", ()),
                 )
-                order = {
+                if not check.tradeable:
+                    if check.next_check is None:
+                        # e.g. expired, or the last part has been submitted already
+                        drop_orders.append({"id": order["id"], "from": order["owner"]})
+                    else:
+                        next_checks.append(
+                            {"id": order["id"], "timestamp": check.next_check}
+                        )
+                    continue
+                if check.next_check is not None:
+                    tradeable_next_checks[order["id"]] = check.next_check
+                candidates.append(order)
+            except Exception as e:
+                _logger.info(f"Order {order} not tradeable : {e}")
+
+        # the orders already checked at this block, e.g. by a retried request, are not called again
+        cache = cls._tradeable_order_cache
+        cached_results = [
+            cache.get(order["id"], context.block_number) for order in candidates
+        ]
+        uncached = [
+            order for order, result in zip(candidates, cached_results) if result is None
+        ]
+        if len(uncached) == 0:
+            new_results: List[Union[Tuple, Exception]] = []
+        elif multicall_chunk_size is not None and multicall_chunk_size > 0:
+            new_results = cls._get_tradeable_orders_multicall(
+                context, uncached, multicall_chunk_size
+            )
+        elif batcher is not None:
+            new_results = cls._get_tradeable_orders_batched(context, batcher, uncached)
+        elif executor is not None:
+            new_results = cls._map_concurrently(
+                executor,
+                cast(int, max_workers),
+                lambda order: cls._get_tradeable_order_result(context, order),
+                uncached,
+                call_timeout,
+                context.deadline,
+            )
+        else:
+            new_results = cls._get_tradeable_orders_sequential(context, uncached)
+        for order, result in zip(uncached, new_results):
+            cache.set(order["id"], context.block_number, result)
+        cls._record_endpoint_results(breaker, new_results)
+        timed_out = sum(isinstance(result, SweepTimeout) for result in new_results)
+        if timed_out > 0:
+            _logger.warning(
+                f"{timed_out} orders not checked before the sweep timed out."
+            )
+        new_results_iter = iter(new_results)
+        results = [
+            next(new_results_iter) if result is None else result
+            for result in cached_results
+        ]
+
+        tradeable_orders: List[Dict[str, Any]] = []
+        for order, result in zip(candidates, results):
+            if isinstance(result, SweepTimeout):
+                # checked again by the next sweep
+                continue
+            if isinstance(result, Exception):
+                poll_error = cls.decode_poll_error(ledger_api, result)
+                if poll_error is None:
+                    _logger.info(f"Order {order} not tradeable : {result}")
+                elif poll_error.name in POLL_NEVER_ERRORS:
+                    _logger.info(
+                        f"Order {order} will never be tradeable : {poll_error}"
+                    )
+                    drop_orders.append(
+                        {
+                            "id": order["id"],
+                            "from": order["owner"],
+                            "reason": poll_error.name,
+                        }
+                    )
+                else:
+                    _logger.info(f"Order {order} not tradeable yet : {poll_error}")
+                    next_checks.append(
+                        {
+                            "id": order["id"],
+                            "timestamp": cls.get_poll_timestamp(
+                                context, poll_error, seconds_per_block
+                            ),
+                        }
+                    )
+                continue
+            order_data, signature = result
+            tradeable_orders.append(
+                {
                     **cls.parse_order_data(order_data),
                     "signingScheme": "eip1271",
                     "signature": "0x" + signature.hex(),
                     "from": order["owner"],
                     "id": order["id"],
-                    "chainId": ledger_api.api.eth.chain_id,
+                    "chainId": context.chain_id,
                 }
-                if should_drop_order:
-                    drop_orders.append(order)
-                    continue
+            )
+            next_check = tradeable_next_checks.get(order["id"], None)
+            if next_check is not None:
+                next_checks.append({"id": order["id"], "timestamp": next_check})
+
+        data = dict(
+            tradeable_orders=tradeable_orders,
+            drop_orders=drop_orders,
+            expiries=expiries,
+            start_timestamps=new_start_timestamps,
+            next_checks=next_checks,
+            block_number=context.block_number,
+            block_timestamp=context.block_timestamp,
+            rpc=breaker.status(),
+            cache=cls._tradeable_order_cache.stats(),
+        )
+        return dict(data=data, type=CallType.GET_TRADEABLE_ORDER.value)
 
-                tradeable_orders.append(order)
+    @staticmethod
+    def _record_endpoint_results(
+        breaker: CircuitBreaker, results: List[Union[Tuple, Exception]]
+    ) -> None:
+        """Record whether the endpoint answered the calls of a sweep."""
+        answered = failed = False
+        for result in results:
+            if not isinstance(result, Exception) or isinstance(result, ContractRevert):
+                answered = True
+            elif isinstance(result, ENDPOINT_ERRORS):
+                failed = True
+        if answered:
+            breaker.record_success()
+        elif failed:
+            breaker.record_failure()
+        else:
+            breaker.release()
+
+    @staticmethod
+    def decode_order(order: Dict[str, Any]) -> Dict[str, Any]:
+        """Decode the params, off-chain input and proof of an order, which the skill sends as hex strings."""
+        handler, salt, static_input = order["params"]
+        return {
+            **order,
+            "params": [handler, HexBytes(salt), HexBytes(static_input)],
+            "offchainInput": HexBytes(order["offchainInput"]),
+            "proof": [HexBytes(node) for node in order["proof"]],
+        }
+
+    @staticmethod
+    def _get_order_args(order: Dict[str, Any]) -> List[Any]:
+        """Get the arguments of `getTradeableOrderWithSignature` for an order."""
+        return [
+            order["owner"],
+            order["params"],
+            order["offchainInput"],
+            order["proof"],
+        ]
+
+    @classmethod
+    def _get_tradeable_order_result(
+        cls, context: SweepContext, order: Dict[str, Any]
+    ) -> Tuple:
+        """Call `getTradeableOrderWithSignature` for an order."""
+        instance = context.get_instance(order["composableCow"])
+        call_data = instance.encodeABI(
+            fn_name="getTradeableOrderWithSignature",
+            args=cls._get_order_args(order),
+        )
+        return tuple(
+            context.ledger_api.api.codec.decode(
+                TRADEABLE_ORDER_OUTPUT_TYPES,
+                context.call(instance.address, call_data),
+            )
+        )
+
+    @staticmethod
+    def decode_poll_error(
+        ledger_api: LedgerApi, error: Exception
+    ) -> Optional[PollError]:
+        """Decode the poll error an order reverted with, if any."""
+        if not isinstance(error, ContractRevert):
+            return None
+        name = POLL_ERROR_SELECTORS.get(bytes(error.data[:4]), None)
+        if name is None:
+            return None
+        types = POLL_ERROR_TYPES[name]
+        try:
+            args = ledger_api.api.codec.decode(types, bytes(error.data[4:]))
+        except Exception:  # pylint: disable=broad-except
+            return PollError(name, None, "")
+        value = args[0] if len(types) == 2 else None
+        reason = args[-1] if len(types) > 0 else ""
+        return PollError(name, value, reason)
+
+    @staticmethod
+    def get_poll_timestamp(
+        context: SweepContext, poll_error: PollError, seconds_per_block: int
+    ) -> int:
+        """Get the timestamp at which an order should be checked again after a poll error."""
+        if poll_error.name == "PollTryAtEpoch" and poll_error.value is not None:
+            return poll_error.value
+        blocks = 1
+        if poll_error.name == "PollTryAtBlock" and poll_error.value is not None:
+            blocks = max(1, poll_error.value - context.block_number)
+        # the timestamps of future blocks can only be estimated
+        return context.block_timestamp + blocks * seconds_per_block
+
+    @classmethod
+    def _get_tradeable_orders_sequential(
+        cls, context: SweepContext, orders: List[Dict[str, Any]]
+    ) -> List[Union[Tuple, Exception]]:
+        """Call `getTradeableOrderWithSignature` for each order, one at a time."""
+        results: List[Union[Tuple, Exception]] = []
+        for order in orders:
+            if context.expired:
+                results.append(SweepTimeout("not called"))
+                continue
+            try:
+                results.append(cls._get_tradeable_order_result(context, order))
             except Exception as e:
-                _logger.info(f"Order {order} not tradeable : {e}")
+                results.append(e)
+        return results
 
-        return dict(data=dict(tradeable_orders=tradeable_orders, drop_orders=drop_orders), type=CallType.GET_TRADEABLE_ORDER.value)
+    @classmethod
+    def _get_executor(cls, max_workers: Optional[int]) -> Optional[ThreadPoolExecutor]:
+        """Get the thread pool of the given size, reused across sweeps."""
+        if max_workers is None or max_workers <= 0:
+            return None
+        executor = cls._executors.get(max_workers, None)
+        if executor is None:
+            executor = ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix="composable_cow"
+            )
+            cls._executors[max_workers] = executor
+        return executor
 
     @staticmethod
-    def decode_twap_struct(
-        ledger_api: LedgerApi,
-        static_input: bytes,
-    ) -> Optional[TWAPData]:
-        """Decode twap struct."""
-        abi = [type_ for type_, name in TWAP_STRUCT_ABI]
-        [
-            sellToken,
-            buyToken,
-            receiver,
-            partSellAmount,
-            minPartLimit,
-            t0,
-            n,
-            t,
-            span,
-            appData,
-        ] = ledger_api.api.codec.decode(abi, static_input)
-        return TWAPData(
-            sellToken=sellToken,
-            buyToken=buyToken,
-            receiver=receiver,
-            partSellAmount=partSellAmount,
-            minPartLimit=minPartLimit,
-            t0=t0,
-            n=n,
-            t=t,
-            span=span,
-            appData=appData,
+    def _map_concurrently(
+        executor: ThreadPoolExecutor,
+        max_workers: int,
+        fn: Callable[[Any], Any],
+        items: List[Any],
+        call_timeout: float,
+        sweep_deadline: Optional[float] = None,
+    ) -> List[Union[Any, Exception]]:
+        """
+        Apply a function to items on a thread pool, gathering the results in order.
+
+        :param executor: the thread pool.
+        :param max_workers: the size of the thread pool.
+        :param fn: the function to apply.
+        :param items: the items.
+        :param call_timeout: the time, in seconds, a call is given once it can run.
+        :param sweep_deadline: if set, the monotonic time after which no result is waited for.
+        :return: the result of each call, or the exception it failed with.
+        """
+        futures: List[Future] = [executor.submit(fn, item) for item in items]
+        # the calls run in waves of the size of the pool, so the last wave can
+        # only start after the previous ones have had their time
+        waves = math.ceil(len(items) / max_workers)
+        deadline = time.monotonic() + waves * call_timeout
+        if sweep_deadline is not None:
+            deadline = min(deadline, sweep_deadline)
+        results: List[Union[Any, Exception]] = []
+        for future in futures:
+            try:
+                results.append(
+                    future.result(timeout=max(0.0, deadline - time.monotonic()))
+                )
+            except Exception as e:
+                # a call that has not started is not made anymore
+                if future.cancel():
+                    e = SweepTimeout("not called")
+                results.append(e)
+        return results
+
+    @classmethod
+    def _get_start_timestamps_concurrently(
+        cls,
+        context: SweepContext,
+        executor: ThreadPoolExecutor,
+        max_workers: int,
+        orders: List[Dict[str, Any]],
+        call_timeout: float,
+    ) -> Dict[Any, int]:
+        """Get the start timestamps stored in the cabinet, concurrently."""
+        pending = []
+        for order in orders:
+            if order.get("startTimestamp", None) is not None:
+                continue
+            try:
+                order_type, static_data = cls.get_static_data(order)
+                if order_type is not None and order_type.needs_start_timestamp(
+                    static_data
+                ):
+                    pending.append((order, static_data))
+            except Exception as e:
+                _logger.info(f"Order {order} not tradeable : {e}")
+        results = cls._map_concurrently(
+            executor,
+            max_workers,
+            lambda item: cls.get_start_timestamp(
+                context, item[0]["composableCow"], item[0], item[1]
+            ),
+            pending,
+            call_timeout,
+            context.deadline,
         )
+        start_timestamps: Dict[Any, int] = {}
+        for (order, _), result in zip(pending, results):
+            if isinstance(result, Exception):
+                _logger.info(f"Order {order} not tradeable : {result}")
+                continue
+            start_timestamps[order["id"]] = result
+        return start_timestamps
 
     @classmethod
-    def get_start_timestamp(cls, ledger_api: LedgerApi, contract_address: str, order: Dict[str, Any], data: TWAPData) -> int:
-        """Get start timestamp."""
-        if data.span != 0:
-            return data.t0
+    def _get_tradeable_orders_multicall(
+        cls,
+        context: SweepContext,
+        orders: List[Dict[str, Any]],
+        chunk_size: int,
+    ) -> List[Union[Tuple, Exception]]:
+        """
+        Call `getTradeableOrderWithSignature` for all the orders, in batches through Multicall3.
+
+        Each call is allowed to fail on its own, so a revert only affects its order.
+
+        :param context: the context of the sweep.
+        :param orders: the orders to check.
+        :param chunk_size: the number of calls per batch.
+        :return: the decoded result of each call, or the exception it failed with.
+        """
+        ledger_api = context.ledger_api
+        multicall = ledger_api.api.eth.contract(
+            address=MULTICALL3_ADDRESS, abi=MULTICALL3_ABI
+        )
+        results: List[Union[Tuple, Exception]] = [
+            ContractRevert("not called") for _ in orders
+        ]
+        calls: List[Tuple[int, Tuple[str, bool, str]]] = []
+        for index, order in enumerate(orders):
+            try:
+                instance = context.get_instance(order["composableCow"])
+                call_data = instance.encodeABI(
+                    fn_name="getTradeableOrderWithSignature",
+                    args=cls._get_order_args(order),
+                )
+                calls.append((index, (instance.address, True, call_data)))
+            except Exception as e:
+                results[index] = e
+
+        for start in range(0, len(calls), chunk_size):
+            chunk = calls[start : start + chunk_size]
+            if context.expired:
+                for index, _ in chunk:
+                    results[index] = SweepTimeout("not called")
+                continue
+            try:
+                call_data = multicall.encodeABI(
+                    fn_name="aggregate3", args=[[call for _, call in chunk]]
+                )
+                (responses,) = ledger_api.api.codec.decode(
+                    MULTICALL3_OUTPUT_TYPES,
+                    context.call(MULTICALL3_ADDRESS, call_data),
+                )
+            except Exception as e:
+                # the whole batch failed, e.g. because of the node
+                for index, _ in chunk:
+                    results[index] = e
+                continue
+            for (index, _), (success, return_data) in zip(chunk, responses):
+                if not success:
+                    results[index] = ContractRevert(
+                        f"reverted with 0x{bytes(return_data).hex()}",
+                        bytes(return_data),
+                    )
+                    continue
+                try:
+                    results[index] = tuple(
+                        ledger_api.api.codec.decode(
+                            TRADEABLE_ORDER_OUTPUT_TYPES, return_data
+                        )
+                    )
+                except Exception as e:
+                    results[index] = e
+        return results
 
-        contract = cls.get_instance(ledger_api, contract_address)
-        owner, id = Web3.to_checksum_address(order["owner"]), contract.functions.hash(order["params"]).call()
-        start_timestamp_hex = contract.functions.cabinet(owner, id).call()
-        start_timestamp = ledger_api.api.codec.decode(['uint256'], start_timestamp_hex)[0]
-        return start_timestamp
+    @staticmethod
+    def _get_batcher(
+        ledger_api: LedgerApi, rpc_batch_size: Optional[int]
+    ) -> Optional[JsonRpcBatcher]:
+        """Get a JSON-RPC batcher, if batching is enabled and the provider supports it."""
+        if rpc_batch_size is None or rpc_batch_size <= 0:
+            return None
+        provider = ledger_api.api.provider
+        if not isinstance(provider, HTTPProvider):
+            # batch arrays are only sent over http
+            return None
+        return JsonRpcBatcher(provider, rpc_batch_size)
 
     @classmethod
-    def get_end_timestamp(cls, ledger_api: LedgerApi, contract_address: str, order: Dict[str, Any], data: TWAPData) -> int:
-        """Get start timestamp."""
-        start_timestamp = cls.get_start_timestamp(ledger_api, contract_address, order, data)
-        if data.span == 0:
-            return start_timestamp + data.n * data.t
+    def _get_start_timestamps_batched(
+        cls,
+        context: SweepContext,
+        batcher: JsonRpcBatcher,
+        orders: List[Dict[str, Any]],
+    ) -> Dict[Any, int]:
+        """
+        Load the latest block and get the start timestamps stored in the cabinet, in JSON-RPC batches.
+
+        :param context: the context of the sweep, whose block is set to the latest one.
+        :param batcher: the JSON-RPC batcher.
+        :param orders: the orders to check.
+        :return: the start timestamps by order id.
+        """
+        ledger_api = context.ledger_api
+        # the orders that start when they are created need their cabinet entry,
+        # unless the skill has already cached it
+        cabinet_calls = []
+        for order in orders:
+            if order.get("startTimestamp", None) is not None:
+                continue
+            try:
+                order_type, static_data = cls.get_static_data(order)
+                if order_type is not None and order_type.needs_start_timestamp(
+                    static_data
+                ):
+                    instance = context.get_instance(order["composableCow"])
+                    owner = Web3.to_checksum_address(order["owner"])
+                    ctx = cls.hash_params(ledger_api, order["params"])
+                    call_data = instance.encodeABI(fn_name="cabinet", args=[owner, ctx])
+                    cabinet_calls.append((order, instance, call_data))
+            except Exception as e:
+                _logger.info(f"Order {order} not tradeable : {e}")
 
-        return start_timestamp + (data.n - 1) * data.t + data.span
+        (block,) = batcher.request(
+            [("eth_getBlockByNumber", ["latest", False])], context
+        )
+        if isinstance(block, Exception) or block is None:
+            raise ValueError(f"Could not get the latest block: {block}")
+        context.set_block(int(block["number"], 16), int(block["timestamp"], 16))
+        if len(cabinet_calls) == 0:
+            return {}
+
+        results = batcher.request(
+            [
+                (
+                    "eth_call",
+                    [
+                        {"to": instance.address, "data": data},
+                        context.block_identifier,
+                    ],
+                )
+                for _, instance, data in cabinet_calls
+            ],
+            context,
+        )
+        start_timestamps: Dict[Any, int] = {}
+        for (order, _, _), result in zip(cabinet_calls, results):
+            if isinstance(result, Exception):
+                _logger.info(f"Order {order} not tradeable : {result}")
+                continue
+            start_timestamps[order["id"]] = ledger_api.api.codec.decode(
+                ["uint256"], HexBytes(result)
+            )[0]
+        return start_timestamps
 
     @classmethod
-    def should_drop_order(
+    def _get_tradeable_orders_batched(
         cls,
-        ledger_api: LedgerApi,
+        context: SweepContext,
+        batcher: JsonRpcBatcher,
+        orders: List[Dict[str, Any]],
+    ) -> List[Union[Tuple, Exception]]:
+        """Call `getTradeableOrderWithSignature` for all the orders, in JSON-RPC batches."""
+        ledger_api = context.ledger_api
+        results: List[Union[Tuple, Exception]] = [
+            JsonRpcError("not sent") for _ in orders
+        ]
+        calls: List[Tuple[int, Dict[str, str]]] = []
+        for index, order in enumerate(orders):
+            try:
+                instance = context.get_instance(order["composableCow"])
+                call_data = instance.encodeABI(
+                    fn_name="getTradeableOrderWithSignature",
+                    args=cls._get_order_args(order),
+                )
+                calls.append((index, {"to": instance.address, "data": call_data}))
+            except Exception as e:
+                results[index] = e
+
+        responses = batcher.request(
+            [("eth_call", [call, context.block_identifier]) for _, call in calls],
+            context,
+        )
+        for (index, _), response in zip(calls, responses):
+            if isinstance(response, JsonRpcError) and isinstance(
+                response.args[0], dict
+            ):
+                results[index] = get_call_error(response.args[0])
+                continue
+            if isinstance(response, Exception):
+                results[index] = response
+                continue
+            try:
+                results[index] = tuple(
+                    ledger_api.api.codec.decode(
+                        TRADEABLE_ORDER_OUTPUT_TYPES, HexBytes(response)
+                    )
+                )
+            except Exception as e:
+                results[index] = e
+        return results
+
+    @staticmethod
+    def get_static_data(
+        order: Dict[str, Any]
+    ) -> Tuple[Optional[OrderType], Optional[Any]]:
+        """
+        Get the order type of an order and its decoded static input.
+
+        :param order: the order, with the name of its `orderType`.
+        :return: the order type and the decoded static input, or None if the handler of the order is not known.
+        """
+        order_type = get_order_type(order.get("orderType", None))
+        if order_type is None:
+            return None, None
+        return order_type, decode_static_data(
+            order_type.name, bytes(order["params"][2])
+        )
+
+    @staticmethod
+    def hash_params(ledger_api: LedgerApi, params: List[Any]) -> bytes:
+        """Hash the params of a conditional order locally, as `ComposableCoW.hash(params)` does."""
+        encoded = ledger_api.api.codec.encode(
+            [CONDITIONAL_ORDER_PARAMS_TYPE], [tuple(params)]
+        )
+        return bytes(Web3.keccak(encoded))
+
+    @classmethod
+    def get_start_timestamp(
+        cls,
+        context: SweepContext,
         contract_address: str,
         order: Dict[str, Any],
         data: TWAPData,
-    ):
-        block = ledger_api.api.eth.get_block("latest")
-        block_timestamp = block.timestamp
-        start_timestamp = cls.get_start_timestamp(ledger_api, contract_address, order, data)
-        end_timestamp = cls.get_end_timestamp(ledger_api, contract_address, order, data)
-
-        if start_timestamp > block_timestamp:
-            # The start time hasn't started
-            return False
+    ) -> int:
+        """Get start timestamp."""
+        if data.t0 != 0:
+            return data.t0
 
-        if block_timestamp >= end_timestamp:
-            # The order has expired
-            return True
+        # a t0 of 0 means that the order starts when it is created, which is stored in the cabinet
 
-        return False
+        ledger_api = context.ledger_api
+        contract = context.get_instance(contract_address)
+        owner, id = Web3.to_checksum_address(order["owner"]), cls.hash_params(
+            ledger_api, order["params"]
+        )
+        call_data = contract.encodeABI(fn_name="cabinet", args=[owner, id])
+        start_timestamp_hex = context.call(contract.address, call_data)
+        start_timestamp = ledger_api.api.codec.decode(["uint256"], start_timestamp_hex)[
+            0
+        ]
+        return start_timestamp
 
     @classmethod
     def process_order_events(
@@ -272,5 +902,45 @@ class ComposableCowContract(Contract):
         data = {
             "conditional_orders": conditional_orders,
             "merkle_root_set": merkle_root_set,
+            "block_number": receipt["blockNumber"],
+            "block_hash": receipt["blockHash"].hex(),
+        }
+        return dict(data=data, type=CallType.EVENT_PROCESSING.value)
+
+    @classmethod
+    def get_order_events(
+        cls,
+        ledger_api: LedgerApi,
+        contract_address: str,
+        from_block: int,
+        max_block_range: int,
+    ) -> JSONLike:
+        """Get the order events emitted in a range of blocks, starting from `from_block`."""
+        contract = cls.get_instance(ledger_api, contract_address)
+        latest_block = ledger_api.api.eth.block_number
+        to_block = min(from_block + max_block_range - 1, latest_block)
+        conditional_orders: List[Dict[str, Any]] = []
+        merkle_root_set: List[Dict[str, Any]] = []
+        if to_block >= from_block:
+            conditional_orders = [
+                {**event.get("args", {}), "composableCow": event.address}
+                for event in contract.events.ConditionalOrderCreated().get_logs(
+                    fromBlock=from_block, toBlock=to_block
+                )
+            ]
+            merkle_root_set = [
+                {**event.get("args", {}), "composableCow": event.address}
+                for event in contract.events.MerkleRootSet().get_logs(
+                    fromBlock=from_block, toBlock=to_block
+                )
+            ]
+        block = ledger_api.api.eth.get_block(to_block)
+        data = {
+            "conditional_orders": conditional_orders,
+            "merkle_root_set": merkle_root_set,
+            "block_number": to_block,
+            "block_hash": block["hash"].hex(),
+            "block_timestamp": block["timestamp"],
+            "latest_block": latest_block,
         }
         return dict(data=data, type=CallType.EVENT_PROCESSING.value)
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2023 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""This module contains the local checks of the orders of the known conditional order handlers."""
+
+from functools import lru_cache
+from typing import Any, Collection, Dict, Optional
+
+from eth_abi import decode
+
+from packages.valory.contracts.composable_cow.twap import (
+    TWAP,
+    TWAPData,
+    TWAP_STRUCT_ABI,
+)
+
+
+TWAP_ORDER_TYPE = "twap"
+# the number of distinct static inputs whose decoding is kept, orders that share
+# their parameters share the decoded struct
+DECODE_CACHE_SIZE = 4096
+
+
+class PreCheck:  # pylint: disable=too-few-public-methods
+    """
+    The result of the local check of an order.
+
+    An order that may be tradeable is called on chain, and checked again at
+    `next_check` if set. An order that is not tradeable is checked again at
+    `next_check`, or never if it is not set.
+    """
+
+    __slots__ = ("tradeable", "next_check")
+
+    def __init__(self, tradeable: bool, next_check: Optional[int] = None) -> None:
+        """Initialize the check."""
+        self.tradeable = tradeable
+        self.next_check = next_check
+
+    def __eq__(self, other: Any) -> bool:
+        """Compare two checks."""
+        if not isinstance(other, PreCheck):
+            return NotImplemented
+        return (self.tradeable, self.next_check) == (other.tradeable, other.next_check)
+
+    def __repr__(self) -> str:
+        """Get the representation of the check."""
+        return f"PreCheck(tradeable={self.tradeable}, next_check={self.next_check})"
+
+
+class OrderType:
+    """
+    The local model of the orders of a conditional order handler.
+
+    It decodes the static input of the orders, and tells whether an order could be
+    tradeable at a timestamp, and when to check it next, without calling the chain.
+    The orders of the handlers without an order type can only be polled.
+    """
+
+    name = ""
+
+    def decode(self, static_input: bytes) -> Optional[Any]:
+        """Decode the static input of an order, or return None if it is not valid."""
+        raise NotImplementedError
+
+    def needs_start_timestamp(  # pylint: disable=no-self-use,unused-argument
+        self, data: Any
+    ) -> bool:
+        """Check whether the start of an order is stored in the cabinet of ComposableCoW."""
+        return False
+
+    def get_end_timestamp(  # pylint: disable=no-self-use,unused-argument
+        self, data: Any, start_timestamp: Optional[int] = None
+    ) -> Optional[int]:
+        """Get the timestamp at which an order expires, if it can be computed locally."""
+        return None
+
+    def pre_check(
+        self,
+        data: Any,
+        timestamp: int,
+        start_timestamp: Optional[int] = None,
+        submitted_parts: Collection[int] = (),
+    ) -> PreCheck:
+        """
+        Check whether an order could be tradeable at a timestamp.
+
+        :param data: the decoded static input of the order.
+        :param timestamp: the timestamp to check the order at.
+        :param start_timestamp: the start of the order read from the cabinet, if needed.
+        :param submitted_parts: the parts of the order that have been submitted already.
+        :return: the result of the check.
+        """
+        raise NotImplementedError
+
+
+class TWAPOrderType(OrderType):
+    """The orders of the TWAP handler."""
+
+    name = TWAP_ORDER_TYPE
+    _types = [type_ for type_, _ in TWAP_STRUCT_ABI]
+
+    def decode(self, static_input: bytes) -> Optional[TWAPData]:
+        """Decode the static input of a TWAP, or return None if it is not one."""
+        try:
+            return TWAPData(*decode(self._types, static_input))
+        except Exception:  # pylint: disable=broad-except
+            return None
+
+    def needs_start_timestamp(self, data: TWAPData) -> bool:
+        """Check whether a TWAP starts when it is created, which is stored in the cabinet."""
+        return data.t0 == 0
+
+    def get_end_timestamp(
+        self, data: TWAPData, start_timestamp: Optional[int] = None
+    ) -> Optional[int]:
+        """Get the timestamp at which the last part of a TWAP stops being tradeable."""
+        start = data.t0 if data.t0 != 0 else start_timestamp
+        if start is None:
+            return None
+        return TWAP(start, data.n, data.t, data.span).end
+
+    def pre_check(
+        self,
+        data: TWAPData,
+        timestamp: int,
+        start_timestamp: Optional[int] = None,
+        submitted_parts: Collection[int] = (),
+    ) -> PreCheck:
+        """Check whether a part of a TWAP is open and has not been submitted yet."""
+        end_timestamp = self.get_end_timestamp(data, start_timestamp)
+        if end_timestamp is not None and timestamp >= end_timestamp:
+            # expired
+            return PreCheck(False)
+        twap = TWAP.from_data(data, start_timestamp)
+        if twap is None:
+            # the parts cannot be computed locally
+            return PreCheck(True)
+        part = twap.get_open_part(timestamp)
+        next_window_start = twap.get_next_window_start(timestamp)
+        if part is None or part in submitted_parts:
+            # no part can be traded until the next window opens, if any
+            return PreCheck(False, next_window_start)
+        return PreCheck(True, next_window_start)
+
+
+# the order types, by name
+ORDER_TYPES: Dict[str, OrderType] = {}
+
+
+def register_order_type(order_type: OrderType) -> None:
+    """Register an order type under its name."""
+    ORDER_TYPES[order_type.name] = order_type
+
+
+def get_order_type(name: Optional[str]) -> Optional[OrderType]:
+    """Get an order type by its name, or None if it is not known."""
+    if name is None:
+        return None
+    return ORDER_TYPES.get(name, None)
+
+
+register_order_type(TWAPOrderType())
+
+
+@lru_cache(maxsize=DECODE_CACHE_SIZE)
+def decode_static_data(order_type: Optional[str], static_input: bytes) -> Optional[Any]:
+    """Decode the static input of an order of the given type, or return None if it cannot be."""
+    type_ = get_order_type(order_type)
+    if type_ is None:
+        return None
+    return type_.decode(static_input)
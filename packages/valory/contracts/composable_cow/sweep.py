@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2023 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""This module contains the state of a sweep over the orders, and the results cached across sweeps."""
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Dict, List, Optional, Tuple, Type, Union
+
+from aea.contracts.base import Contract
+from aea.crypto.base import LedgerApi
+from hexbytes import HexBytes
+from web3 import HTTPProvider
+from web3._utils.request import make_post_request
+
+
+class ContractRevert(Exception):
+    """A call that reverted."""
+
+    def __init__(self, message: str, data: bytes = b"") -> None:
+        """Initialize the error, with the revert data of the call."""
+        super().__init__(message)
+        self.data = data
+
+
+class JsonRpcError(Exception):
+    """An error returned by a JSON-RPC request."""
+
+
+class SweepTimeout(Exception):
+    """A call that was not made because the sweep ran out of time."""
+
+
+def get_call_error(error: Dict[str, Any]) -> Exception:
+    """Get the exception of a JSON-RPC error, with the revert data if the call reverted."""
+    data = error.get("data", None)
+    if isinstance(data, dict):
+        # some nodes nest the revert data
+        data = data.get("data", None)
+    if isinstance(data, str) and data.startswith("0x"):
+        return ContractRevert(error.get("message", "reverted"), HexBytes(data))
+    return JsonRpcError(error)
+
+
+# the errors of the calls the endpoint did not answer, e.g. timeouts and the
+# connection errors of requests, or answered with a node error
+ENDPOINT_ERRORS = (JsonRpcError, FutureTimeoutError, OSError)
+
+
+def post_json_rpc(
+    provider: HTTPProvider, payload: Any, timeout: Optional[float] = None
+) -> Any:
+    """
+    Post a JSON-RPC payload to an http provider, and return the decoded response.
+
+    The payload is posted through the session web3 keeps for the endpoint, so
+    that its connections are reused, with the request settings of the provider.
+
+    :param provider: the http provider.
+    :param payload: a request, or a batch of requests.
+    :param timeout: if set, the time, in seconds, after which the request is given up on.
+    :return: the decoded response.
+    """
+    kwargs = dict(provider.get_request_kwargs())
+    if timeout is not None:
+        kwargs["timeout"] = timeout
+    response = make_post_request(
+        provider.endpoint_uri, json.dumps(payload).encode(), **kwargs
+    )
+    return json.loads(response)
+
+
+class SweepContext:
+    """
+    The state shared by all the orders checked in a sweep.
+
+    All the orders of a sweep are evaluated against the same block. The chain id
+    and the contract instances are fetched at most once per sweep. Each call is
+    given `call_timeout` seconds, and no call is made after the deadline of the
+    sweep, so that a slow endpoint does not hold the sweep back. The calls are
+    made as raw JSON-RPC requests for the timeout to apply over http, which the
+    calls of web3 contract functions do not take.
+    """
+
+    def __init__(
+        self,
+        contract: Type[Contract],
+        ledger_api: LedgerApi,
+        call_timeout: Optional[float] = None,
+        sweep_timeout: Optional[float] = None,
+    ) -> None:
+        """Initialize the context."""
+        self.contract = contract
+        self.ledger_api = ledger_api
+        self.call_timeout = call_timeout
+        self.deadline = (
+            None if sweep_timeout is None else time.monotonic() + sweep_timeout
+        )
+        self.block_number = 0
+        self.block_timestamp = 0
+        self._chain_id: Optional[int] = None
+        self._instances: Dict[str, Any] = {}
+
+    @property
+    def expired(self) -> bool:
+        """Check whether the deadline of the sweep has passed."""
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def get_call_timeout(self) -> Optional[float]:
+        """Get the time a call can take, bounded by the deadline of the sweep."""
+        if self.deadline is None:
+            return self.call_timeout
+        # a call made right at the deadline still needs a positive timeout
+        remaining = max(0.01, self.deadline - time.monotonic())
+        if self.call_timeout is None:
+            return remaining
+        return min(self.call_timeout, remaining)
+
+    def make_request(self, method: str, params: List[Any]) -> Dict[str, Any]:
+        """Make a raw JSON-RPC request, within the call timeout over http."""
+        if self.expired:
+            raise SweepTimeout(f"{method} not sent")
+        provider = self.ledger_api.api.provider
+        timeout = self.get_call_timeout()
+        if not isinstance(provider, HTTPProvider) or timeout is None:
+            return provider.make_request(method, params)
+        return post_json_rpc(
+            provider,
+            {"jsonrpc": "2.0", "id": 1, "method": method, "params": params},
+            timeout,
+        )
+
+    def call(self, to: str, data: str) -> HexBytes:
+        """Make an `eth_call` at the block of the sweep, within the call timeout over http."""
+        # the raw request keeps the revert data, which web3 drops from its errors
+        response = self.make_request(
+            "eth_call", [{"to": to, "data": data}, self.block_identifier]
+        )
+        error = response.get("error", None)
+        if error is not None:
+            raise get_call_error(error)
+        return HexBytes(response["result"])
+
+    def set_block(self, block_number: int, block_timestamp: int) -> None:
+        """Set the block the orders are evaluated against."""
+        self.block_number = block_number
+        self.block_timestamp = block_timestamp
+
+    def load_latest_block(self) -> None:
+        """Evaluate the orders against the latest block, within the call timeout over http."""
+        provider = self.ledger_api.api.provider
+        if not isinstance(provider, HTTPProvider) or self.get_call_timeout() is None:
+            block = self.ledger_api.api.eth.get_block("latest")
+            self.set_block(block.number, block.timestamp)
+            return
+        response = self.make_request("eth_getBlockByNumber", ["latest", False])
+        block = response.get("result", None)
+        if block is None:
+            raise JsonRpcError(response.get("error", response))
+        self.set_block(int(block["number"], 16), int(block["timestamp"], 16))
+
+    @property
+    def block_identifier(self) -> str:
+        """Get the identifier of the block, to pin the calls to it."""
+        return hex(self.block_number)
+
+    @property
+    def chain_id(self) -> int:
+        """Get the chain id."""
+        if self._chain_id is None:
+            self._chain_id = self.ledger_api.api.eth.chain_id
+        return self._chain_id
+
+    def get_instance(self, contract_address: str) -> Any:
+        """Get the contract instance at an address."""
+        instance = self._instances.get(contract_address, None)
+        if instance is None:
+            instance = self.contract.get_instance(self.ledger_api, contract_address)
+            self._instances[contract_address] = instance
+        return instance
+
+
+class TradeableOrderCache:
+    """
+    The results of `getTradeableOrderWithSignature`, by order id and block.
+
+    The calls of a sweep are pinned to a block, so their results do not change
+    within it: retries and overlapping sweeps in the same block are answered
+    from the cache. Only the results and the reverts are cached, not the errors
+    of the node, which may not happen again. The least recently used entries are
+    evicted over `max_size`.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        """Initialize the cache."""
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._results: OrderedDict = OrderedDict()
+        # the sweeps may run in several threads of the ledger connection
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Get the number of cached results."""
+        return len(self._results)
+
+    def get(
+        self, order_id: Any, block_number: int
+    ) -> Optional[Union[Tuple, ContractRevert]]:
+        """Get the result of an order at a block, if cached."""
+        key = (order_id, block_number)
+        with self._lock:
+            result = self._results.get(key, None)
+            if result is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._results.move_to_end(key)
+            return result
+
+    def set(
+        self, order_id: Any, block_number: int, result: Union[Tuple, Exception]
+    ) -> None:
+        """Cache the result of an order at a block, if it can be cached."""
+        if isinstance(result, Exception) and not isinstance(result, ContractRevert):
+            return
+        key = (order_id, block_number)
+        with self._lock:
+            self._results[key] = result
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_size:
+                self._results.popitem(last=False)
+
+    def resize(self, max_size: int) -> None:
+        """Set the maximum number of cached results, evicting the least recently used ones over it."""
+        with self._lock:
+            self.max_size = max_size
+            while len(self._results) > self.max_size:
+                self._results.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        """Get the size of the cache and its hits and misses."""
+        with self._lock:
+            return {
+                "size": len(self._results),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def clear(self) -> None:
+        """Clear the cache and its counters."""
+        with self._lock:
+            self._results.clear()
+            self.hits = 0
+            self.misses = 0
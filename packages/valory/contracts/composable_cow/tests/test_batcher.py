@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2023 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+
+"""Tests for the batching of JSON-RPC requests."""
+
+from typing import Any, Dict, List, Optional
+from unittest.mock import MagicMock, patch
+
+import pytest
+from eth_abi import encode
+from requests import Response
+from requests.exceptions import ConnectionError as RequestsConnectionError
+from requests.exceptions import HTTPError, ReadTimeout
+from web3 import HTTPProvider, Web3
+
+from packages.valory.contracts.composable_cow.batcher import JsonRpcBatcher
+from packages.valory.contracts.composable_cow.contract import (
+    ComposableCowContract,
+    POLL_ERROR_TYPES,
+    PollError,
+)
+from packages.valory.contracts.composable_cow.sweep import (
+    ContractRevert,
+    JsonRpcError,
+    SweepContext,
+    SweepTimeout,
+)
+
+
+def answer(
+    payload: List[Dict[str, Any]], timeout: Optional[float] = None
+) -> List[Dict[str, Any]]:
+    """Answer each request of a batch with its id."""
+    return [
+        {"jsonrpc": "2.0", "id": request["id"], "result": hex(request["id"])}
+        for request in payload
+    ]
+
+
+def get_batcher(max_batch_size: int) -> JsonRpcBatcher:
+    """Get a batcher of an http endpoint."""
+    return JsonRpcBatcher(HTTPProvider("http://node"), max_batch_size)
+
+
+@pytest.fixture(autouse=True)
+def clear_batch_sizes() -> None:
+    """Do not share the learned batch sizes across the tests."""
+    JsonRpcBatcher._batch_sizes.clear()
+
+
+def test_request() -> None:
+    """Test that the requests are sent in batches, and their results returned in order."""
+    batcher = get_batcher(2)
+    with patch.object(JsonRpcBatcher, "_post", side_effect=answer) as post:
+        results = batcher.request([("eth_call", [{}, "latest"])] * 5)
+    assert results == [hex(index) for index in range(5)]
+    assert [len(call.args[0]) for call in post.call_args_list] == [2, 2, 1]
+    assert post.call_args_list[0].args[0][0] == {
+        "jsonrpc": "2.0",
+        "id": 0,
+        "method": "eth_call",
+        "params": [{}, "latest"],
+    }
+
+
+def test_request_partial_response() -> None:
+    """Test that the requests dropped from a batch are retried in a halved batch."""
+    batcher = get_batcher(4)
+
+    def drop_half(
+        payload: List[Dict[str, Any]], timeout: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """Drop the second half of the batches of more than two requests."""
+        responses = answer(payload, timeout)
+        if len(payload) > 2:
+            return responses[: len(payload) // 2]
+        return responses
+
+    with patch.object(JsonRpcBatcher, "_post", side_effect=drop_half) as post:
+        results = batcher.request([("eth_blockNumber", [])] * 4)
+    assert results == [hex(index) for index in range(4)]
+    sent = [[request["id"] for request in call.args[0]] for call in post.call_args_list]
+    # the dropped requests are retried first, in a batch of half the size
+    assert sent == [[0, 1, 2, 3], [2, 3]]
+    assert batcher.batch_size == 3
+
+
+def test_request_rate_limited() -> None:
+    """Test that the requests failed because of the limits of the provider are retried."""
+    batcher = get_batcher(2)
+    responses = [
+        [
+            {"id": 0, "result": "0x0"},
+            {"id": 1, "error": {"code": -32005, "message": "limit exceeded"}},
+        ],
+        [{"id": 1, "result": "0x1"}],
+    ]
+    with patch.object(JsonRpcBatcher, "_post", side_effect=responses):
+        assert batcher.request([("eth_blockNumber", [])] * 2) == ["0x0", "0x1"]
+
+
+def test_request_rejected() -> None:
+    """Test that a batch answered with a single error is rejected and split."""
+    batcher = get_batcher(2)
+    rejection = {"jsonrpc": "2.0", "id": None, "error": {"code": -32600}}
+    with patch(
+        "packages.valory.contracts.composable_cow.batcher.post_json_rpc",
+        side_effect=[rejection, answer([{"id": 0}]), answer([{"id": 1}])],
+    ) as post:
+        results = batcher.request([("eth_blockNumber", [])] * 2)
+    assert results == ["0x0", "0x1"]
+    assert [len(call.args[1]) for call in post.call_args_list] == [2, 1, 1]
+
+
+def test_request_single_failure() -> None:
+    """Test that a request whose response cannot be parsed gets the exception, without holding the others back."""
+    batcher = get_batcher(1)
+    error = ValueError("Expecting value")
+    with patch.object(
+        JsonRpcBatcher, "_post", side_effect=[error, [{"id": 1, "result": "0x1"}]]
+    ):
+        results = batcher.request([("eth_blockNumber", [])] * 2)
+    assert results == [error, "0x1"]
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        RequestsConnectionError("connection reset"),
+        ReadTimeout("read timed out"),
+        HTTPError("bad gateway", response=MagicMock(status_code=502)),
+    ],
+)
+def test_request_endpoint_failure(error: Exception) -> None:
+    """Test that a batch failed because of the endpoint fails all the requests at once, without splitting it."""
+    batcher = get_batcher(2)
+    with patch.object(JsonRpcBatcher, "_post", side_effect=error) as post:
+        results = batcher.request([("eth_blockNumber", [])] * 3)
+    assert results == [error] * 3
+    assert post.call_count == 1
+    assert batcher.batch_size == 2
+
+
+def test_request_payload_too_large() -> None:
+    """Test that a batch rejected as too large is split."""
+    batcher = get_batcher(2)
+    response = Response()
+    response.status_code = 413
+    error = HTTPError("payload too large", response=response)
+    with patch.object(
+        JsonRpcBatcher, "_post", side_effect=[error, answer([{"id": 0}])]
+    ) as post:
+        (result,) = batcher.request([("eth_blockNumber", [])])
+    assert result == "0x0"
+    assert post.call_count == 2
+
+
+def test_request_dropped() -> None:
+    """Test that a single request the provider keeps dropping fails."""
+    batcher = get_batcher(1)
+    with patch.object(JsonRpcBatcher, "_post", return_value=[]):
+        (result,) = batcher.request([("eth_blockNumber", [])])
+    assert isinstance(result, JsonRpcError)
+
+
+def test_batch_size_growth() -> None:
+    """Test that the batch size grows by one after a clean batch, up to the maximum, and is shared by the endpoint."""
+    batcher = get_batcher(4)
+    batcher._resize(2)
+    with patch.object(JsonRpcBatcher, "_post", side_effect=answer):
+        batcher.request([("eth_blockNumber", [])] * 2)
+        assert batcher.batch_size == 3
+        assert get_batcher(4).batch_size == 3
+        batcher.request([("eth_blockNumber", [])] * 3)
+        batcher.request([("eth_blockNumber", [])] * 4)
+    assert batcher.batch_size == 4
+
+
+def test_request_expired() -> None:
+    """Test that no batch is sent after the deadline of the sweep."""
+    batcher = get_batcher(2)
+    context = SweepContext(ComposableCowContract, MagicMock(), sweep_timeout=0.0)
+    with patch.object(JsonRpcBatcher, "_post") as post:
+        results = batcher.request([("eth_blockNumber", [])] * 2, context)
+    post.assert_not_called()
+    assert all(isinstance(result, SweepTimeout) for result in results)
+
+
+def test_get_tradeable_orders_batched_revert() -> None:
+    """Test that an entry of a batch that reverted maps to a revert with its data, and a node error does not."""
+    selector = Web3.keccak(text="PollNever(string)")[:4]
+    data = bytes(selector) + encode(POLL_ERROR_TYPES["PollNever"], ["never"])
+    responses = [
+        {
+            "id": 0,
+            "error": {
+                "code": 3,
+                "message": "execution reverted",
+                "data": "0x" + data.hex(),
+            },
+        },
+        {"id": 1, "error": {"code": -32000, "message": "header not found"}},
+    ]
+    ledger_api = MagicMock()
+    ledger_api.api.codec = Web3().codec
+    context = SweepContext(ComposableCowContract, ledger_api)
+    orders = [
+        {
+            "owner": "0x" + "11" * 20,
+            "params": ["0x" + "22" * 20, b"\x01" * 32, b""],
+            "offchainInput": b"",
+            "proof": [],
+            "composableCow": "0x" + "33" * 20,
+        }
+    ] * 2
+    with patch.object(ComposableCowContract, "get_instance"), patch.object(
+        JsonRpcBatcher, "_post", return_value=responses
+    ):
+        revert, error = ComposableCowContract._get_tradeable_orders_batched(
+            context, get_batcher(2), orders
+        )
+    assert isinstance(revert, ContractRevert) and bytes(revert.data) == data
+    assert ComposableCowContract.decode_poll_error(ledger_api, revert) == PollError(
+        "PollNever", None, "never"
+    )
+    assert isinstance(error, JsonRpcError) and not isinstance(error, ContractRevert)
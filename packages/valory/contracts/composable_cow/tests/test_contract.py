@@ -0,0 +1,417 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2023 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+
+"""Tests for the composable_cow contract."""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Dict, List
+from unittest.mock import MagicMock, patch
+
+import pytest
+from eth_abi import encode
+from web3 import Web3
+
+from packages.valory.contracts.composable_cow.batcher import JsonRpcBatcher
+from packages.valory.contracts.composable_cow.breaker import CircuitBreaker
+from packages.valory.contracts.composable_cow.contract import (
+    ComposableCowContract,
+    MULTICALL3_ADDRESS,
+    MULTICALL3_OUTPUT_TYPES,
+    POLL_ERROR_SELECTORS,
+    POLL_ERROR_TYPES,
+    PollError,
+    TRADEABLE_ORDER_CACHE_SIZE,
+    TRADEABLE_ORDER_OUTPUT_TYPES,
+)
+from packages.valory.contracts.composable_cow.sweep import (
+    ContractRevert,
+    SweepContext,
+    SweepTimeout,
+)
+
+
+OWNER = "0x" + "11" * 20
+BLOCK_NUMBER = 100
+BLOCK_TIMESTAMP = 1_000_000
+SECONDS_PER_BLOCK = 12
+
+
+def get_ledger_api() -> MagicMock:
+    """Get a ledger api with a real codec, at a fixed block."""
+    ledger_api = MagicMock()
+    ledger_api.api.codec = Web3().codec
+    ledger_api.api.provider.endpoint_uri = "http://node"
+    ledger_api.api.eth.get_block.return_value = MagicMock(
+        number=BLOCK_NUMBER, timestamp=BLOCK_TIMESTAMP
+    )
+    return ledger_api
+
+
+def get_revert(name: str, args: List[Any]) -> ContractRevert:
+    """Get the revert of a call with a poll error."""
+    selector = Web3.keccak(text=f"{name}({','.join(POLL_ERROR_TYPES[name])})")[:4]
+    data = bytes(selector) + encode(POLL_ERROR_TYPES[name], args)
+    return ContractRevert("execution reverted", data)
+
+
+def get_order(id_: bytes) -> Dict[str, Any]:
+    """Get an order of an unknown handler, which can only be polled."""
+    return {
+        "id": id_,
+        "owner": OWNER,
+        "params": ["0x" + "22" * 20, b"\x01" * 32, b""],
+        "offchainInput": b"",
+        "proof": [],
+        "composableCow": "0x" + "33" * 20,
+        "orderType": None,
+    }
+
+
+def get_result(valid_to: int) -> bytes:
+    """Get the encoded result of `getTradeableOrderWithSignature`."""
+    order_data = (
+        "0x" + "44" * 20,
+        "0x" + "55" * 20,
+        OWNER,
+        10,
+        20,
+        valid_to,
+        b"\x00" * 32,
+        0,
+        b"\x66" * 32,
+        False,
+        b"\x77" * 32,
+        b"\x77" * 32,
+    )
+    return encode(TRADEABLE_ORDER_OUTPUT_TYPES, [order_data, b"signature"])
+
+
+def get_multicall(ledger_api: MagicMock, side_effect: List[Any]) -> MagicMock:
+    """Get the Multicall3 instance, whose `aggregate3` calls have the given side effects."""
+    multicall = ledger_api.api.eth.contract.return_value
+    ledger_api.api.provider.make_request.side_effect = [
+        effect
+        if isinstance(effect, Exception)
+        else {"result": "0x" + encode(MULTICALL3_OUTPUT_TYPES, [effect]).hex()}
+        for effect in side_effect
+    ]
+    return multicall
+
+
+@pytest.fixture(autouse=True)
+def clear_cache() -> None:
+    """Do not share the cached results and the state of the endpoints across the tests."""
+    ComposableCowContract._tradeable_order_cache.clear()
+    CircuitBreaker._breakers.clear()
+    JsonRpcBatcher._batch_sizes.clear()
+
+
+@pytest.mark.parametrize(
+    "name, args, expected",
+    [
+        ("PollTryNextBlock", ["wait"], PollError("PollTryNextBlock", None, "wait")),
+        (
+            "PollTryAtBlock",
+            [120, "later"],
+            PollError("PollTryAtBlock", 120, "later"),
+        ),
+        (
+            "PollTryAtEpoch",
+            [2_000_000, "later"],
+            PollError("PollTryAtEpoch", 2_000_000, "later"),
+        ),
+        ("PollNever", ["never"], PollError("PollNever", None, "never")),
+        (
+            "OrderNotValid",
+            ["not funded"],
+            PollError("OrderNotValid", None, "not funded"),
+        ),
+        ("ProofNotAuthed", [], PollError("ProofNotAuthed", None, "")),
+        ("SingleOrderNotAuthed", [], PollError("SingleOrderNotAuthed", None, "")),
+        ("InterfaceNotSupported", [], PollError("InterfaceNotSupported", None, "")),
+        ("InvalidHandler", [], PollError("InvalidHandler", None, "")),
+    ],
+)
+def test_decode_poll_error(name: str, args: List[Any], expected: PollError) -> None:
+    """Test that each custom error is decoded from the revert data."""
+    assert len(POLL_ERROR_SELECTORS) == len(POLL_ERROR_TYPES)
+    error = get_revert(name, args)
+    assert ComposableCowContract.decode_poll_error(get_ledger_api(), error) == expected
+
+
+def test_decode_poll_error_unknown() -> None:
+    """Test that the reverts that are not poll errors are not decoded."""
+    ledger_api = get_ledger_api()
+    error = ContractRevert("execution reverted", b"\x12\x34\x56\x78")
+    assert ComposableCowContract.decode_poll_error(ledger_api, error) is None
+    assert ComposableCowContract.decode_poll_error(ledger_api, ValueError()) is None
+
+
+def test_decode_order() -> None:
+    """Test that the hex strings the skill sends an order as are decoded."""
+    order = {
+        **get_order(b"\x01"),
+        "id": "0x01",
+        "params": ["0x" + "22" * 20, "0x" + "01" * 32, "0x1234"],
+        "offchainInput": "0x",
+        "proof": ["0x" + "02" * 32],
+    }
+    decoded = ComposableCowContract.decode_order(order)
+    assert decoded["id"] == "0x01"
+    assert decoded["params"] == ["0x" + "22" * 20, b"\x01" * 32, b"\x12\x34"]
+    assert decoded["offchainInput"] == b""
+    assert decoded["proof"] == [b"\x02" * 32]
+
+
+@pytest.mark.parametrize(
+    "name, args, dropped, timestamp",
+    [
+        ("PollNever", ["never"], True, None),
+        ("ProofNotAuthed", [], True, None),
+        ("SingleOrderNotAuthed", [], True, None),
+        ("InterfaceNotSupported", [], True, None),
+        ("InvalidHandler", [], True, None),
+        ("OrderNotValid", ["not funded"], False, BLOCK_TIMESTAMP + SECONDS_PER_BLOCK),
+        ("PollTryNextBlock", ["wait"], False, BLOCK_TIMESTAMP + SECONDS_PER_BLOCK),
+        (
+            "PollTryAtBlock",
+            [BLOCK_NUMBER + 5, "later"],
+            False,
+            BLOCK_TIMESTAMP + 5 * SECONDS_PER_BLOCK,
+        ),
+        ("PollTryAtEpoch", [2_000_000, "later"], False, 2_000_000),
+    ],
+)
+def test_get_tradeable_order_poll_errors(
+    name: str, args: List[Any], dropped: bool, timestamp: Any
+) -> None:
+    """Test that the errors after which an order will never be tradeable drop it, and that the others reschedule it."""
+    order = get_order(b"\x01")
+    with patch.object(ComposableCowContract, "get_instance"), patch.object(
+        ComposableCowContract,
+        "_get_tradeable_order_result",
+        side_effect=get_revert(name, args),
+    ):
+        data = ComposableCowContract.get_tradeable_order(
+            get_ledger_api(),
+            "0x" + "33" * 20,
+            [order],
+            seconds_per_block=SECONDS_PER_BLOCK,
+        )["data"]
+    if dropped:
+        assert data["drop_orders"] == [{"id": b"\x01", "from": OWNER, "reason": name}]
+        assert data["next_checks"] == []
+        return
+    assert data["drop_orders"] == []
+    assert data["next_checks"] == [{"id": b"\x01", "timestamp": timestamp}]
+
+
+def test_get_tradeable_order_revert_suppressed() -> None:
+    """Test that an order that reverted is not called again by a sweep at the same block, only at a new one."""
+    ledger_api = get_ledger_api()
+    with patch.object(ComposableCowContract, "get_instance"), patch.object(
+        ComposableCowContract,
+        "_get_tradeable_order_result",
+        side_effect=get_revert("PollTryNextBlock", ["wait"]),
+    ) as call:
+        for _ in range(2):
+            data = ComposableCowContract.get_tradeable_order(
+                ledger_api, "0x" + "33" * 20, [get_order(b"\x01")]
+            )["data"]
+            assert data["next_checks"] == [
+                {"id": b"\x01", "timestamp": BLOCK_TIMESTAMP + SECONDS_PER_BLOCK}
+            ]
+        assert call.call_count == 1
+        # the second sweep was answered from the cache
+        assert (data["cache"]["size"], data["cache"]["hits"]) == (1, 1)
+        assert data["cache"]["misses"] == 1
+        assert data["cache"]["max_size"] == TRADEABLE_ORDER_CACHE_SIZE
+
+        ledger_api.api.eth.get_block.return_value = MagicMock(
+            number=BLOCK_NUMBER + 1, timestamp=BLOCK_TIMESTAMP + SECONDS_PER_BLOCK
+        )
+        ComposableCowContract.get_tradeable_order(
+            ledger_api, "0x" + "33" * 20, [get_order(b"\x01")]
+        )
+        assert call.call_count == 2
+
+
+def test_get_tradeable_order_breaker_open() -> None:
+    """Test that a sweep does not call an endpoint whose breaker is open."""
+    ledger_api = get_ledger_api()
+    ledger_api.api.provider.make_request.return_value = {
+        "error": {"code": -32000, "message": "header not found"}
+    }
+    for _ in range(2):
+        with patch.object(ComposableCowContract, "get_instance"):
+            data = ComposableCowContract.get_tradeable_order(
+                ledger_api, "0x" + "33" * 20, [get_order(b"\x01")], breaker_threshold=2
+            )["data"]
+        # the node errors are not cached
+        ComposableCowContract._tradeable_order_cache.clear()
+    assert data["rpc"]["degraded"]
+    calls = ledger_api.api.provider.make_request.call_count
+    data = ComposableCowContract.get_tradeable_order(
+        ledger_api, "0x" + "33" * 20, [get_order(b"\x01")], breaker_threshold=2
+    )["data"]
+    assert ledger_api.api.provider.make_request.call_count == calls
+    assert data["tradeable_orders"] == [] and data["rpc"]["state"] == "open"
+
+
+def test_multicall_decoding() -> None:
+    """Test that each result of `aggregate3` is decoded, and that a revert or an undecodable result only affects its order."""
+    ledger_api = get_ledger_api()
+    revert = get_revert("PollNever", ["never"])
+    multicall = get_multicall(
+        ledger_api,
+        [[(True, get_result(1_000_600)), (False, revert.data)], [(True, b"\x01")]],
+    )
+    context = SweepContext(ComposableCowContract, ledger_api)
+    context.load_latest_block()
+    orders = [get_order(bytes([index])) for index in range(3)]
+    with patch.object(ComposableCowContract, "get_instance") as get_instance:
+        get_instance.return_value.address = orders[0]["composableCow"]
+        get_instance.return_value.encodeABI.return_value = "0x1234"
+        results = ComposableCowContract._get_tradeable_orders_multicall(
+            context, orders, 2
+        )
+
+    ledger_api.api.eth.contract.assert_called_once()
+    assert ledger_api.api.eth.contract.call_args.kwargs["address"] == MULTICALL3_ADDRESS
+    calls = multicall.encodeABI.call_args_list
+    assert [len(call.kwargs["args"][0]) for call in calls] == [2, 1]
+    # each call can fail on its own
+    assert calls[0].kwargs["args"][0][0] == (
+        orders[0]["composableCow"],
+        True,
+        "0x1234",
+    )
+    # the batches are raw requests, for the call timeout to apply
+    eth_call = ledger_api.api.provider.make_request.call_args
+    assert eth_call.args[0] == "eth_call"
+    assert eth_call.args[1][0]["to"] == MULTICALL3_ADDRESS
+    assert eth_call.args[1][1] == hex(BLOCK_NUMBER)
+    order_data, signature = results[0]
+    assert order_data[5] == 1_000_600 and signature == b"signature"
+    assert isinstance(results[1], ContractRevert)
+    assert ComposableCowContract.decode_poll_error(ledger_api, results[1]) == PollError(
+        "PollNever", None, "never"
+    )
+    assert isinstance(results[2], Exception)
+    assert not isinstance(results[2], ContractRevert)
+
+
+def test_multicall_failures() -> None:
+    """Test that a failed batch fails all its orders, and that the batches after the deadline are not sent."""
+    ledger_api = get_ledger_api()
+    error = OSError("connection reset")
+    revert = get_revert("PollNever", ["never"])
+    get_multicall(ledger_api, [error, [(False, revert.data)]])
+    orders = [get_order(bytes([index])) for index in range(3)]
+    context = SweepContext(ComposableCowContract, ledger_api)
+    with patch.object(ComposableCowContract, "get_instance"):
+        results = ComposableCowContract._get_tradeable_orders_multicall(
+            context, orders, 2
+        )
+        assert results[:2] == [error, error]
+        assert isinstance(results[2], ContractRevert)
+
+        context = SweepContext(ComposableCowContract, ledger_api, sweep_timeout=0.0)
+        results = ComposableCowContract._get_tradeable_orders_multicall(
+            context, orders, 2
+        )
+    assert all(isinstance(result, SweepTimeout) for result in results)
+
+
+def test_get_tradeable_order_multicall() -> None:
+    """Test that a sweep through Multicall3 returns the tradeable orders and drops the orders that will never be."""
+    ledger_api = get_ledger_api()
+    ledger_api.api.eth.chain_id = 1
+    revert = get_revert("PollNever", ["never"])
+    get_multicall(ledger_api, [[(True, get_result(1_000_600)), (False, revert.data)]])
+    with patch.object(ComposableCowContract, "get_instance"):
+        data = ComposableCowContract.get_tradeable_order(
+            ledger_api,
+            "0x" + "33" * 20,
+            [get_order(b"\x01"), get_order(b"\x02")],
+            multicall_chunk_size=10,
+        )["data"]
+    assert [order["id"] for order in data["tradeable_orders"]] == [b"\x01"]
+    assert data["tradeable_orders"][0]["validTo"] == 1_000_600
+    assert data["tradeable_orders"][0]["signature"] == "0x" + b"signature".hex()
+    assert data["drop_orders"] == [
+        {"id": b"\x02", "from": OWNER, "reason": "PollNever"}
+    ]
+    assert data["rpc"]["failures"] == 0
+
+
+def test_map_concurrently_timeout() -> None:
+    """Test that a call that does not answer in time fails, and that the calls that have not started are not made."""
+    release = threading.Event()
+    called = []
+
+    def call(item: int) -> int:
+        """Block until released."""
+        called.append(item)
+        release.wait(5.0)
+        return item
+
+    executor = ThreadPoolExecutor(max_workers=1)
+    try:
+        results = ComposableCowContract._map_concurrently(
+            executor, 1, call, [1, 2], 0.05
+        )
+    finally:
+        release.set()
+        executor.shutdown(wait=True)
+    assert isinstance(results[0], FutureTimeoutError)
+    assert isinstance(results[1], SweepTimeout)
+    assert called == [1]
+
+
+def test_get_tradeable_order_call_timeout() -> None:
+    """Test that the calls that time out on the thread pool count as failures of the endpoint."""
+    release = threading.Event()
+
+    def call(*_: Any) -> None:
+        """Block until released."""
+        release.wait(5.0)
+
+    ledger_api = get_ledger_api()
+    try:
+        with patch.object(
+            ComposableCowContract, "_get_tradeable_order_result", side_effect=call
+        ):
+            data = ComposableCowContract.get_tradeable_order(
+                ledger_api,
+                "0x" + "33" * 20,
+                [get_order(b"\x01")],
+                max_workers=1,
+                call_timeout=0.05,
+                breaker_threshold=1,
+            )["data"]
+    finally:
+        release.set()
+    assert data["tradeable_orders"] == [] and data["drop_orders"] == []
+    assert data["rpc"]["failures"] == 1 and data["rpc"]["state"] == "open"
+    # the timeouts are not cached, the order is called again once the endpoint is back
+    assert len(ComposableCowContract._tradeable_order_cache) == 0
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2023 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""Tests for the state of a sweep and the cached results."""
+
+import json
+from unittest.mock import MagicMock, patch
+
+import pytest
+from web3 import HTTPProvider
+
+from packages.valory.contracts.composable_cow.contract import ComposableCowContract
+from packages.valory.contracts.composable_cow.sweep import (
+    ContractRevert,
+    JsonRpcError,
+    SweepContext,
+    SweepTimeout,
+    TradeableOrderCache,
+)
+
+
+def test_make_request_session() -> None:
+    """Test that the calls are posted through the session of the endpoint, with the call timeout."""
+    ledger_api = MagicMock()
+    ledger_api.api.provider = HTTPProvider("http://node")
+    context = SweepContext(ComposableCowContract, ledger_api, 10.0, 2.0)
+    session = MagicMock()
+    session.post.return_value.content = b'{"jsonrpc": "2.0", "id": 1, "result": "0x"}'
+    with patch(
+        "web3._utils.request.cache_and_return_session", return_value=session
+    ) as get_session:
+        for _ in range(2):
+            assert context.make_request("eth_call", [{}, "latest"])["result"] == "0x"
+    get_session.assert_called_with("http://node")
+    assert session.post.call_count == 2
+    timeout = session.post.call_args.kwargs["timeout"]
+    assert 0 < timeout <= 2.0
+
+
+def test_load_latest_block_timeout() -> None:
+    """Test that the latest block is loaded with the call timeout over http."""
+    ledger_api = MagicMock()
+    ledger_api.api.provider = HTTPProvider("http://node")
+    context = SweepContext(ComposableCowContract, ledger_api, 10.0)
+    session = MagicMock()
+    block = {"number": "0x64", "timestamp": "0x10"}
+    session.post.return_value.content = json.dumps(
+        {"jsonrpc": "2.0", "id": 1, "result": block}
+    ).encode()
+    with patch("web3._utils.request.cache_and_return_session", return_value=session):
+        context.load_latest_block()
+    assert (context.block_number, context.block_timestamp) == (100, 16)
+    assert session.post.call_args.kwargs["timeout"] == 10.0
+    ledger_api.api.eth.get_block.assert_not_called()
+
+
+def test_call_revert() -> None:
+    """Test that an `eth_call` is pinned to the block of the sweep, and keeps the revert data."""
+    ledger_api = MagicMock()
+    ledger_api.api.provider.make_request.side_effect = [
+        {"result": "0x1234"},
+        {"error": {"message": "execution reverted", "data": "0xabcd"}},
+    ]
+    context = SweepContext(ComposableCowContract, ledger_api)
+    context.set_block(100, 16)
+    assert context.call("0x" + "11" * 20, "0x") == b"\x12\x34"
+    ledger_api.api.provider.make_request.assert_called_with(
+        "eth_call", [{"to": "0x" + "11" * 20, "data": "0x"}, "0x64"]
+    )
+    with pytest.raises(ContractRevert) as error:
+        context.call("0x" + "11" * 20, "0x")
+    assert error.value.data == b"\xab\xcd"
+
+
+def test_make_request_expired() -> None:
+    """Test that no call is made after the deadline of the sweep."""
+    ledger_api = MagicMock()
+    context = SweepContext(ComposableCowContract, ledger_api, 10.0, 0.0)
+    assert context.expired
+    with pytest.raises(SweepTimeout):
+        context.make_request("eth_call", [{}, "latest"])
+    ledger_api.api.provider.make_request.assert_not_called()
+
+
+def test_tradeable_order_cache() -> None:
+    """Test that the results are cached by order and block, with the reverts but not the node errors."""
+    cache = TradeableOrderCache(10)
+    result = (("order",), b"signature")
+    assert cache.get(b"\x01", 100) is None
+    cache.set(b"\x01", 100, result)
+    assert cache.get(b"\x01", 100) == result
+    # the result of another block may differ
+    assert cache.get(b"\x01", 101) is None
+    revert = ContractRevert("execution reverted", b"\x12\x34\x56\x78")
+    cache.set(b"\x02", 100, revert)
+    assert cache.get(b"\x02", 100) is revert
+    cache.set(b"\x03", 100, JsonRpcError({"code": -32000}))
+    cache.set(b"\x04", 100, TimeoutError())
+    assert cache.get(b"\x03", 100) is None and cache.get(b"\x04", 100) is None
+    assert len(cache) == 2
+    assert cache.stats() == {"size": 2, "max_size": 10, "hits": 2, "misses": 4}
+    cache.clear()
+    assert cache.stats() == {"size": 0, "max_size": 10, "hits": 0, "misses": 0}
+
+
+def test_tradeable_order_cache_eviction() -> None:
+    """Test that the least recently used results are evicted over the size of the cache."""
+    cache = TradeableOrderCache(2)
+    cache.set(b"\x01", 100, ("first",))
+    cache.set(b"\x02", 100, ("second",))
+    # the first result is used again, so the second one is the least recently used
+    assert cache.get(b"\x01", 100) == ("first",)
+    cache.set(b"\x03", 100, ("third",))
+    assert len(cache) == 2
+    assert cache.get(b"\x02", 100) is None
+    assert cache.get(b"\x01", 100) == ("first",)
+    assert cache.get(b"\x03", 100) == ("third",)
+    # shrinking the cache evicts the least recently used results over its new size
+    cache.resize(1)
+    assert len(cache) == 1
+    assert cache.get(b"\x03", 100) == ("third",)
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2023 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""This module contains the static input of a TWAP order, and a local model of its parts."""
+
+from dataclasses import dataclass
+from typing import Any, Optional, Tuple
+
+
+TWAP_STRUCT_ABI = [
+    ("address", "sellToken"),
+    ("address", "buyToken"),
+    ("address", "receiver"),
+    ("uint256", "partSellAmount"),
+    ("uint256", "minPartLimit"),
+    ("uint256", "t0"),
+    ("uint256", "n"),
+    ("uint256", "t"),
+    ("uint256", "span"),
+    ("bytes32", "appData"),
+]
+
+
+@dataclass
+class TWAPData:
+    """The static input of a TWAP order, decoded as TWAP_STRUCT_ABI."""
+
+    sellToken: str
+    buyToken: str
+    receiver: str
+    partSellAmount: int
+    minPartLimit: int
+    t0: int
+    n: int
+    t: int
+    span: int
+    appData: bytes
+
+
+class TWAP:
+    """
+    The parts of a TWAP order, as the TWAP handler of ComposableCoW computes them.
+
+    A TWAP of `n` parts starts at `start`, and part `k` can be traded in
+    `[start + k * t, start + k * t + span)`, or in `[start + k * t, start + (k + 1) * t)`
+    if `span` is 0. This is enough to know whether a part is tradeable at a given
+    time, without calling the chain.
+    """
+
+    __slots__ = ("start", "n", "t", "span")
+
+    def __init__(self, start: int, n: int, t: int, span: int) -> None:
+        """Initialize the TWAP."""
+        self.start = start
+        self.n = n
+        self.t = t
+        self.span = span
+
+    @classmethod
+    def from_data(
+        cls, data: Any, start_timestamp: Optional[int] = None
+    ) -> Optional["TWAP"]:
+        """
+        Get the model of a decoded TWAP.
+
+        :param data: the decoded static input of the TWAP, with `t0`, `n`, `t` and `span`.
+        :param start_timestamp: the start of the TWAP, for TWAPs that start when they are created.
+        :return: the model, or None if the start is not known or the TWAP is not valid.
+        """
+        start = data.t0 if data.t0 != 0 else start_timestamp
+        if start is None or start == 0 or data.n == 0 or data.t == 0:
+            return None
+        if data.span > data.t:
+            # rejected by the handler, every part would overlap the next one
+            return None
+        return cls(start, data.n, data.t, data.span)
+
+    @property
+    def end(self) -> int:
+        """Get the timestamp at which the last part stops being tradeable."""
+        return self.get_window(self.n - 1)[1]
+
+    def get_window(self, part: int) -> Tuple[int, int]:
+        """Get the `[begin, end)` window in which a part can be traded."""
+        begin = self.start + part * self.t
+        return begin, begin + (self.t if self.span == 0 else self.span)
+
+    def get_part(self, timestamp: int) -> Optional[int]:
+        """Get the part that a timestamp falls in, or None if it is before the start or after the end."""
+        if timestamp < self.start or timestamp >= self.end:
+            return None
+        return (timestamp - self.start) // self.t
+
+    def get_open_part(self, timestamp: int) -> Optional[int]:
+        """Get the part whose window is open at a timestamp, if any."""
+        part = self.get_part(timestamp)
+        if part is None or timestamp >= self.get_window(part)[1]:
+            return None
+        return part
+
+    def get_next_window_start(self, timestamp: int) -> Optional[int]:
+        """Get the start of the first window after the one a timestamp falls in, if any."""
+        if timestamp < self.start:
+            return self.start
+        part = (timestamp - self.start) // self.t + 1
+        if part >= self.n:
+            return None
+        return self.get_window(part)[0]
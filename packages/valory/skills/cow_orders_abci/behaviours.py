@@ -54,6 +54,8 @@ from packages.valory.skills.cow_orders_abci.rounds import (
 
 
 ORDERS = "ready_orders"
+# the agents that the owners are sharded across, read by the order monitoring skill
+PARTICIPANTS = "active_participants"
 DEFAULT_HTTP_HEADERS = {
     "Content-Type": "application/json",
     "accept": "application/json",
@@ -226,6 +228,7 @@ class SelectOrdersBehaviour(CowOrdersBaseBehaviour):
         """Do the act, supporting asynchronous execution."""
 
         with self.context.benchmark_tool.measure(self.behaviour_id).local():
+            self._set_active_participants()
             sender = self.context.agent_address
             content = self.get_payload_content()
             payload = SelectOrdersPayload(sender=sender, content=content)
@@ -236,6 +239,14 @@ class SelectOrdersBehaviour(CowOrdersBaseBehaviour):
 
         self.set_done()
 
+    def _set_active_participants(self) -> None:
+        """Share the agents that are still proposing orders with the order monitoring skill."""
+        if not self.params.use_sharding:
+            return
+        self.context.shared_state[
+            PARTICIPANTS
+        ] = self.synchronized_data.active_participants
+
     def get_payload_content(self) -> str:
         """Get the payload content."""
         # remove the orders we have already processed
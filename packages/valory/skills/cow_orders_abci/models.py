@@ -43,6 +43,9 @@ class Params(BaseParams):
     def __init__(self, *args: Any, **kwargs: Any) -> None:
         """Initialize the parameters object."""
         self.cow_api_url: str = self._ensure("cow_api_url", kwargs, type_=str)
+        self.use_sharding: bool = self._ensure("use_sharding", kwargs, type_=bool)
+        # the rounds read it from the synchronized data, which is set up from these
+        kwargs["setup"] = {**kwargs.get("setup", {}), "use_sharding": self.use_sharding}
         super().__init__(*args, **kwargs)
 
 
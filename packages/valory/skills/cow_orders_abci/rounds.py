@@ -20,9 +20,9 @@
 """This package contains the rounds of CowOrdersAbciApp."""
 import json
 import textwrap
-from collections import deque
+from collections import Counter, deque
 from enum import Enum
-from typing import Any, Deque, Dict, Optional, Set, Tuple, cast
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple, cast
 
 from packages.valory.skills.abstract_round_abci.base import (
     AbciApp,
@@ -49,6 +49,9 @@ from packages.valory.skills.cow_orders_abci.payloads import (
 MAX_INT_256 = 2**256 - 1
 ADDRESS_LENGTH = 42
 RETRIES_LENGTH = 64
+# the number of periods in a row an agent can miss all the order selections of
+# before its owners are taken over by the other agents
+MAX_MISSED_SELECTIONS = 3
 
 
 class Event(Enum):
@@ -136,6 +139,31 @@ class SynchronizedData(BaseSynchronizedData):
         """Get the order."""
         return cast(Optional[Dict[str, Any]], self.db.get("verified_order", None))
 
+    @property
+    def use_sharding(self) -> bool:
+        """Get whether the owners are sharded across the agents."""
+        return cast(bool, self.db.get("use_sharding", False))
+
+    @property
+    def participant_to_missed_selections(self) -> Dict[str, int]:
+        """Get the number of periods in a row each agent has missed all the order selections of."""
+        return cast(Dict[str, int], self.db.get("participant_to_missed_selections", {}))
+
+    @property
+    def selecting_participants(self) -> List[str]:
+        """Get the agents that have proposed in an order selection of the period."""
+        return cast(List[str], self.db.get("selecting_participants", []))
+
+    @property
+    def active_participants(self) -> List[str]:
+        """Get the agents that have not missed too many periods of order selections in a row."""
+        missed = self.participant_to_missed_selections
+        return sorted(
+            participant
+            for participant in self.participants
+            if missed.get(participant, 0) < MAX_MISSED_SELECTIONS
+        )
+
 
 class PlaceOrdersRound(OnlyKeeperSendsRound):
     """PlaceOrdersRound"""
@@ -193,7 +221,21 @@ class SelectKeeperRound(CollectSameUntilThresholdRound):
 
 
 class SelectOrdersRound(CollectSameUntilThresholdRound):
-    """SelectOrdersRound"""
+    """
+    SelectOrdersRound
+
+    When the owners are sharded, each agent only knows about the ready orders of
+    its own owners, so the agents cannot be expected to propose the same order.
+    Once a threshold of agents have proposed, the most proposed order is selected,
+    with ties broken by the lowest order uid, so that all the agents agree on it.
+    Otherwise, the agents must agree on the same order.
+
+    The agents whose proposals are collected are tracked, so that the owners of
+    the agents that drop out are taken over by the others. As the round ends once
+    a threshold of agents have proposed, a slower agent can miss a selection
+    while it is still running: a miss is only counted once the period is over
+    without the agent having proposed in any of its selections.
+    """
 
     payload_class = SelectOrdersPayload
     payload_attribute = "content"
@@ -201,28 +243,106 @@ class SelectOrdersRound(CollectSameUntilThresholdRound):
 
     NO_ORDERS_PAYLOAD = "no_orders_payload"
 
+    @property
+    def collection_threshold_reached(self) -> bool:
+        """Check whether enough agents have proposed an order."""
+        return len(self.collection) >= self.synchronized_data.consensus_threshold
+
+    @property
+    def selected_payload(self) -> Optional[str]:
+        """Get the selected order, or None if no agent has proposed one."""
+        proposals = Counter(
+            cast(SelectOrdersPayload, payload).content
+            for payload in self.collection.values()
+            if cast(SelectOrdersPayload, payload).content != self.NO_ORDERS_PAYLOAD
+        )
+        if len(proposals) == 0:
+            return None
+        selected, _ = min(
+            proposals.items(),
+            key=lambda proposal: (
+                -proposal[1],
+                json.loads(proposal[0]).get("order_uid", ""),
+                proposal[0],
+            ),
+        )
+        return selected
+
+    @property
+    def selecting_participants(self) -> List[str]:
+        """Get the agents that have proposed in an order selection of the period, with this one."""
+        synchronized_data = cast(SynchronizedData, self.synchronized_data)
+        return sorted(
+            set(synchronized_data.selecting_participants).union(self.collection)
+        )
+
+    @property
+    def missed_selections(self) -> Dict[str, int]:
+        """Get the number of periods in a row each agent has missed all the selections of, with this one."""
+        synchronized_data = cast(SynchronizedData, self.synchronized_data)
+        missed = synchronized_data.participant_to_missed_selections
+        selecting = set(self.selecting_participants)
+        return {
+            participant: 0
+            if participant in selecting
+            else missed.get(participant, 0) + 1
+            for participant in sorted(synchronized_data.participants)
+        }
+
     def end_block(self) -> Optional[Tuple[BaseSynchronizedData, Enum]]:
         """Process the end of the block."""
+        if cast(SynchronizedData, self.synchronized_data).use_sharding:
+            return self._end_block_sharded()
+
         if self.threshold_reached:
-            if self.most_voted_payload == self.NO_ORDERS_PAYLOAD:
-                return self.synchronized_data, Event.NO_ACTION
-            order = json.loads(self.most_voted_payload)
-            state = self.synchronized_data.update(
-                synchronized_data_class=self.synchronized_data_class,
-                **{
-                    get_name(SynchronizedData.order): order,
-                    get_name(SynchronizedData.verified_order): None,
-                }
+            return self._select(
+                None
+                if self.most_voted_payload == self.NO_ORDERS_PAYLOAD
+                else self.most_voted_payload
             )
-            return state, Event.DONE
-
         if not self.is_majority_possible(
             self.collection, self.synchronized_data.nb_participants
         ):
             return self.synchronized_data, Event.NO_MAJORITY
-
         return None
 
+    def _end_block_sharded(self) -> Optional[Tuple[BaseSynchronizedData, Enum]]:
+        """Process the end of the block, when the owners are sharded."""
+        if not self.collection_threshold_reached:
+            return None
+        return self._select(self.selected_payload)
+
+    def _select(self, payload: Optional[str]) -> Tuple[BaseSynchronizedData, Enum]:
+        """Select the order of a payload, or no order."""
+        if payload is None:
+            # the period is over, the missed selections are kept across periods
+            state = self.synchronized_data.update(
+                synchronized_data_class=self.synchronized_data_class,
+                **{
+                    get_name(
+                        SynchronizedData.participant_to_missed_selections
+                    ): self.missed_selections,
+                }
+            )
+            return state, Event.NO_ACTION
+        state = self.synchronized_data.update(
+            synchronized_data_class=self.synchronized_data_class,
+            **{
+                get_name(
+                    SynchronizedData.selecting_participants
+                ): self.selecting_participants,
+            }
+        )
+        order = json.loads(payload)
+        state = state.update(
+            synchronized_data_class=self.synchronized_data_class,
+            **{
+                get_name(SynchronizedData.order): order,
+                get_name(SynchronizedData.verified_order): None,
+            }
+        )
+        return state, Event.DONE
+
 
 class VerifyExecutionRound(CollectSameUntilThresholdRound):
     """VerifyExecutionRound"""
@@ -299,10 +419,15 @@ class CowOrdersAbciApp(AbciApp[Event]):
     event_to_timeout: EventToTimeout = {
         Event.ROUND_TIMEOUT: 30,
     }
-    cross_period_persisted_keys: Set[str] = set()
+    cross_period_persisted_keys: Set[str] = {
+        get_name(SynchronizedData.use_sharding),
+        get_name(SynchronizedData.participant_to_missed_selections),
+    }
     db_pre_conditions: Dict[AppState, Set[str]] = {
         SelectOrdersRound: set(),
     }
     db_post_conditions: Dict[AppState, Set[str]] = {
-        FinishedWithOrdersRound: set(),
+        FinishedWithOrdersRound: {
+            get_name(SynchronizedData.participant_to_missed_selections)
+        },
     }
@@ -39,13 +39,18 @@ from packages.valory.skills.cow_orders_abci.behaviours import (
     CowOrdersRoundBehaviour,
     DEFAULT_HTTP_HEADERS,
     ORDERS,
+    PARTICIPANTS,
     PlaceOrdersBehaviour,
     RandomnessBehaviour,
     SelectKeeperBehaviour,
     SelectOrdersBehaviour,
     VerifyExecutionBehaviour,
 )
-from packages.valory.skills.cow_orders_abci.rounds import Event, SynchronizedData
+from packages.valory.skills.cow_orders_abci.rounds import (
+    Event,
+    MAX_MISSED_SELECTIONS,
+    SynchronizedData,
+)
 from packages.valory.skills.cow_orders_abci.tests.test_rounds import get_keepers
 
 
@@ -244,6 +249,27 @@ class TestSelectOrdersBehaviour(BaseCowOrdersTest):
         self.fast_forward(test_case.initial_data)
         self.complete(test_case.event)
 
+    def test_active_participants(self) -> None:
+        """Test that the active participants are shared when sharding."""
+        participants = ["0x" + "aa" * 20, "0x" + "bb" * 20]
+        params = self.skill.skill_context.params
+        params.__dict__["_frozen"] = False
+        params.use_sharding = True
+        try:
+            self.behaviour.context.shared_state[ORDERS] = _DUMMY_ORDERS
+            self.fast_forward(
+                {
+                    "participants": participants,
+                    "participant_to_missed_selections": {
+                        participants[1]: MAX_MISSED_SELECTIONS
+                    },
+                }
+            )
+            self.complete(Event.DONE)
+        finally:
+            params.use_sharding = False
+        assert self.behaviour.context.shared_state[PARTICIPANTS] == participants[:1]
+
 
 class TestVerifyExecutionBehaviour(BaseCowOrdersTest):
     """Tests VerifyExecutionBehaviour"""
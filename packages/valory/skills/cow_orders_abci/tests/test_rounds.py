@@ -21,7 +21,18 @@
 import json
 from collections import deque
 from dataclasses import dataclass, field
-from typing import Any, Callable, Deque, Dict, Hashable, List, Mapping, Type, cast
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Hashable,
+    List,
+    Mapping,
+    Optional,
+    Type,
+    cast,
+)
 
 from packages.valory.skills.abstract_round_abci.base import (
     AbstractRound,
@@ -37,6 +48,7 @@ from packages.valory.skills.cow_orders_abci.payloads import (
 )
 from packages.valory.skills.cow_orders_abci.rounds import (
     Event,
+    MAX_MISSED_SELECTIONS,
     PlaceOrdersRound,
     SelectOrdersRound,
     SynchronizedData,
@@ -117,6 +129,19 @@ class TestSelectOrdersRound(BaseCowOrdersRoundTest):
 
     round_class = SelectOrdersRound
 
+    def _run(self, contents: List[Optional[str]], use_sharding: bool = True) -> Any:
+        """Process one payload per participant, none for a None content, and return the end of the block."""
+        test_round = self.round_class(
+            synchronized_data=self.synchronized_data.update(use_sharding=use_sharding),
+        )
+        for participant, content in zip(sorted(self.participants), contents):
+            if content is None:
+                continue
+            test_round.process_payload(
+                SelectOrdersPayload(sender=participant, content=content)
+            )
+        return test_round.end_block()
+
     def test_run(self) -> None:
         """Run tests."""
 
@@ -165,6 +190,83 @@ class TestSelectOrdersRound(BaseCowOrdersRoundTest):
 
         assert event == Event.DONE
 
+    def test_no_majority(self) -> None:
+        """Test that the agents must agree on the same order when not sharding."""
+        first = json.dumps(dict(order_uid="0x01"), sort_keys=True)
+        second = json.dumps(dict(order_uid="0x02"), sort_keys=True)
+        res = self._run([first, first, second, second], use_sharding=False)
+        assert res is not None
+        _, event = res
+        assert event == Event.NO_MAJORITY
+
+    def test_most_proposed_order(self) -> None:
+        """Test that the most proposed order is selected when the agents disagree."""
+        first = json.dumps(dict(order_uid="0x01"), sort_keys=True)
+        second = json.dumps(dict(order_uid="0x02"), sort_keys=True)
+        res = self._run([first, second, second])
+        assert res is not None
+        state, event = res
+        assert cast(SynchronizedData, state).order == json.loads(second)
+        assert event == Event.DONE
+
+    def test_tie_break(self) -> None:
+        """Test that ties are broken by the lowest order uid."""
+        first = json.dumps(dict(order_uid="0x02"), sort_keys=True)
+        second = json.dumps(dict(order_uid="0x01"), sort_keys=True)
+        res = self._run([first, SelectOrdersRound.NO_ORDERS_PAYLOAD, second])
+        assert res is not None
+        state, event = res
+        assert cast(SynchronizedData, state).order == json.loads(second)
+        assert event == Event.DONE
+
+    def test_no_orders(self) -> None:
+        """Test that there is no action when no agent has proposed an order."""
+        res = self._run([SelectOrdersRound.NO_ORDERS_PAYLOAD] * MAX_PARTICIPANTS)
+        assert res is not None
+        _, event = res
+        assert event == Event.NO_ACTION
+
+    def test_missed_selections(self) -> None:
+        """Test that the agents that keep missing the selections are not active anymore."""
+        participants = sorted(self.participants)
+        contents = [SelectOrdersRound.NO_ORDERS_PAYLOAD] * (MAX_PARTICIPANTS - 1)
+        for _ in range(MAX_MISSED_SELECTIONS):
+            assert self.synchronized_data.active_participants == participants
+            res = self._run(contents)
+            assert res is not None
+            self.synchronized_data = cast(SynchronizedData, res[0])
+        missed = self.synchronized_data.participant_to_missed_selections
+        assert missed == {
+            **{participant: 0 for participant in participants[:-1]},
+            participants[-1]: MAX_MISSED_SELECTIONS,
+        }
+        assert self.synchronized_data.active_participants == participants[:-1]
+
+        # the agent is active again as soon as it proposes
+        res = self._run(contents + [SelectOrdersRound.NO_ORDERS_PAYLOAD])
+        assert res is not None
+        synchronized_data = cast(SynchronizedData, res[0])
+        assert synchronized_data.active_participants == participants
+
+    def test_missed_selections_late(self) -> None:
+        """Test that an agent that proposes in a later selection of the period does not miss it."""
+        participants = sorted(self.participants)
+        order = json.dumps(dict(order_uid="0x01"), sort_keys=True)
+        # the last agent is too late for the first selection of the period
+        res = self._run([order] * (MAX_PARTICIPANTS - 1))
+        assert res is not None and res[1] == Event.DONE
+        self.synchronized_data = cast(SynchronizedData, res[0])
+        assert self.synchronized_data.participant_to_missed_selections == {}
+        assert self.synchronized_data.selecting_participants == participants[:-1]
+
+        # but in time for the last one, which the first agent is too late for
+        res = self._run(
+            [None] + [SelectOrdersRound.NO_ORDERS_PAYLOAD] * (MAX_PARTICIPANTS - 1)
+        )
+        assert res is not None and res[1] == Event.NO_ACTION
+        missed = cast(SynchronizedData, res[0]).participant_to_missed_selections
+        assert missed == {participant: 0 for participant in participants}
+
 
 class TestVerifyExecutionRound(BaseCowOrdersRoundTest):
     """Tests for VerifyExecutionRound."""
@@ -53,6 +53,7 @@ from packages.valory.skills.abstract_round_abci.handlers import (
 from packages.valory.skills.cow_orders_abci.rounds import SynchronizedData
 from packages.valory.skills.decentralized_watchtower_abci.dialogues import HttpDialogue
 from packages.valory.skills.decentralized_watchtower_abci.models import SharedState
+from packages.valory.skills.order_monitoring.handlers import MONITORING_STATS
 
 ABCIHandler = BaseABCIRoundHandler
 SigningHandler = BaseSigningHandler
@@ -238,7 +239,8 @@ class HttpHandler(BaseHttpHandler):
             "period": self.synchronized_data.period_count,
             "previous_rounds": previous_rounds,
             "current_round": current_round,
-            "web3_ok": is_connected
+            "web3_ok": is_connected,
+            "monitoring": self.context.shared_state.get(MONITORING_STATS, None),
         }
 
         self._send_ok_response(http_msg, http_dialogue, data)
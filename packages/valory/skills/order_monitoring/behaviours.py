@@ -20,7 +20,8 @@
 """This package contains a scaffold of a behaviour."""
 
 import json
-from typing import Any, Dict, List, Optional, cast
+import time
+from typing import Any, List, Optional, cast
 
 from aea.mail.base import Envelope
 from aea.skills.behaviours import SimpleBehaviour
@@ -33,12 +34,23 @@ from packages.valory.contracts.composable_cow.contract import ComposableCowContr
 from packages.valory.protocols.contract_api import ContractApiMessage
 from packages.valory.protocols.default.message import DefaultMessage
 from packages.valory.skills.order_monitoring.handlers import (
+    CHECKPOINT,
     DISCONNECTION_POINT,
     LEDGER_API_ADDRESS,
     ORDERS,
+    PARTICIPANTS,
+    SCHEDULER,
+    SHARDING,
 )
 from packages.valory.skills.order_monitoring.models import Params
-from packages.valory.skills.order_monitoring.order_utils import ConditionalOrder
+from packages.valory.skills.order_monitoring.order_utils import to_hex
+from packages.valory.skills.order_monitoring.registry import OrderRegistry
+from packages.valory.skills.order_monitoring.scheduler import (
+    OrderScheduler,
+    get_next_check_timestamp,
+    get_submitted_parts,
+)
+from packages.valory.skills.order_monitoring.sharding import OwnerSharding
 
 
 DEFAULT_ENCODING = "utf-8"
@@ -53,6 +65,7 @@ class MonitoringBehaviour(SimpleBehaviour):
         self._ws_client_connection: Optional[WebSocketClient] = None
         self._subscription_required: bool = True
         self._missed_parts: bool = False
+        self._backfill_required: bool = True
         super().__init__(**kwargs)
 
     def setup(self) -> None:
@@ -69,7 +82,9 @@ class MonitoringBehaviour(SimpleBehaviour):
 
     def act(self) -> None:
         """Implement the act."""
+        self._do_backfill()
         self._do_subscription()
+        self._update_sharding()
         self._check_orders_are_tradeable()
 
     @property
@@ -78,45 +93,186 @@ class MonitoringBehaviour(SimpleBehaviour):
         return cast(Params, self.context.params)
 
     @property
-    def orders(self) -> Dict[str, List[ConditionalOrder]]:
+    def orders(self) -> OrderRegistry:
         """Get partial orders."""
         return self.context.shared_state[ORDERS]
 
-    def _check_orders_are_tradeable(self) -> None:
-        """Check if orders are tradeable."""
-        if self.params.in_flight_req:
-            # do nothing if there are no orders or if there is an in flight request
+    @property
+    def scheduler(self) -> OrderScheduler:
+        """Get the scheduler of the tradeability checks."""
+        return self.context.shared_state[SCHEDULER]
+
+    @property
+    def sharding(self) -> Optional[OwnerSharding]:
+        """Get the owners this agent checks the orders of, None if it checks all of them."""
+        return self.context.shared_state.get(SHARDING, None)
+
+    def _update_sharding(self) -> None:
+        """Take over the owners of the agents that dropped out, and give up the others."""
+        sharding = self.sharding
+        participants = self.context.shared_state.get(PARTICIPANTS, None)
+        if sharding is None or participants is None:
             return
-        orders = [
-            {
-                "id": order.id,
-                "owner": owner,
-                "params": [
-                    order.params.handler,
-                    order.params.salt,
-                    order.params.staticInput,
-                ],
-                "offchainInput": order.offchainInput,
-                "proof": order.proof if order.proof is not None else [],
-                "composableCow": order.composableCow,
-            }
-            for owner, owner_orders in self.orders.items()
-            for order in owner_orders
-        ]
+        if not sharding.set_participants(participants):
+            return
+        now = int(time.time())
+        scheduled = 0
+        for owner, order in self.orders.items():
+            if not sharding.is_mine(owner):
+                self.scheduler.unschedule(order.id)
+                continue
+            if order.id in self.scheduler or order.id in self.scheduler.in_flight:
+                continue
+            self.scheduler.schedule(
+                order.id,
+                get_next_check_timestamp(
+                    order, now, self.orders.get_start_timestamp(order.id)
+                ),
+            )
+            scheduled += 1
+        self.context.logger.info(
+            f"Sharding the owners across {len(sharding.participants)} agents, "
+            f"{scheduled} orders were taken over."
+        )
+
+    def _check_orders_are_tradeable(self) -> None:
+        """Check if the orders that are due are tradeable, in chunks of concurrent requests."""
+        now = time.time()
+        pipeline = self.params.sweep_pipeline
+        for nonce, order_ids in pipeline.expire(now):
+            self.context.logger.warning(
+                f"Tradeability request {nonce} of {len(order_ids)} orders timed out."
+            )
+            self._retry_orders(order_ids)
+        while pipeline.available > 0:
+            due_ids = self.scheduler.pop_due(int(now), self.params.sweep_chunk_size)
+            if len(due_ids) == 0:
+                # do nothing if there are no orders due
+                return
+            self._send_tradeability_request(due_ids, now)
+
+    def _retry_orders(self, order_ids: List[bytes]) -> None:
+        """Schedule the orders of a request that got no response to be checked again."""
+        retry_timestamp = int(time.time()) + self.params.sweep_retry_interval
+        for order_id in self.scheduler.complete(order_ids):
+            order = self.orders.get_by_id(order_id)
+            if order is None:
+                continue
+            self.scheduler.schedule(
+                order_id,
+                get_next_check_timestamp(
+                    order, retry_timestamp, self.orders.get_start_timestamp(order_id)
+                ),
+            )
+
+    def _send_tradeability_request(self, due_ids: List[bytes], now: float) -> None:
+        """Send a request to check whether some due orders are tradeable."""
+        orders = []
+        for order in map(self.orders.get_by_id, due_ids):
+            if order is None:
+                continue
+            start_timestamp = self.orders.get_start_timestamp(order.id)
+            # the bytes are sent as hex strings, the contract decodes them
+            orders.append(
+                {
+                    "id": to_hex(order.id),
+                    "owner": self.orders.get_owner(order.id),
+                    "params": [
+                        order.params.handler,
+                        to_hex(order.params.salt),
+                        to_hex(order.params.staticInput),
+                    ],
+                    "offchainInput": to_hex(order.offchainInput),
+                    "proof": [to_hex(node) for node in order.proof.path]
+                    if order.proof is not None
+                    else [],
+                    "composableCow": order.composableCow,
+                    "startTimestamp": start_timestamp,
+                    "orderType": order.orderType,
+                    # the parts already submitted are not checked again
+                    "submittedParts": get_submitted_parts(order, start_timestamp),
+                }
+            )
         if len(orders) == 0:
-            # do nothing if there are no orders
+            self.scheduler.complete(due_ids)
             return
         contract_api_msg, _ = self.context.contract_api_dialogues.create(
             performative=ContractApiMessage.Performative.GET_STATE,
             contract_address=self.params.composable_cow_address,
             contract_id=str(ComposableCowContract.contract_id),
             callable="get_tradeable_order",
-            kwargs=ContractApiMessage.Kwargs(dict(orders=orders)),
+            kwargs=ContractApiMessage.Kwargs(
+                dict(
+                    orders=orders,
+                    multicall_chunk_size=self.params.multicall_chunk_size,
+                    rpc_batch_size=self.params.rpc_batch_size,
+                    max_workers=self.params.sweep_max_workers,
+                    call_timeout=self.params.sweep_call_timeout,
+                    seconds_per_block=self.params.seconds_per_block,
+                    sweep_timeout=self.params.sweep_timeout,
+                    breaker_threshold=self.params.rpc_breaker_threshold,
+                    breaker_cooldown=self.params.rpc_breaker_cooldown,
+                    cache_size=self.params.tradeable_order_cache_size,
+                )
+            ),
+            counterparty=LEDGER_API_ADDRESS,
+            ledger_id=self.context.default_ledger_id,
+        )
+        self.context.outbox.put_message(message=contract_api_msg)
+        self.params.sweep_pipeline.add(
+            contract_api_msg.dialogue_reference[0], due_ids, now
+        )
+
+    def _do_backfill(self) -> None:
+        """Backfill the order events emitted since the checkpoint, one range at a time."""
+        if self._backfill_required:
+            # the backfill starts once, before subscribing to the new events
+            self._backfill_required = False
+            checkpoint = self.context.shared_state.get(CHECKPOINT, None)
+            if checkpoint is None:
+                self.context.logger.info(
+                    "No checkpoint found, scanning ComposableCoW "
+                    f"from block {self.params.start_block}."
+                )
+                self.params.backfill_from_block = self.params.start_block
+            else:
+                self.context.logger.info(
+                    f"Resuming from checkpoint at block {checkpoint[0]} ({checkpoint[1]})."
+                )
+                self.params.backfill_from_block = checkpoint[0] + 1
+
+        from_block = self.params.backfill_from_block
+        if from_block is None:
+            return
+        now = time.time()
+        if self.params.backfill_in_flight is not None:
+            if (
+                now - self.params.backfill_sent_at
+                < self.params.backfill_request_timeout
+            ):
+                return
+            # the response was lost, the range is requested again
+            self.context.logger.warning(
+                f"Backfill request {self.params.backfill_in_flight} from block "
+                f"{from_block} timed out."
+            )
+        contract_api_msg, _ = self.context.contract_api_dialogues.create(
+            performative=ContractApiMessage.Performative.GET_STATE,
+            contract_address=self.params.composable_cow_address,
+            contract_id=str(ComposableCowContract.contract_id),
+            callable="get_order_events",
+            kwargs=ContractApiMessage.Kwargs(
+                dict(
+                    from_block=from_block,
+                    max_block_range=self.params.backfill_block_range,
+                )
+            ),
             counterparty=LEDGER_API_ADDRESS,
             ledger_id=self.context.default_ledger_id,
         )
         self.context.outbox.put_message(message=contract_api_msg)
-        self.params.in_flight_req = True
+        self.params.backfill_in_flight = contract_api_msg.dialogue_reference[0]
+        self.params.backfill_sent_at = now
 
     def _do_subscription(self) -> None:
         """Handle subscription logic."""
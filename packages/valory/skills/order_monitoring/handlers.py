@@ -20,8 +20,8 @@
 """This package contains a scaffold of a handler."""
 
 import json
-from typing import Any, Dict, List, Optional, Tuple, cast
-from uuid import uuid4
+import time
+from typing import Any, Dict, List, Optional, Tuple, Union, cast
 
 from aea.protocols.base import Message
 from aea.skills.base import Handler
@@ -34,23 +34,51 @@ from packages.valory.contracts.composable_cow.contract import (
     CallType,
     ComposableCowContract,
 )
+from packages.valory.contracts.composable_cow.order_types import decode_static_data
 from packages.valory.protocols.contract_api import ContractApiMessage
 from packages.valory.protocols.default.message import DefaultMessage
 from packages.valory.skills.order_monitoring.models import Params
 from packages.valory.skills.order_monitoring.order_utils import (
     ConditionalOrder,
     ConditionalOrderParamsStruct,
+    OrderStatus,
+    PROOF_LOCATION_EMITTED,
     Proof,
     balance_to_string,
     compute_order_uid,
+    decode_merkle_proof_orders,
+    get_conditional_order_id,
+    hash_conditional_order_params,
     kind_to_string,
+    to_bytes,
 )
+from packages.valory.skills.order_monitoring.registry import OrderRegistry
+from packages.valory.skills.order_monitoring.scheduler import (
+    OrderExpiries,
+    OrderScheduler,
+    get_end_timestamp,
+    get_next_check_timestamp,
+)
+from packages.valory.skills.order_monitoring.sharding import OwnerSharding
+from packages.valory.skills.order_monitoring.store import OrderStore
 
 
 ORDERS = "orders"
 # ready orders are orders that are ready to be filled
 READY_ORDERS = "ready_orders"
 DISCONNECTION_POINT = "disconnection_point"
+# the last block whose events have been fully processed, as (block_number, block_hash)
+CHECKPOINT = "checkpoint"
+# the blocks of the event processing requests in flight, by dialogue reference
+PENDING_EVENTS = "pending_events"
+SCHEDULER = "scheduler"
+EXPIRIES = "expiries"
+# the size of the registry, as reported by the health check
+MONITORING_STATS = "monitoring_stats"
+# the owners this agent checks the orders of, None if it checks all of them
+SHARDING = "sharding"
+# the active participants of the service, as published by the ABCI app
+PARTICIPANTS = "active_participants"
 
 LEDGER_API_ADDRESS = str(LEDGER_CONNECTION_PUBLIC_ID)
 
@@ -71,12 +99,16 @@ class WebSocketHandler(Handler):
 
     def setup(self) -> None:
         """Implement the setup."""
-        self.context.shared_state[ORDERS] = {}
-        self.context.shared_state[READY_ORDERS] = []
+        # the orders may have already been loaded from the store by the ContractHandler
+        self.context.shared_state.setdefault(ORDERS, OrderRegistry())
+        self.context.shared_state.setdefault(READY_ORDERS, [])
+        self.context.shared_state.setdefault(SCHEDULER, OrderScheduler())
+        self.context.shared_state.setdefault(EXPIRIES, OrderExpiries())
+        self.context.shared_state.setdefault(PENDING_EVENTS, {})
         self.context.shared_state[DISCONNECTION_POINT] = None
 
     @property
-    def orders(self) -> Dict[str, Any]:
+    def orders(self) -> OrderRegistry:
         """Get partial orders."""
         return self.context.shared_state[ORDERS]
 
@@ -98,10 +130,14 @@ class WebSocketHandler(Handler):
             return
 
         self.context.logger.info("Extracting data")
-        tx_hash = data["params"]["result"]["transactionHash"]
-        self._process_tx(tx_hash)
+        log = data["params"]["result"]
+        block_number = log.get("blockNumber", None)
+        self._process_tx(
+            log["transactionHash"],
+            None if block_number is None else int(block_number, 16),
+        )
 
-    def _process_tx(self, tx_hash: str) -> None:
+    def _process_tx(self, tx_hash: str, block_number: Optional[int] = None) -> None:
         """Get the relevant events out of the transaction."""
         (contract_api_msg, _,) = self.context.contract_api_dialogues.create(
             performative=ContractApiMessage.Performative.GET_STATE,
@@ -113,6 +149,10 @@ class WebSocketHandler(Handler):
             ledger_id=self.context.default_ledger_id,
         )
         self.context.outbox.put_message(message=contract_api_msg)
+        if block_number is not None:
+            # the checkpoint does not move past the block until its events are processed
+            nonce = contract_api_msg.dialogue_reference[0]
+            self.context.shared_state[PENDING_EVENTS][nonce] = block_number
 
     def teardown(self) -> None:
         """Implement the handler teardown."""
@@ -123,18 +163,82 @@ class ContractHandler(Handler):
     """Contract API message handler."""
 
     SUPPORTED_PROTOCOL = ContractApiMessage.protocol_id
+    # the block of the events that are waiting to be committed to the store
+    _batch_block: Optional[int] = None
+    # the state of the endpoint reported by the latest sweep, None before the first one
+    _rpc_status: Optional[Dict[str, Any]] = None
+    # the size, hits and misses of the tradeability results cached by the contract
+    _cache_stats: Optional[Dict[str, Any]] = None
+    # the ready orders last staged in the store, and whether orders were added to
+    # them since; the orders placed are removed by replacing the list
+    _staged_ready_orders: Optional[List[Dict[str, Any]]] = None
+    _ready_orders_dirty: bool = False
+    # the blocks whose events have been processed but not checkpointed yet, by number
+    _processed_blocks: Dict[int, Optional[str]]
 
     def setup(self) -> None:
         """Setup the contract handler."""
-        self.context.shared_state[ORDERS] = {}
-        self.context.shared_state[READY_ORDERS] = []
+        store_path = self.params.store_path
+        store = OrderStore(store_path) if store_path is not None else None
+        registry = OrderRegistry(
+            store,
+            self.params.max_orders,
+            self.params.max_orders_per_owner,
+            self.params.order_types,
+        )
+        ready_orders: List[Dict[str, Any]] = []
+        checkpoint: Optional[Tuple[int, str]] = None
+        if store is not None:
+            registry.load()
+            ready_orders = store.load_ready_orders()
+            checkpoint = store.load_checkpoint()
+            self.context.logger.info(
+                f"Loaded {len(registry)} conditional orders and {len(ready_orders)} "
+                f"ready orders from {store_path}, with checkpoint {checkpoint}."
+            )
+        sharding: Optional[OwnerSharding] = None
+        if self.params.use_sharding:
+            # all the owners are checked until the participants are known
+            sharding = OwnerSharding(
+                self.context.agent_address,
+                self.context.shared_state.get(PARTICIPANTS, []),
+            )
+            self.context.logger.info(
+                f"Sharding the owners across {len(sharding.participants)} agents."
+            )
+        self.context.shared_state[SHARDING] = sharding
+        scheduler = OrderScheduler()
+        expiries = OrderExpiries()
+        now = int(time.time())
+        for owner, order in registry.items():
+            start_timestamp = registry.get_start_timestamp(order.id)
+            if self._is_my_owner(owner):
+                scheduler.schedule(
+                    order.id, get_next_check_timestamp(order, now, start_timestamp)
+                )
+            end_timestamp = get_end_timestamp(order, start_timestamp)
+            if end_timestamp is not None:
+                expiries.push(order.id, end_timestamp)
+        self.context.shared_state[ORDERS] = registry
+        self.context.shared_state[READY_ORDERS] = ready_orders
+        self._staged_ready_orders = ready_orders
+        self.context.shared_state[CHECKPOINT] = checkpoint
+        self.context.shared_state.setdefault(PENDING_EVENTS, {})
+        self._processed_blocks = {}
+        self.context.shared_state[SCHEDULER] = scheduler
+        self.context.shared_state[EXPIRIES] = expiries
+        self.context.shared_state[MONITORING_STATS] = self._get_stats()
 
     def teardown(self) -> None:
         """Teardown the handler."""
         self.context.logger.info("ContractHandler: teardown called.")
+        store = self.orders.store
+        if store is not None:
+            self._commit()
+            store.close()
 
     @property
-    def orders(self) -> Dict[str, List[ConditionalOrder]]:
+    def orders(self) -> OrderRegistry:
         """Get partial orders."""
         return self.context.shared_state[ORDERS]
 
@@ -143,11 +247,36 @@ class ContractHandler(Handler):
         """Get orders."""
         return self.context.shared_state[READY_ORDERS]
 
+    @property
+    def scheduler(self) -> OrderScheduler:
+        """Get the scheduler of the tradeability checks."""
+        return self.context.shared_state[SCHEDULER]
+
+    @property
+    def pending_events(self) -> Dict[str, int]:
+        """Get the blocks of the event processing requests in flight."""
+        return self.context.shared_state[PENDING_EVENTS]
+
+    @property
+    def expiries(self) -> OrderExpiries:
+        """Get the end timestamps of the orders."""
+        return self.context.shared_state[EXPIRIES]
+
     @property
     def params(self) -> Params:
         """Get the parameters."""
         return cast(Params, self.context.params)
 
+    def _get_stats(self) -> Dict[str, Any]:
+        """Get the size of the registry, of the heaps and of the cache, and the state of the endpoint."""
+        return {
+            **self.orders.stats(),
+            "scheduler": self.scheduler.stats(),
+            "expiries": self.expiries.stats(),
+            "rpc": self._rpc_status,
+            "tradeable_order_cache": self._cache_stats,
+        }
+
     def handle(self, message: Message) -> None:
         """
         Implement the reaction to a contract message.
@@ -156,10 +285,31 @@ class ContractHandler(Handler):
         """
         self.context.logger.info(f"Received message: {message}")
         contract_api_msg = cast(ContractApiMessage, message)
+        nonce = contract_api_msg.dialogue_reference[0]
+        # the orders of the tradeability request this message answers, if any
+        order_ids = self.params.sweep_pipeline.complete(nonce)
+        is_backfill_response = nonce == self.params.backfill_in_flight
+        if is_backfill_response:
+            # the backfill request is answered before its events are processed, so
+            # that an error does not stop the backfill, whose range is requested again
+            self.params.backfill_in_flight = None
         if contract_api_msg.performative != ContractApiMessage.Performative.STATE:
             self.context.logger.warning(
                 f"Contract API Message performative not recognized: {contract_api_msg.performative}"
             )
+            if order_ids is not None:
+                self._reschedule_checked_orders(order_ids)
+            if is_backfill_response:
+                self.context.logger.warning(
+                    f"Backfill from block {self.params.backfill_from_block} failed, "
+                    "it is requested again."
+                )
+            if nonce in self.pending_events:
+                # the request stays pending, so that its block is backfilled on restart
+                self.context.logger.warning(
+                    f"The events of block {self.pending_events[nonce]} could not be "
+                    "processed, the checkpoint does not move past it."
+                )
             return
 
         body = contract_api_msg.state.body
@@ -167,11 +317,36 @@ class ContractHandler(Handler):
         data = body.get("data", {})
         if call_type == CallType.EVENT_PROCESSING.value:
             self._handle_event_processing(data)
+            self.pending_events.pop(nonce, None)
 
         if call_type == CallType.GET_TRADEABLE_ORDER.value:
+            self._handle_rpc_status(data.get("rpc", None))
+            self._cache_stats = data.get("cache", self._cache_stats)
             self._handle_get_tradeable_order(
-                data["tradeable_orders"], data["drop_orders"]
+                data["tradeable_orders"],
+                data["drop_orders"],
+                data.get("expiries", []),
+                data.get("block_timestamp", None),
+                data.get("start_timestamps", []),
+                data.get("next_checks", []),
+                order_ids or [],
+            )
+
+        self.context.shared_state[MONITORING_STATS] = self._get_stats()
+
+    def _handle_rpc_status(self, rpc_status: Optional[Dict[str, Any]]) -> None:
+        """Keep the state of the endpoint the sweeps are made against, for the health checks."""
+        if rpc_status is None:
+            return
+        was_degraded = self._rpc_status is not None and self._rpc_status["degraded"]
+        if rpc_status["degraded"] and not was_degraded:
+            self.context.logger.warning(
+                f"Endpoint {rpc_status['endpoint']} is degraded, "
+                f"the orders are checked again once it has cooled down."
             )
+        elif was_degraded and not rpc_status["degraded"]:
+            self.context.logger.info(f"Endpoint {rpc_status['endpoint']} recovered.")
+        self._rpc_status = rpc_status
 
     def get_domain(  # pylint: disable=no-self-use
         self, order: Dict[str, Any]
@@ -189,20 +364,40 @@ class ContractHandler(Handler):
         self,
         tradeable_orders: List[Dict[str, Any]],
         drop_orders: List[Dict[str, Any]],
+        expiries: Optional[List[Dict[str, Any]]] = None,
+        block_timestamp: Optional[int] = None,
+        start_timestamps: Optional[List[Dict[str, Any]]] = None,
+        next_checks: Optional[List[Dict[str, Any]]] = None,
+        order_ids: Optional[List[bytes]] = None,
     ) -> None:
         """Handle get tradeable order."""
+        for start in start_timestamps or []:
+            # cache what was read from the cabinet, so that it is not read again
+            self.orders.set_start_timestamp(
+                to_bytes(start["id"]), start["start_timestamp"]
+            )
         for order in tradeable_orders:
             domain = self.get_domain(order)
-            id = order.pop("id")
+            # the ids are sent to the contract as hex strings
+            id = to_bytes(order.pop("id"))
             order_uid = compute_order_uid(domain, order, order["from"])
             order["order_uid"] = order_uid
-            # remove from orders
-            owner = order["from"]
-            owner_orders = self.orders.get(owner, [])
-            # remove from orders
-            self.orders[owner] = [o for o in owner_orders if o.id != id]
+            conditional_order = self.orders.get_by_id(id)
+            if conditional_order is None:
+                # the conditional order was removed while it was being checked
+                continue
+            if order_uid in conditional_order.orders:
+                # this part has been submitted already
+                continue
+            # the conditional order is kept, to catch its next parts. Its parts are
+            # only tracked as submitted: the skill does not watch the settlements,
+            # and a part is not submitted again whether it is filled or not, as its
+            # uid, and so its part, is known from then on
+            self.orders.set_order_status(id, order_uid, OrderStatus["SUBMITTED"])
+            self.scheduler.reset_backoff(id)
 
             # add to ready orders
+            self._ready_orders_dirty = True
             self.ready_orders.append(
                 {
                     **order,
@@ -215,17 +410,136 @@ class ContractHandler(Handler):
                 }
             )
         for order in drop_orders:
-            domain = self.get_domain(order)
-            id = order.pop("id")
-            order_uid = compute_order_uid(domain, order, order["from"])
-            order["order_uid"] = order_uid
-            owner = order["from"]
-            owner_orders = self.orders.get(owner, [])
-            self.orders[owner] = [o for o in owner_orders if o.id != id]
-        self.params.in_flight_req = False
+            id = to_bytes(order.pop("id"))
+            if "reason" in order:
+                self.context.logger.info(
+                    f"Dropping order {id}, reverted with {order['reason']}"
+                )
+            self._remove_order(id)
+        for expiry in expiries or []:
+            id = to_bytes(expiry["id"])
+            if id in self.orders:
+                self.expiries.push(id, expiry["end_timestamp"])
+        if block_timestamp is not None:
+            self._evict_expired_orders(block_timestamp)
+        self._reschedule_checked_orders(
+            order_ids,
+            {to_bytes(check["id"]): check["timestamp"] for check in next_checks or []},
+        )
+        self._commit()
+
+    @property
+    def sharding(self) -> Optional[OwnerSharding]:
+        """Get the owners this agent checks the orders of, None if it checks all of them."""
+        return self.context.shared_state.get(SHARDING, None)
+
+    def _is_my_owner(self, owner: str) -> bool:
+        """Check whether this agent checks the tradeability of the orders of an owner."""
+        sharding = self.sharding
+        return sharding is None or sharding.is_mine(owner)
+
+    def _remove_order(self, order_id: bytes) -> None:
+        """Remove an order from the registry, and stop tracking it."""
+        self.orders.remove_by_id(order_id)
+        self._untrack_order(order_id)
+
+    def _untrack_order(self, order_id: bytes) -> None:
+        """Stop tracking an order that has been removed from the registry."""
+        self.scheduler.unschedule(order_id)
+        self.expiries.discard(order_id)
+
+    def _evict_expired_orders(self, block_timestamp: int) -> None:
+        """Evict the orders that have expired at the given block timestamp."""
+        expired = self.expiries.pop_expired(block_timestamp)
+        for order_id in expired:
+            self.orders.remove_by_id(order_id)
+            self._untrack_order(order_id)
+        if len(expired) > 0:
+            self.context.logger.info(
+                f"Evicted {len(expired)} expired conditional orders "
+                f"at block timestamp {block_timestamp}."
+            )
+
+    def _reschedule_checked_orders(
+        self,
+        order_ids: Optional[List[bytes]],
+        next_checks: Optional[Dict[bytes, int]] = None,
+    ) -> None:
+        """
+        Schedule the next check of the orders that were not tradeable.
+
+        :param order_ids: the orders that were checked, or None for all the orders in flight.
+        :param next_checks: the timestamps at which the sweep found that some orders can next be traded.
+        """
+        next_checks = next_checks or {}
+        now = int(time.time())
+        retry_timestamp = now + self.params.sweep_retry_interval
+        for order_id in self.scheduler.complete(order_ids):
+            order = self.orders.get_by_id(order_id)
+            if order is None:
+                continue
+            next_check = next_checks.get(order_id, None)
+            if next_check is not None:
+                self.scheduler.reset_backoff(order_id)
+            elif order.orderType is None:
+                # the orders of unknown handlers are polled less and less often
+                next_check = now + self.scheduler.backoff(
+                    order_id,
+                    self.params.sweep_retry_interval,
+                    self.params.poll_backoff_max_interval,
+                )
+            else:
+                next_check = get_next_check_timestamp(
+                    order, retry_timestamp, self.orders.get_start_timestamp(order_id)
+                )
+            self.scheduler.schedule(order_id, next_check)
+
+    def _commit(self) -> None:
+        """Commit the changes to the registry and the ready orders to the store."""
+        store = self.orders.store
+        if store is None:
+            return
+        ready_orders = self.ready_orders
+        if self._ready_orders_dirty or ready_orders is not self._staged_ready_orders:
+            store.set_ready_orders(ready_orders)
+            self._staged_ready_orders = ready_orders
+            self._ready_orders_dirty = False
+        if store.pending > 0:
+            store.commit()
+
+    def _set_checkpoint(
+        self, block_number: Optional[int], block_hash: Optional[str]
+    ) -> None:
+        """Move the checkpoint forward to a fully processed block."""
+        checkpoint = self.context.shared_state.get(CHECKPOINT, None)
+        if block_number is None or block_hash is None:
+            return
+        if checkpoint is not None and checkpoint[0] >= block_number:
+            return
+        self.context.shared_state[CHECKPOINT] = (block_number, block_hash)
+        store = self.orders.store
+        if store is not None:
+            store.set_checkpoint(block_number, block_hash)
 
     def _handle_event_processing(self, events: Dict[str, Any]) -> None:
         """Handle event processing."""
+        block_number = events.get("block_number", None)
+        block_hash = events.get("block_hash", None)
+        # only backfilled events carry the latest block, they cover a whole range
+        is_backfill = "latest_block" in events
+        if (
+            not is_backfill
+            and block_number is not None
+            and block_number != self._batch_block
+        ):
+            # all the events of the previous block have been processed,
+            # so we commit them as a single batch
+            if self.params.backfill_from_block is None:
+                # while backfilling, the blocks before this one may not be processed yet
+                self._checkpoint_processed_blocks(block_number)
+            self._commit()
+            self._batch_block = block_number
+
         conditional_orders = events.get("conditional_orders", [])
         merkle_root_set_events = events.get("merkle_root_set", [])
         for conditional_order in conditional_orders:
@@ -237,88 +551,165 @@ class ContractHandler(Handler):
             )
 
         for merkle_root_set in merkle_root_set_events:
-            self._flush_contracts(
-                merkle_root_set["owner"],
-                merkle_root_set["merkleRoot"],
+            self._handle_merkle_root_set(merkle_root_set)
+
+        block_timestamp = events.get("block_timestamp", None)
+        if block_timestamp is not None:
+            self._evict_expired_orders(block_timestamp)
+
+        if is_backfill:
+            self._handle_backfill(block_number, block_hash, events["latest_block"])
+        elif block_number is not None:
+            self._processed_blocks[block_number] = block_hash
+
+    def _checkpoint_processed_blocks(self, block_number: int) -> None:
+        """
+        Checkpoint the highest processed block that no earlier event is pending for.
+
+        The events may be processed out of order, since the requests that process
+        them are answered concurrently: a block is only complete once a later block
+        has been seen, and no request for it or an earlier block is in flight.
+
+        :param block_number: the block of the events being processed.
+        """
+        pending = list(self.pending_events.values())
+        latest = max([block_number, *pending, *self._processed_blocks])
+        limit = min([latest, *pending])
+        complete = [number for number in self._processed_blocks if number < limit]
+        if len(complete) == 0:
+            return
+        checkpoint = max(complete)
+        self._set_checkpoint(checkpoint, self._processed_blocks[checkpoint])
+        for number in complete:
+            del self._processed_blocks[number]
+
+    def _handle_merkle_root_set(self, merkle_root_set: Dict[str, Any]) -> None:
+        """Replace the orders of an owner with the ones of its new merkle root."""
+        owner = merkle_root_set["owner"]
+        root = merkle_root_set["root"]
+        proof = merkle_root_set["proof"]
+        self._flush_contracts(owner, root)
+        if proof["location"] != PROOF_LOCATION_EMITTED:
+            self.context.logger.info(
+                f"The orders of the merkle root 0x{to_bytes(root).hex()} of owner "
+                f"{owner} are not emitted (proof location {proof['location']}), "
+                "they are not monitored."
             )
-            for order in merkle_root_set["orders"]:
-                self._add_contract(
-                    merkle_root_set["owner"],
-                    order["params"],
-                    Proof(merkle_root_set["merkleRoot"], order["path"]),
-                    order["address"],
-                )
+            return
+        try:
+            orders = decode_merkle_proof_orders(proof["data"])
+        except Exception as e:  # pylint: disable=broad-except
+            self.context.logger.warning(
+                f"Could not decode the orders of the merkle root "
+                f"0x{to_bytes(root).hex()} of owner {owner}: {e}"
+            )
+            return
+        for path, params in orders:
+            self._add_contract(
+                owner,
+                params,
+                Proof(root, path),
+                merkle_root_set.get("composableCow", None),
+            )
+
+    def _handle_backfill(
+        self, block_number: int, block_hash: str, latest_block: int
+    ) -> None:
+        """Checkpoint a backfilled range of blocks, and move on to the next one."""
+        self._set_checkpoint(block_number, block_hash)
+        self._commit()
+        if block_number >= latest_block:
+            self.params.backfill_from_block = None
+            self.context.logger.info(f"Backfill caught up with block {block_number}.")
+            return
+        self.params.backfill_from_block = block_number + 1
+        self.context.logger.info(
+            f"Backfilled up to block {block_number}, {latest_block - block_number} "
+            "blocks to go."
+        )
 
     def _add_contract(
         self,
         owner: str,
-        params: Tuple[str, bytes, bytes],
+        params: Dict[str, Any],
         proof: Optional[Proof],
         composable_cow: str,
     ) -> None:
         """Add a conditional order to the registry."""
-        if owner in self.orders:
-            conditional_orders = self.orders[owner]
+        # we use the params hash as identifier for the conditional order,
+        # same as ComposableCoW does
+        params_hash = hash_conditional_order_params(params)
+        # the id is the same for all the agents, but it is not the same as the uid
+        id = get_conditional_order_id(owner, params_hash)
+        existing = self.orders.get(owner, params_hash)
+        if existing is not None:
             self.context.logger.info(
-                f"Adding conditional order {params} to already existing owner {owner}"
+                f"Conditional order {params} of owner {owner} is already registered."
             )
-            exists = False
-            # Iterate over the conditionalOrder to make sure
-            # that the params are not already in the registry
-            for conditional_order in conditional_orders:
-                # Check if the params are in the conditionalOrder
-                if conditional_order.params == params:
-                    exists = True
-                    break
-
-            # If the params are not in the conditionalOrder, add them
-            # we essentially use the params as identifier for the conditional order
-            if not exists:
-                # this is a local id, it is not the same as the uid
-                id = uuid4().hex
-                conditional_order = ConditionalOrder(
-                    id=id,
-                    params=ConditionalOrderParamsStruct(
-                        handler=params["handler"],
-                        salt=params["salt"],
-                        staticInput=params["staticInput"],
-                    ),
-                    proof=proof,
-                    orders={},
-                    composableCow=composable_cow,
-                    offchainInput=b"",
-                )
-                conditional_orders.append(conditional_order)
+            # creating the order again may have set a new start in the cabinet
+            self.orders.invalidate_start_timestamp(id)
+            if get_end_timestamp(existing) is None:
+                # its end depended on the previous start
+                self.expiries.discard(id)
+            if self._is_my_owner(owner) and id not in self.scheduler.in_flight:
+                # it is checked now, which reads its start again, instead of at a
+                # time computed from the previous start; an order in flight is
+                # rescheduled once its check completes
+                self.scheduler.schedule(id, int(time.time()))
+            return
 
-        else:
-            # this is the first order for this owner
-            self.context.logger.info(
-                f"Adding conditional order {params} to new contract {owner}"
+        self.context.logger.info(f"Adding conditional order {params} of owner {owner}")
+        order_params = ConditionalOrderParamsStruct(
+            handler=params["handler"],
+            salt=params["salt"],
+            staticInput=params["staticInput"],
+        )
+        order_type = self.orders.get_order_type(order_params.handler)
+        conditional_order = ConditionalOrder(
+            id=id,
+            params=order_params,
+            proof=proof,
+            orders={},
+            composableCow=composable_cow,
+            offchainInput=b"",
+            # the static input is decoded once, not on every sweep
+            staticData=decode_static_data(order_type, order_params.staticInput),
+            orderType=order_type,
+        )
+        evicted = self.orders.admit(owner)
+        for order in evicted:
+            self._untrack_order(order.id)
+        if len(evicted) > 0:
+            self.context.logger.warning(
+                f"Evicted the {len(evicted)} oldest conditional orders "
+                f"to admit an order of owner {owner}."
             )
-            # this is a local id, it is not the same as the uid
-            id = uuid4().hex
-            self.orders[owner] = [
-                ConditionalOrder(
-                    id=id,
-                    params=ConditionalOrderParamsStruct(
-                        handler=params["handler"],
-                        salt=params["salt"],
-                        staticInput=params["staticInput"],
-                    ),
-                    proof=proof,
-                    orders={},
-                    composableCow=composable_cow,
-                    offchainInput=b"",
-                )
-            ]
+        if not self.orders.add(owner, params_hash, conditional_order):
+            return
+        start_timestamp = self.orders.get_start_timestamp(id)
+        if self._is_my_owner(owner):
+            self.scheduler.schedule(
+                id,
+                get_next_check_timestamp(
+                    conditional_order, int(time.time()), start_timestamp
+                ),
+            )
+        end_timestamp = get_end_timestamp(conditional_order, start_timestamp)
+        if end_timestamp is not None:
+            self.expiries.push(id, end_timestamp)
 
-    def _flush_contracts(self, owner: str, root: str) -> None:
+    def _flush_contracts(self, owner: str, root: Union[str, bytes]) -> None:
         """Flush contracts that have old roots."""
-        conditional_orders = []
-        for conditional_order in self.orders[owner]:
-            if (
-                conditional_order.proof.merkleRoot is not None
-                and conditional_order.proof.merkleRoot != root
-            ):
-                conditional_orders.append(conditional_order)
-        self.orders[owner] = conditional_orders
+        root = to_bytes(root)
+        # an owner has a single root, setting a new one invalidates the orders under
+        # the previous ones, while single orders (without a proof) are not affected
+        for old_root in self.orders.roots(owner):
+            if old_root == root:
+                continue
+            removed = self.orders.remove_root(owner, old_root)
+            for order in removed:
+                self._untrack_order(order.id)
+            self.context.logger.info(
+                f"Removed {len(removed)} conditional orders of owner {owner} "
+                f"under the old merkle root 0x{old_root.hex()}"
+            )
@@ -18,10 +18,20 @@
 # ------------------------------------------------------------------------------
 
 """This module contains the shared state for the abci skill of Mech."""
-from typing import Any
+from typing import Any, Dict, Optional
 
 from aea.skills.base import Model
 
+from packages.valory.contracts.composable_cow.order_types import TWAP_ORDER_TYPE
+from packages.valory.skills.order_monitoring.pipeline import SweepPipeline
+
+
+# the TWAP handler of CoW Protocol, at the same address on all the supported chains
+TWAP_HANDLER_ADDRESS = "0x6cF1e9cA41f7611dEf408122793c358a3d11E5a5"
+# the block at which ComposableCoW was deployed on Ethereum mainnet, no order
+# event is emitted before it
+COMPOSABLE_COW_DEPLOYMENT_BLOCK = 17883049
+
 
 class Params(Model):
     """A model to represent params for multiple abci apps."""
@@ -31,5 +41,67 @@ class Params(Model):
         self.use_polling = kwargs.get("use_polling", False)
         self.event_topics = kwargs.get("event_topics", [])
         self.composable_cow_address = kwargs.get("composable_cow_address", None)
-        self.in_flight_req: bool = False
+        # the tradeability requests are split in chunks, checked concurrently
+        self.sweep_chunk_size: Optional[int] = kwargs.get("sweep_chunk_size", 100)
+        self.sweep_pipeline = SweepPipeline(
+            kwargs.get("max_in_flight_requests", 4),
+            kwargs.get("sweep_request_timeout", 60),
+        )
+        # the caps of the registry, the oldest orders are evicted to admit new ones
+        self.max_orders: Optional[int] = kwargs.get("max_orders", None)
+        self.max_orders_per_owner: Optional[int] = kwargs.get(
+            "max_orders_per_owner", None
+        )
+        # when sharding, each agent only checks the orders of a slice of the owners,
+        # shared among the active participants of the service
+        self.use_sharding: bool = kwargs.get("use_sharding", False)
+        # the delay, in seconds, before an order that was not tradeable is checked again
+        self.sweep_retry_interval: int = kwargs.get("sweep_retry_interval", 30)
+        # if set, the due orders are checked in batches of this size through Multicall3
+        self.multicall_chunk_size: Optional[int] = kwargs.get(
+            "multicall_chunk_size", None
+        )
+        # if set, the reads of a sweep are sent as JSON-RPC batches of up to this size
+        self.rpc_batch_size: Optional[int] = kwargs.get("rpc_batch_size", None)
+        # if set, the reads of a sweep are made concurrently by this many threads
+        self.sweep_max_workers: Optional[int] = kwargs.get("sweep_max_workers", None)
+        self.sweep_call_timeout: float = kwargs.get("sweep_call_timeout", 10.0)
+        # if set, a sweep returns the orders checked so far after this many seconds,
+        # before the request itself times out
+        self.sweep_timeout: Optional[float] = kwargs.get("sweep_timeout", 30.0)
+        # the endpoint is not called for `rpc_breaker_cooldown` seconds after
+        # `rpc_breaker_threshold` sweeps in a row failed because of it
+        self.rpc_breaker_threshold: int = kwargs.get("rpc_breaker_threshold", 3)
+        self.rpc_breaker_cooldown: float = kwargs.get("rpc_breaker_cooldown", 60.0)
+        # the number of results of the tradeability calls the contract caches by
+        # order and block, to answer the retries and overlapping sweeps of a block
+        self.tradeable_order_cache_size: int = kwargs.get(
+            "tradeable_order_cache_size", 4096
+        )
+        # the order types of the known conditional order handlers, by handler address,
+        # the orders of the other handlers are polled with an exponential backoff
+        self.order_types: Dict[str, str] = kwargs.get(
+            "order_types", {TWAP_HANDLER_ADDRESS: TWAP_ORDER_TYPE}
+        )
+        self.poll_backoff_max_interval: int = kwargs.get(
+            "poll_backoff_max_interval", 3600
+        )
+        # the average block time, to schedule the orders that ask to be checked at a block
+        self.seconds_per_block: int = kwargs.get("seconds_per_block", 12)
+        # the sqlite file in which the orders are persisted, if any
+        self.store_path: Optional[str] = kwargs.get("store_path", None)
+        # the block from which ComposableCoW is scanned when there is no checkpoint
+        self.start_block: int = kwargs.get(
+            "start_block", COMPOSABLE_COW_DEPLOYMENT_BLOCK
+        )
+        self.backfill_block_range: int = kwargs.get("backfill_block_range", 5000)
+        # a backfill request that gets no response within this many seconds is sent again
+        self.backfill_request_timeout: float = kwargs.get(
+            "backfill_request_timeout", 120
+        )
+        # the next block to backfill, None once caught up with the chain
+        self.backfill_from_block: Optional[int] = None
+        # the dialogue of the backfill request in flight, if any, and when it was sent
+        self.backfill_in_flight: Optional[str] = None
+        self.backfill_sent_at: float = 0.0
         super().__init__(*args, **kwargs)
@@ -19,11 +19,13 @@
 # pylint: disable=C0103
 
 """This module contains helpers for orders."""
-from dataclasses import dataclass
+import sys
 from datetime import datetime
 from enum import Enum
-from typing import Any, Dict, List, Optional, Union
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple, Union
 
+from eth_abi import decode, encode
 from eth_abi.packed import encode_packed
 from web3 import Web3
 
@@ -62,35 +64,126 @@ fields = [f"{field['type']} {field['name']}" for field in ORDER_TYPE_FIELDS]
 ORDER_TYPE_HASH = Web3.keccak(text=f"Order({','.join(fields)})").hex()
 ORDER_UID_LENGTH = 56
 ZERO_ADDRESS = "0x" + "0" * 40
+CONDITIONAL_ORDER_PARAMS_TYPE = "(address,bytes32,bytes)"
+# the location of the proofs of a merkle root whose orders are emitted with the root,
+# as in `ComposableCoW.Proof`, the other locations are off chain
+PROOF_LOCATION_EMITTED = 1
 
 
-@dataclass
-class ConditionalOrderParamsStruct:
-    """Conditional order params dataclass."""
+def to_bytes(value: Union[str, bytes]) -> bytes:
+    """Converts a hex string or bytes to bytes."""
+    if isinstance(value, str):
+        return bytes.fromhex(value[2:] if value.startswith("0x") else value)
+    return bytes(value)
 
-    handler: str
-    salt: str
-    staticInput: str
 
+def to_hex(value: bytes) -> str:
+    """Converts bytes to a 0x-prefixed hex string."""
+    return "0x" + value.hex()
 
-@dataclass
-class Proof:
-    """Proof dataclass."""
 
-    merkleRoot: str
-    path: List[str]
+def intern_address(address: Optional[str]) -> Optional[str]:
+    """Interns an address, so that all the orders referencing it share one string."""
+    if address is None:
+        return None
+    return sys.intern(address)
 
 
-@dataclass
-class ConditionalOrder:
-    """Conditional order dataclass."""
+# shared by all the orders that have no discrete orders yet
+EMPTY_ORDERS: Mapping[str, int] = MappingProxyType({})
 
-    id: str
-    params: ConditionalOrderParamsStruct
-    proof: Optional[Proof]
-    orders: Dict[str, int]
-    composableCow: str
-    offchainInput: Optional[bytes]
+
+class _Record:
+    """
+    A lightweight record.
+
+    Records use `__slots__` instead of a per-instance `__dict__`, since the
+    monitoring skill may hold millions of them.
+    """
+
+    __slots__: Tuple[str, ...] = ()
+
+    def __eq__(self, other: Any) -> bool:
+        """Compare two records field by field."""
+        if type(other) is not type(self):
+            return NotImplemented
+        return all(
+            getattr(self, name) == getattr(other, name) for name in self.__slots__
+        )
+
+    def __repr__(self) -> str:
+        """Get the representation of the record."""
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class ConditionalOrderParamsStruct(_Record):
+    """Conditional order params."""
+
+    __slots__ = ("handler", "salt", "staticInput")
+
+    def __init__(
+        self,
+        handler: str,
+        salt: Union[str, bytes],
+        staticInput: Union[str, bytes],
+    ) -> None:
+        """Initialize the params, keeping the salt and static input as raw bytes."""
+        self.handler = intern_address(handler)
+        self.salt = to_bytes(salt)
+        self.staticInput = to_bytes(staticInput)
+
+
+class Proof(_Record):
+    """Merkle proof of a conditional order."""
+
+    __slots__ = ("merkleRoot", "path")
+
+    def __init__(
+        self,
+        merkleRoot: Union[str, bytes],
+        path: Sequence[Union[str, bytes]],
+    ) -> None:
+        """Initialize the proof, keeping the root and the path as raw bytes."""
+        self.merkleRoot = to_bytes(merkleRoot)
+        self.path = tuple(to_bytes(node) for node in path)
+
+
+class ConditionalOrder(_Record):
+    """Conditional order."""
+
+    __slots__ = (
+        "id",
+        "params",
+        "proof",
+        "orders",
+        "composableCow",
+        "offchainInput",
+        "staticData",
+        "orderType",
+    )
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        id: bytes,  # pylint: disable=redefined-builtin
+        params: ConditionalOrderParamsStruct,
+        proof: Optional[Proof],
+        orders: Optional[Mapping[str, int]],
+        composableCow: Optional[str],
+        offchainInput: Optional[bytes],
+        staticData: Optional[Any] = None,
+        orderType: Optional[str] = None,
+    ) -> None:
+        """Initialize the conditional order, with its static input decoded if its handler is known."""
+        self.id = id
+        self.params = params
+        self.proof = proof
+        self.orders = orders or EMPTY_ORDERS
+        self.composableCow = intern_address(composableCow)
+        self.offchainInput = offchainInput
+        self.staticData = staticData
+        # the order type of the handler, None if the order can only be polled
+        self.orderType = orderType
 
 
 OrderStatus = {"SUBMITTED": 1, "FILLED": 2}
@@ -207,6 +300,66 @@ def compute_order_uid(
     return "0x" + order_uid.hex()
 
 
+def hash_conditional_order_params(params: Dict[str, Any]) -> bytes:
+    """
+    Hashes the params of a conditional order.
+
+    This mirrors `ComposableCoW.hash(params)`, i.e. `keccak256(abi.encode(params))`,
+    so it can be computed locally without a call to the chain.
+
+    :param params: the conditional order params, with handler, salt and staticInput.
+    :return: the 32 bytes hash of the params.
+    """
+    encoded = encode(
+        [CONDITIONAL_ORDER_PARAMS_TYPE],
+        [
+            (
+                params["handler"],
+                to_bytes(params["salt"]),
+                to_bytes(params["staticInput"]),
+            )
+        ],
+    )
+    return sha3(encoded)
+
+
+def decode_merkle_proof_orders(
+    proof_data: bytes,
+) -> List[Tuple[List[bytes], Dict[str, Any]]]:
+    """
+    Decodes the orders emitted with a merkle root.
+
+    The data of an emitted proof is an array of orders, each of which is the
+    encoding of its merkle path and its conditional order params.
+
+    :param proof_data: the data of the proof of a `MerkleRootSet` event.
+    :return: the merkle path and the params of each order.
+    """
+    (encoded_orders,) = decode(["bytes[]"], to_bytes(proof_data))
+    orders = []
+    for encoded_order in encoded_orders:
+        path, (handler, salt, static_input) = decode(
+            ["bytes32[]", CONDITIONAL_ORDER_PARAMS_TYPE], encoded_order
+        )
+        params = {"handler": handler, "salt": salt, "staticInput": static_input}
+        orders.append((list(path), params))
+    return orders
+
+
+def get_conditional_order_id(owner: str, params_hash: bytes) -> bytes:
+    """
+    Gets the id of a conditional order.
+
+    The id is derived from the owner and the params hash only, so every agent
+    computes the same 32 bytes for the same conditional order.
+
+    :param owner: the owner of the conditional order.
+    :param params_hash: the hash of the conditional order params.
+    :return: the 32 bytes id of the conditional order.
+    """
+    return sha3(encode_packed(["address", "bytes32"], [owner, params_hash]))
+
+
 def extract_order_uid_params(order_uid: bytes) -> OrderUidParams:
     """Extracts order UID params from order UID"""
     if len(order_uid) != ORDER_UID_LENGTH:
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2023 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""This module contains the pipeline of the tradeability requests of a sweep."""
+
+from typing import Dict, List, Optional, Tuple
+
+
+class SweepRequest:  # pylint: disable=too-few-public-methods
+    """A tradeability request in flight."""
+
+    __slots__ = ("order_ids", "sent_at")
+
+    def __init__(self, order_ids: List[bytes], sent_at: float) -> None:
+        """Initialize the request."""
+        self.order_ids = order_ids
+        self.sent_at = sent_at
+
+
+class SweepPipeline:
+    """
+    The tradeability requests in flight, by dialogue.
+
+    A sweep is split into chunks of orders, and up to `max_in_flight` chunks are
+    checked at the same time, so that a slow request does not hold back the
+    others. A request that gets no response within `timeout` seconds is given
+    up on, so that a lost response cannot stop the monitoring.
+
+    The contract API answers a request with a single state, so the results of a
+    sweep are streamed back one chunk at a time: the tradeable orders of a chunk
+    are ready as soon as its response is handled, whatever the other chunks.
+    """
+
+    def __init__(self, max_in_flight: int, timeout: float) -> None:
+        """Initialize the pipeline."""
+        self.max_in_flight = max(1, max_in_flight)
+        self.timeout = timeout
+        self._requests: Dict[str, SweepRequest] = {}
+
+    def __len__(self) -> int:
+        """Get the number of requests in flight."""
+        return len(self._requests)
+
+    @property
+    def available(self) -> int:
+        """Get the number of requests that can be sent."""
+        return max(0, self.max_in_flight - len(self._requests))
+
+    def add(self, dialogue_nonce: str, order_ids: List[bytes], now: float) -> None:
+        """Track a request that has been sent."""
+        self._requests[dialogue_nonce] = SweepRequest(order_ids, now)
+
+    def complete(self, dialogue_nonce: str) -> Optional[List[bytes]]:
+        """
+        Stop tracking a request that got a response.
+
+        :param dialogue_nonce: the nonce of the dialogue of the request.
+        :return: the ids of the orders of the request, or None if it is not in flight, e.g. because it timed out.
+        """
+        request = self._requests.pop(dialogue_nonce, None)
+        return None if request is None else request.order_ids
+
+    def expire(self, now: float) -> List[Tuple[str, List[bytes]]]:
+        """
+        Stop tracking the requests that timed out.
+
+        :param now: the current time.
+        :return: the nonce of the dialogue and the ids of the orders of each expired request.
+        """
+        expired = [
+            (nonce, request.order_ids)
+            for nonce, request in self._requests.items()
+            if now - request.sent_at >= self.timeout
+        ]
+        for nonce, _ in expired:
+            del self._requests[nonce]
+        return expired
@@ -0,0 +1,334 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2023 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""This module contains the registry of the monitored conditional orders."""
+
+import sys
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple, cast
+
+from packages.valory.contracts.composable_cow.order_types import decode_static_data
+from packages.valory.skills.order_monitoring.order_utils import ConditionalOrder
+from packages.valory.skills.order_monitoring.store import OrderStore
+
+
+# the size of an entry in the indexes: a dict slot, the key and the value
+INDEX_ENTRY_SIZE = 3 * 8 + sys.getsizeof(b"\x00" * 32) + sys.getsizeof((None, None))
+
+
+def get_order_size(order: ConditionalOrder) -> int:
+    """Get the approximate number of bytes an order takes in the registry."""
+    params = order.params
+    size = sys.getsizeof(order) + 2 * INDEX_ENTRY_SIZE
+    if params is not None:
+        size += sys.getsizeof(params)
+        size += sys.getsizeof(params.salt) + sys.getsizeof(params.staticInput)
+    if order.proof is not None:
+        size += sys.getsizeof(order.proof) + sys.getsizeof(order.proof.path)
+        size += sum(sys.getsizeof(node) for node in order.proof.path)
+    if len(order.orders) > 0:
+        size += sys.getsizeof(order.orders)
+    if order.offchainInput:
+        size += sys.getsizeof(order.offchainInput)
+    # orders that share their static input share its decoded struct, which is
+    # then counted once for each of them
+    if order.staticData is not None:
+        size += sys.getsizeof(order.staticData)
+    # the addresses are interned, and shared by all the orders
+    return size
+
+
+class OrderRegistry:
+    """
+    A registry of conditional orders.
+
+    Orders are indexed by `(owner, keccak(params))`, which is what ComposableCoW
+    uses to identify a single order, and by their id, which is derived from both.
+    Insertion, lookup and removal are all O(1).
+
+    Orders that are part of a merkle tree are also indexed by the owner's root,
+    so that replacing a root only touches the orders under the old one.
+
+    The start timestamps that TWAPs created with a context read from the cabinet
+    of ComposableCoW are cached by order id, since they do not change until the
+    order is created again.
+
+    If a store is given, every change is written through to it.
+
+    Since anyone can create conditional orders, the registry can be capped both in
+    total and per owner. New orders are admitted by evicting the oldest orders,
+    of the owner first, then of the whole registry.
+    """
+
+    def __init__(
+        self,
+        store: Optional[OrderStore] = None,
+        max_orders: Optional[int] = None,
+        max_orders_per_owner: Optional[int] = None,
+        order_types: Optional[Dict[str, str]] = None,
+    ) -> None:
+        """Initialize the registry."""
+        self._owners: Dict[str, Dict[bytes, ConditionalOrder]] = {}
+        self._ids: Dict[bytes, Tuple[str, bytes]] = {}
+        self._roots: Dict[str, Dict[bytes, Set[bytes]]] = {}
+        self._start_timestamps: Dict[bytes, int] = {}
+        self.store = store
+        self.max_orders = max_orders
+        self.max_orders_per_owner = max_orders_per_owner
+        # the names of the order types, by handler address
+        self.order_types = {
+            handler.lower(): order_type
+            for handler, order_type in (order_types or {}).items()
+        }
+        self.nbytes = 0
+        self.evicted = 0
+
+    def load(self) -> int:
+        """
+        Load the orders committed to the store.
+
+        :return: the number of loaded orders.
+        """
+        if self.store is None:
+            return 0
+        for owner, params_hash, order in self.store.load():
+            # the caps may have been lowered since the orders were stored
+            self.admit(owner)
+            order.orderType = self.get_order_type(order.params.handler)
+            order.staticData = decode_static_data(
+                order.orderType, order.params.staticInput
+            )
+            self._insert(owner, params_hash, order)
+        for order_id, start_timestamp in self.store.load_start_timestamps().items():
+            if order_id in self._ids:
+                self._start_timestamps[order_id] = start_timestamp
+        return len(self)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the size of the registry and its caps."""
+        return {
+            "orders": len(self),
+            "owners": len(self._owners),
+            "bytes": self.nbytes,
+            "evicted": self.evicted,
+            "max_orders": self.max_orders,
+            "max_orders_per_owner": self.max_orders_per_owner,
+        }
+
+    def admit(self, owner: str) -> List[ConditionalOrder]:
+        """
+        Make room for a new order of an owner, evicting the oldest orders over the caps.
+
+        :param owner: the owner of the new order.
+        :return: the evicted orders.
+        """
+        evicted = []
+        owner_orders = self._owners.get(owner, {})
+        max_orders_per_owner = self.max_orders_per_owner
+        if max_orders_per_owner is not None:
+            while 0 < len(owner_orders) >= max_orders_per_owner:
+                oldest = next(iter(owner_orders))
+                evicted.append(self.remove(owner, oldest))
+        if self.max_orders is not None:
+            while 0 < len(self._ids) >= self.max_orders:
+                oldest = next(iter(self._ids))
+                evicted.append(self.remove_by_id(oldest))
+        self.evicted += len(evicted)
+        return cast(List[ConditionalOrder], evicted)
+
+    def __len__(self) -> int:
+        """Get the number of orders in the registry."""
+        return len(self._ids)
+
+    def __contains__(self, order_id: object) -> bool:
+        """Check whether an order with the given id is in the registry."""
+        return order_id in self._ids
+
+    def __iter__(self) -> Iterator[ConditionalOrder]:
+        """Iterate over all the orders in the registry."""
+        for owner_orders in self._owners.values():
+            yield from owner_orders.values()
+
+    def items(self) -> Iterator[Tuple[str, ConditionalOrder]]:
+        """Iterate over all the `(owner, order)` pairs in the registry."""
+        for owner, owner_orders in self._owners.items():
+            for order in owner_orders.values():
+                yield owner, order
+
+    def owners(self) -> List[str]:
+        """Get the owners that have at least one order in the registry."""
+        return list(self._owners.keys())
+
+    def owner_orders(self, owner: str) -> List[ConditionalOrder]:
+        """Get the orders of an owner."""
+        return list(self._owners.get(owner, {}).values())
+
+    def get(self, owner: str, params_hash: bytes) -> Optional[ConditionalOrder]:
+        """Get an order by its owner and params hash."""
+        return self._owners.get(owner, {}).get(params_hash, None)
+
+    def get_by_id(self, order_id: bytes) -> Optional[ConditionalOrder]:
+        """Get an order by its id."""
+        key = self._ids.get(order_id, None)
+        if key is None:
+            return None
+        return self.get(*key)
+
+    def get_owner(self, order_id: bytes) -> Optional[str]:
+        """Get the owner of an order by its id."""
+        key = self._ids.get(order_id, None)
+        return None if key is None else key[0]
+
+    def get_order_type(self, handler: Optional[str]) -> Optional[str]:
+        """Get the name of the order type of a handler, or None if its orders can only be polled."""
+        if handler is None:
+            return None
+        order_type = self.order_types.get(handler.lower(), None)
+        return None if order_type is None else sys.intern(order_type)
+
+    def get_start_timestamp(self, order_id: bytes) -> Optional[int]:
+        """Get the cached start timestamp of an order."""
+        return self._start_timestamps.get(order_id, None)
+
+    def set_start_timestamp(self, order_id: bytes, start_timestamp: int) -> None:
+        """Cache the start timestamp of an order in the registry."""
+        if order_id not in self._ids or start_timestamp == 0:
+            # an empty cabinet entry may still be set
+            return
+        if self._start_timestamps.get(order_id, None) == start_timestamp:
+            return
+        self._start_timestamps[order_id] = start_timestamp
+        if self.store is not None:
+            self.store.set_start_timestamp(order_id, start_timestamp)
+
+    def invalidate_start_timestamp(self, order_id: bytes) -> None:
+        """Drop the cached start timestamp of an order, e.g. because it was created again."""
+        if self._start_timestamps.pop(order_id, None) is None:
+            return
+        if self.store is not None:
+            self.store.set_start_timestamp(order_id, 0)
+
+    def set_order_status(self, order_id: bytes, order_uid: str, status: int) -> bool:
+        """
+        Set the status of a discrete order of a conditional order.
+
+        :param order_id: the id of the conditional order.
+        :param order_uid: the uid of the discrete order.
+        :param status: the status of the discrete order, from `OrderStatus`.
+        :return: False if the conditional order is not in the registry, True otherwise.
+        """
+        key = self._ids.get(order_id, None)
+        if key is None:
+            return False
+        order = cast(ConditionalOrder, self.get(*key))
+        if order.orders.get(order_uid, None) == status:
+            return True
+        self.nbytes -= get_order_size(order)
+        # the empty mapping is shared, so the orders are copied rather than updated
+        order.orders = {**order.orders, order_uid: status}
+        self.nbytes += get_order_size(order)
+        if self.store is not None:
+            self.store.put(*key, order)
+        return True
+
+    def add(self, owner: str, params_hash: bytes, order: ConditionalOrder) -> bool:
+        """
+        Add an order to the registry.
+
+        :param owner: the owner of the order.
+        :param params_hash: the hash of the order params.
+        :param order: the order.
+        :return: False if the order was already in the registry, True otherwise.
+        """
+        if not self._insert(owner, params_hash, order):
+            return False
+        if self.store is not None:
+            self.store.put(owner, params_hash, order)
+        return True
+
+    def _insert(self, owner: str, params_hash: bytes, order: ConditionalOrder) -> bool:
+        """Insert an order in the indexes."""
+        owner = sys.intern(owner)
+        owner_orders = self._owners.setdefault(owner, {})
+        if params_hash in owner_orders:
+            return False
+        owner_orders[params_hash] = order
+        self._ids[order.id] = (owner, params_hash)
+        self.nbytes += get_order_size(order)
+        if order.proof is not None:
+            owner_roots = self._roots.setdefault(owner, {})
+            owner_roots.setdefault(order.proof.merkleRoot, set()).add(order.id)
+        return True
+
+    def remove(self, owner: str, params_hash: bytes) -> Optional[ConditionalOrder]:
+        """Remove an order by its owner and params hash, and return it."""
+        owner_orders = self._owners.get(owner, None)
+        if owner_orders is None:
+            return None
+        order = owner_orders.pop(params_hash, None)
+        if order is None:
+            return None
+        if len(owner_orders) == 0:
+            del self._owners[owner]
+        self._ids.pop(order.id, None)
+        self._start_timestamps.pop(order.id, None)
+        if order.proof is not None:
+            self._unindex_root(owner, order.proof.merkleRoot, order.id)
+        self.nbytes -= get_order_size(order)
+        if self.store is not None:
+            self.store.delete(order.id)
+        return order
+
+    def _unindex_root(self, owner: str, root: bytes, order_id: bytes) -> None:
+        """Remove an order from the merkle root index."""
+        owner_roots = self._roots.get(owner, {})
+        root_ids = owner_roots.get(root, None)
+        if root_ids is None:
+            return
+        root_ids.discard(order_id)
+        if len(root_ids) == 0:
+            del owner_roots[root]
+        if len(owner_roots) == 0:
+            self._roots.pop(owner, None)
+
+    def roots(self, owner: str) -> List[bytes]:
+        """Get the merkle roots of an owner that have at least one order in the registry."""
+        return list(self._roots.get(owner, {}).keys())
+
+    def remove_root(self, owner: str, root: bytes) -> List[ConditionalOrder]:
+        """
+        Remove all the orders of an owner that are under a merkle root.
+
+        :param owner: the owner of the orders.
+        :param root: the merkle root.
+        :return: the removed orders.
+        """
+        root_ids = self._roots.get(owner, {}).get(root, set())
+        removed = []
+        for order_id in list(root_ids):
+            order = self.remove_by_id(order_id)
+            if order is not None:
+                removed.append(order)
+        return removed
+
+    def remove_by_id(self, order_id: bytes) -> Optional[ConditionalOrder]:
+        """Remove an order by its id, and return it."""
+        key = self._ids.get(order_id, None)
+        if key is None:
+            return None
+        return self.remove(*key)
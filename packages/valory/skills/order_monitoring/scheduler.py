@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2023 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""This module contains the scheduler of the tradeability checks of conditional orders."""
+
+import heapq
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from packages.valory.contracts.composable_cow.order_types import (
+    TWAP_ORDER_TYPE,
+    decode_static_data,
+    get_order_type,
+)
+from packages.valory.contracts.composable_cow.twap import TWAP
+from packages.valory.skills.order_monitoring.order_utils import ConditionalOrder
+
+
+def get_static_data(order: ConditionalOrder) -> Optional[Any]:
+    """Get the decoded static input of an order, decoding it if it was not at registration."""
+    if order.staticData is not None:
+        return order.staticData
+    return decode_static_data(order.orderType, order.params.staticInput)
+
+
+def get_submitted_parts(
+    order: ConditionalOrder, start_timestamp: Optional[int] = None
+) -> List[int]:
+    """
+    Get the parts of a TWAP order whose discrete orders have been submitted.
+
+    :param order: the conditional order, with the uids of its discrete orders.
+    :param start_timestamp: the start of the TWAP, for TWAPs that start when they are created.
+    :return: the submitted parts, or no part if they cannot be computed locally.
+    """
+    if len(order.orders) == 0 or order.orderType != TWAP_ORDER_TYPE:
+        return []
+    data = get_static_data(order)
+    twap = None if data is None else TWAP.from_data(data, start_timestamp)
+    if twap is None:
+        return []
+    parts: Set[int] = set()
+    for order_uid in order.orders:
+        # an order uid ends with the validTo of the order, in the window of its part
+        part = twap.get_part(int(order_uid[-8:], 16))
+        if part is not None:
+            parts.add(part)
+    return sorted(parts)
+
+
+def get_next_check_timestamp(
+    order: ConditionalOrder, timestamp: int, start_timestamp: Optional[int] = None
+) -> int:
+    """
+    Get the first timestamp, from the given one on, at which the order may be tradeable.
+
+    The order type of the handler of the order tells when it can next be traded,
+    e.g. when the window of a TWAP part opens. Orders that cannot be evaluated
+    locally, such as orders of unknown handlers or TWAPs that start when they are
+    created (`t0` is 0) and whose start is not cached yet, and orders that have
+    expired, are due at the given timestamp, so that the sweep can check them.
+
+    :param order: the conditional order.
+    :param timestamp: the timestamp from which to look for a tradeable part.
+    :param start_timestamp: the start of the order read from the cabinet, if cached.
+    :return: the timestamp at which the order is due.
+    """
+    order_type = get_order_type(order.orderType)
+    data = get_static_data(order)
+    if order_type is None or data is None:
+        return timestamp
+    check = order_type.pre_check(data, timestamp, start_timestamp)
+    if check.tradeable or check.next_check is None:
+        return timestamp
+    return check.next_check
+
+
+def get_end_timestamp(
+    order: ConditionalOrder, start_timestamp: Optional[int] = None
+) -> Optional[int]:
+    """Get the timestamp at which an order expires, if it can be computed locally."""
+    order_type = get_order_type(order.orderType)
+    data = get_static_data(order)
+    if order_type is None or data is None:
+        return None
+    return order_type.get_end_timestamp(data, start_timestamp)
+
+
+class _TimestampHeap:
+    """
+    A min-heap of order ids keyed by a timestamp.
+
+    Updating or discarding an order leaves its old heap entry in place, and stale
+    entries are skipped when they are popped. The heap is rebuilt from the live
+    entries once the stale ones outnumber them, so that it does not grow with the
+    orders that were updated or discarded but never popped.
+    """
+
+    def __init__(self) -> None:
+        """Initialize the heap."""
+        self._heap: List[Tuple[int, bytes]] = []
+        self._timestamps: Dict[bytes, int] = {}
+
+    def __len__(self) -> int:
+        """Get the number of orders in the heap."""
+        return len(self._timestamps)
+
+    def __contains__(self, order_id: object) -> bool:
+        """Check whether an order is in the heap."""
+        return order_id in self._timestamps
+
+    @property
+    def stale(self) -> int:
+        """Get the number of stale heap entries."""
+        # every live order has exactly one heap entry with its current timestamp
+        return len(self._heap) - len(self._timestamps)
+
+    def stats(self) -> Dict[str, int]:
+        """Get the number of orders in the heap and of its entries."""
+        return {"orders": len(self), "entries": len(self._heap)}
+
+    def get(self, order_id: bytes) -> Optional[int]:
+        """Get the timestamp of an order."""
+        return self._timestamps.get(order_id, None)
+
+    def peek(self) -> Optional[int]:
+        """Get the earliest timestamp in the heap."""
+        while len(self._heap) > 0:
+            timestamp, order_id = self._heap[0]
+            if self._timestamps.get(order_id, None) == timestamp:
+                return timestamp
+            heapq.heappop(self._heap)
+        return None
+
+    def push(self, order_id: bytes, timestamp: int) -> None:
+        """Add an order to the heap, or update its timestamp."""
+        if self._timestamps.get(order_id, None) == timestamp:
+            return
+        self._timestamps[order_id] = timestamp
+        heapq.heappush(self._heap, (timestamp, order_id))
+        self._compact()
+
+    def discard(self, order_id: bytes) -> None:
+        """Remove an order from the heap, if present."""
+        if self._timestamps.pop(order_id, None) is not None:
+            self._compact()
+
+    def _compact(self) -> None:
+        """Rebuild the heap from the live entries if the stale ones outnumber them."""
+        if self.stale <= len(self._timestamps):
+            return
+        self._heap = [
+            (timestamp, order_id) for order_id, timestamp in self._timestamps.items()
+        ]
+        heapq.heapify(self._heap)
+
+    def pop_until(self, timestamp: int, limit: Optional[int] = None) -> List[bytes]:
+        """Pop the orders with a timestamp up to the given one, earliest first, up to `limit` of them."""
+        popped: List[bytes] = []
+        while len(self._heap) > 0 and self._heap[0][0] <= timestamp:
+            if limit is not None and len(popped) >= limit:
+                break
+            order_timestamp, order_id = heapq.heappop(self._heap)
+            if self._timestamps.get(order_id, None) != order_timestamp:
+                # the order has been updated or discarded
+                continue
+            del self._timestamps[order_id]
+            popped.append(order_id)
+        return popped
+
+
+class OrderScheduler(_TimestampHeap):
+    """
+    A scheduler of the tradeability checks of conditional orders.
+
+    Orders are keyed by the timestamp at which they are next due, so that a sweep
+    only pops the orders that are due instead of scanning all of them.
+
+    Popped orders are in flight until the sweep that checks them completes.
+    """
+
+    def __init__(self) -> None:
+        """Initialize the scheduler."""
+        super().__init__()
+        self._in_flight: Set[bytes] = set()
+        # the number of polls in a row of the orders that can only be polled
+        self._backoffs: Dict[bytes, int] = {}
+
+    @property
+    def in_flight(self) -> Set[bytes]:
+        """Get the ids of the orders that are being checked."""
+        return self._in_flight
+
+    def stats(self) -> Dict[str, int]:
+        """Get the number of scheduled orders, of heap entries and of orders in flight."""
+        return {**super().stats(), "in_flight": len(self._in_flight)}
+
+    def next_due(self) -> Optional[int]:
+        """Get the timestamp at which the next order is due."""
+        return self.peek()
+
+    def schedule(self, order_id: bytes, timestamp: int) -> None:
+        """Schedule an order to be checked at the given timestamp."""
+        self.push(order_id, timestamp)
+
+    def unschedule(self, order_id: bytes) -> None:
+        """Unschedule an order."""
+        self.discard(order_id)
+        self._in_flight.discard(order_id)
+        self._backoffs.pop(order_id, None)
+
+    def backoff(self, order_id: bytes, interval: int, max_interval: int) -> int:
+        """
+        Get the delay before the next poll of an order, doubling it on every poll.
+
+        :param order_id: the id of the order.
+        :param interval: the delay after the first poll.
+        :param max_interval: the maximum delay.
+        :return: the delay, in seconds.
+        """
+        polls = self._backoffs.get(order_id, 0)
+        self._backoffs[order_id] = polls + 1
+        return min(max_interval, interval * 2 ** min(polls, 32))
+
+    def reset_backoff(self, order_id: bytes) -> None:
+        """Poll an order at the base interval again, e.g. because it was tradeable."""
+        self._backoffs.pop(order_id, None)
+
+    def pop_due(self, timestamp: int, limit: Optional[int] = None) -> List[bytes]:
+        """
+        Pop the orders that are due at the given timestamp, and mark them in flight.
+
+        :param timestamp: the current timestamp.
+        :param limit: the maximum number of orders to pop, if any.
+        :return: the ids of the due orders, earliest first.
+        """
+        due = self.pop_until(timestamp, limit)
+        self._in_flight.update(due)
+        return due
+
+    def complete(self, order_ids: Optional[Iterable[bytes]] = None) -> List[bytes]:
+        """
+        Clear orders in flight, and return them to be rescheduled.
+
+        :param order_ids: the orders whose check completed, all the orders in flight if None.
+        :return: the ids of the orders that were in flight.
+        """
+        if order_ids is None:
+            in_flight = list(self._in_flight)
+            self._in_flight.clear()
+            return in_flight
+        completed = [order_id for order_id in order_ids if order_id in self._in_flight]
+        self._in_flight.difference_update(completed)
+        return completed
+
+
+class OrderExpiries(_TimestampHeap):
+    """
+    The end timestamps of conditional orders.
+
+    The end of an order never changes once known, so expired orders can be popped
+    and evicted as soon as a block header is past their end, without any RPC call.
+    """
+
+    def pop_expired(self, block_timestamp: int) -> List[bytes]:
+        """Pop the orders that have expired at the given block timestamp."""
+        return self.pop_until(block_timestamp)
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2023 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""This module contains the sharding of the monitored owners across the agents of a service."""
+
+import hashlib
+from collections import OrderedDict
+from typing import List, Optional, Sequence
+
+
+# the number of owners whose agent is cached
+DEFAULT_MAX_CACHED_OWNERS = 100_000
+
+
+class OwnerSharding:
+    """
+    Assigns each owner to a single agent of the service.
+
+    Owners are assigned with rendezvous hashing: every agent scores every owner,
+    and the agent with the highest score is responsible for it. All the agents
+    compute the same assignment, and adding or removing an agent only moves the
+    owners of that agent.
+
+    The participants are the active agents of the service, as agreed by the ABCI
+    app, so the owners of an agent that drops out are taken over by the others.
+    """
+
+    def __init__(
+        self,
+        agent_address: str,
+        participants: Sequence[str] = (),
+        max_cached_owners: int = DEFAULT_MAX_CACHED_OWNERS,
+    ) -> None:
+        """
+        Initialize the sharding.
+
+        :param agent_address: the address of this agent.
+        :param participants: the addresses of the active agents of the service.
+        :param max_cached_owners: the number of owners whose agent is cached.
+        """
+        self.agent_address = agent_address.lower()
+        self.participants: List[str] = []
+        self.max_cached_owners = max_cached_owners
+        # the least recently used owners are evicted over `max_cached_owners`
+        self._owners: OrderedDict = OrderedDict()
+        self.set_participants(participants)
+
+    def set_participants(self, participants: Sequence[str]) -> bool:
+        """
+        Set the active agents of the service.
+
+        :param participants: the addresses of the active agents of the service.
+        :return: whether the participants changed.
+        """
+        participants_ = sorted({p.lower() for p in participants})
+        if participants_ == self.participants:
+            return False
+        self.participants = participants_
+        self._owners.clear()
+        return True
+
+    @staticmethod
+    def _score(owner: str, participant: str) -> bytes:
+        """Get the score of a participant for an owner."""
+        return hashlib.sha256(f"{owner}{participant}".encode()).digest()
+
+    def get_participant(self, owner: str) -> Optional[str]:
+        """Get the agent that is responsible for an owner."""
+        if len(self.participants) == 0:
+            return None
+        owner = owner.lower()
+        participant = self._owners.get(owner, None)
+        if participant is not None:
+            self._owners.move_to_end(owner)
+            return participant
+        participant = max(self.participants, key=lambda p: self._score(owner, p))
+        self._owners[owner] = participant
+        if len(self._owners) > self.max_cached_owners:
+            self._owners.popitem(last=False)
+        return participant
+
+    def is_mine(self, owner: str) -> bool:
+        """Check whether this agent is responsible for an owner."""
+        participant = self.get_participant(owner)
+        # without participants, there is nobody to share the owners with
+        return participant is None or participant == self.agent_address
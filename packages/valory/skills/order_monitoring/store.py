@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2023 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""This module contains the durable store of the monitored conditional orders."""
+
+import json
+import sqlite3
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from packages.valory.skills.order_monitoring.order_utils import (
+    ConditionalOrder,
+    ConditionalOrderParamsStruct,
+    Proof,
+)
+
+
+PROOF_NODE_SIZE = 32
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS orders (
+    id BLOB PRIMARY KEY,
+    owner TEXT NOT NULL,
+    params_hash BLOB NOT NULL,
+    handler TEXT NOT NULL,
+    salt BLOB NOT NULL,
+    static_input BLOB NOT NULL,
+    merkle_root BLOB,
+    path BLOB,
+    composable_cow TEXT,
+    offchain_input BLOB,
+    orders TEXT
+);
+CREATE TABLE IF NOT EXISTS ready_orders (
+    position INTEGER PRIMARY KEY,
+    body TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS start_timestamps (
+    id BLOB PRIMARY KEY,
+    start_timestamp INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS checkpoint (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    block_number INTEGER NOT NULL,
+    block_hash TEXT NOT NULL
+);
+"""
+
+OrderRow = Tuple[
+    bytes,
+    str,
+    bytes,
+    str,
+    bytes,
+    bytes,
+    Optional[bytes],
+    Optional[bytes],
+    Optional[str],
+    Optional[bytes],
+    Optional[str],
+]
+
+
+class OrderStore:
+    """
+    A durable store of conditional orders, backed by SQLite.
+
+    The database runs in WAL mode, so a crash can only lose the uncommitted
+    batch. Writes are staged in memory and flushed in a single transaction on
+    `commit`, which the handlers call once per block. The checkpoint of the
+    last fully processed block is committed in the same transaction as the
+    orders, so the two never disagree.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Initialize the store."""
+        self._conn = sqlite3.connect(path, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._puts: Dict[bytes, OrderRow] = {}
+        self._deletes: Dict[bytes, None] = {}
+        self._ready_orders: Optional[List[Dict[str, Any]]] = None
+        self._start_timestamps: Dict[bytes, int] = {}
+        self._checkpoint: Optional[Tuple[int, str]] = None
+
+    @property
+    def pending(self) -> int:
+        """Get the number of writes waiting to be committed."""
+        ready_orders = 0 if self._ready_orders is None else 1
+        checkpoint = 0 if self._checkpoint is None else 1
+        return (
+            len(self._puts)
+            + len(self._deletes)
+            + len(self._start_timestamps)
+            + ready_orders
+            + checkpoint
+        )
+
+    def put(self, owner: str, params_hash: bytes, order: ConditionalOrder) -> None:
+        """Stage the insertion or the update of an order."""
+        proof = order.proof
+        self._deletes.pop(order.id, None)
+        self._puts[order.id] = (
+            order.id,
+            owner,
+            params_hash,
+            order.params.handler,
+            order.params.salt,
+            order.params.staticInput,
+            None if proof is None else proof.merkleRoot,
+            None if proof is None else b"".join(proof.path),
+            order.composableCow,
+            order.offchainInput,
+            json.dumps(dict(order.orders)) if len(order.orders) > 0 else None,
+        )
+
+    def delete(self, order_id: bytes) -> None:
+        """Stage the deletion of an order, and of its start timestamp."""
+        self._puts.pop(order_id, None)
+        self._start_timestamps.pop(order_id, None)
+        self._deletes[order_id] = None
+
+    def set_start_timestamp(self, order_id: bytes, start_timestamp: int) -> None:
+        """Stage the start timestamp of an order, or its deletion if 0."""
+        self._start_timestamps[order_id] = start_timestamp
+
+    def set_ready_orders(self, ready_orders: List[Dict[str, Any]]) -> None:
+        """Stage a snapshot of the orders that are ready to be placed."""
+        self._ready_orders = list(ready_orders)
+
+    def set_checkpoint(self, block_number: int, block_hash: str) -> None:
+        """Stage the last block whose events have been fully processed."""
+        self._checkpoint = (block_number, block_hash)
+
+    def commit(self) -> None:
+        """Write all the staged changes in a single transaction."""
+        if self.pending == 0:
+            return
+        with self._conn:
+            self._conn.execute("BEGIN")
+            if len(self._deletes) > 0:
+                self._conn.executemany(
+                    "DELETE FROM orders WHERE id = ?",
+                    ((order_id,) for order_id in self._deletes),
+                )
+                self._conn.executemany(
+                    "DELETE FROM start_timestamps WHERE id = ?",
+                    ((order_id,) for order_id in self._deletes),
+                )
+            if len(self._puts) > 0:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO orders VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    self._puts.values(),
+                )
+            if len(self._start_timestamps) > 0:
+                self._conn.executemany(
+                    "DELETE FROM start_timestamps WHERE id = ?",
+                    (
+                        (order_id,)
+                        for order_id, start_timestamp in self._start_timestamps.items()
+                        if start_timestamp == 0
+                    ),
+                )
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO start_timestamps VALUES (?, ?)",
+                    (
+                        (order_id, start_timestamp)
+                        for order_id, start_timestamp in self._start_timestamps.items()
+                        if start_timestamp != 0
+                    ),
+                )
+            if self._ready_orders is not None:
+                self._conn.execute("DELETE FROM ready_orders")
+                self._conn.executemany(
+                    "INSERT INTO ready_orders VALUES (?, ?)",
+                    (
+                        (position, json.dumps(order))
+                        for position, order in enumerate(self._ready_orders)
+                    ),
+                )
+            if self._checkpoint is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO checkpoint VALUES (0, ?, ?)",
+                    self._checkpoint,
+                )
+        self._puts.clear()
+        self._deletes.clear()
+        self._start_timestamps.clear()
+        self._ready_orders = None
+        self._checkpoint = None
+
+    def load(self) -> Iterator[Tuple[str, bytes, ConditionalOrder]]:
+        """Load all the committed orders, as `(owner, params_hash, order)`."""
+        cursor = self._conn.execute("SELECT * FROM orders ORDER BY rowid")
+        for row in cursor:
+            (
+                order_id,
+                owner,
+                params_hash,
+                handler,
+                salt,
+                static_input,
+                merkle_root,
+                path,
+                composable_cow,
+                offchain_input,
+                orders,
+            ) = row
+            proof = None
+            if merkle_root is not None:
+                nodes = [
+                    path[i : i + PROOF_NODE_SIZE]
+                    for i in range(0, len(path), PROOF_NODE_SIZE)
+                ]
+                proof = Proof(merkle_root, nodes)
+            order = ConditionalOrder(
+                id=order_id,
+                params=ConditionalOrderParamsStruct(handler, salt, static_input),
+                proof=proof,
+                orders=json.loads(orders) if orders is not None else None,
+                composableCow=composable_cow,
+                offchainInput=offchain_input,
+            )
+            yield owner, params_hash, order
+
+    def load_ready_orders(self) -> List[Dict[str, Any]]:
+        """Load the committed orders that are ready to be placed."""
+        cursor = self._conn.execute("SELECT body FROM ready_orders ORDER BY position")
+        return [json.loads(body) for (body,) in cursor]
+
+    def load_start_timestamps(self) -> Dict[bytes, int]:
+        """Load the committed start timestamps, by order id."""
+        cursor = self._conn.execute("SELECT id, start_timestamp FROM start_timestamps")
+        return {order_id: start_timestamp for order_id, start_timestamp in cursor}
+
+    def load_checkpoint(self) -> Optional[Tuple[int, str]]:
+        """Load the committed checkpoint, as `(block_number, block_hash)`."""
+        cursor = self._conn.execute(
+            "SELECT block_number, block_hash FROM checkpoint WHERE id = 0"
+        )
+        row = cursor.fetchone()
+        return None if row is None else (row[0], row[1])
+
+    def close(self) -> None:
+        """Commit the staged changes and close the store."""
+        self.commit()
+        self._conn.close()
@@ -20,20 +20,30 @@
 
 """This module contains tests for order_monitoring behaviour."""
 
-from unittest.mock import MagicMock
+import time
+from unittest.mock import MagicMock, patch
+from uuid import uuid4
 
 from packages.valory.protocols.default.message import DefaultMessage
 from packages.valory.skills.order_monitoring import PUBLIC_ID
 from packages.valory.skills.order_monitoring.behaviours import MonitoringBehaviour
 from packages.valory.skills.order_monitoring.handlers import (
+    CHECKPOINT,
     DISCONNECTION_POINT,
     LEDGER_API_ADDRESS,
     ORDERS,
+    PARTICIPANTS,
+    SCHEDULER,
+    SHARDING,
 )
 from packages.valory.skills.order_monitoring.order_utils import (
     ConditionalOrder,
     ConditionalOrderParamsStruct,
 )
+from packages.valory.skills.order_monitoring.pipeline import SweepPipeline
+from packages.valory.skills.order_monitoring.registry import OrderRegistry
+from packages.valory.skills.order_monitoring.scheduler import OrderScheduler
+from packages.valory.skills.order_monitoring.sharding import OwnerSharding
 
 
 class TestMonitoringBehaviour:
@@ -46,9 +56,12 @@ class TestMonitoringBehaviour:
             skill_context=MagicMock(),
         )
         self.behaviour.context.params = MagicMock()
+        self.behaviour.context.params.sweep_chunk_size = None
+        self.behaviour.context.params.sweep_retry_interval = 30
+        self.behaviour.context.params.sweep_pipeline = SweepPipeline(4, 60)
         self.behaviour.context.logger = MagicMock()
         self.behaviour.context.outbox = MagicMock()
-        self.behaviour.context.shared_state = {}
+        self.behaviour.context.shared_state = {SCHEDULER: OrderScheduler()}
         self.behaviour.context.contract_api_dialogues = MagicMock()
 
     def test_setup_with_polling(self) -> None:
@@ -59,65 +72,272 @@ class TestMonitoringBehaviour:
 
     def test_act(self) -> None:
         """Test the act method of the MonitoringBehaviour class."""
+        self.behaviour._do_backfill = MagicMock()
         self.behaviour._do_subscription = MagicMock()
         self.behaviour._check_orders_are_tradeable = MagicMock()
         self.behaviour.act()
+        self.behaviour._do_backfill.assert_called_once()
         self.behaviour._do_subscription.assert_called_once()
         self.behaviour._check_orders_are_tradeable.assert_called_once()
 
-    def test_orders(self) -> None:
-        """Test orders property of MonitoringBehaviour."""
-        self.behaviour.context.shared_state[ORDERS] = {"owner1": []}
-        assert self.behaviour.context.shared_state[ORDERS] == {"owner1": []}
-
-    def test_check_orders_are_tradeable_with_in_flight_req(self) -> None:
-        """Test the _check_orders_are_tradeable method of the MonitoringBehaviour class where there is an in flight request."""
-        self.behaviour.params.in_flight_req = True
-        self.behaviour.context.shared_state[ORDERS] = {
-            "owner1": [
+    def test_update_sharding(self) -> None:
+        """Test that the owners of an agent that dropped out are taken over, and given back."""
+        participants = ["0x" + "aa" * 20, "0x" + "bb" * 20]
+        params = ConditionalOrderParamsStruct("handler", b"salt", b"static_input")
+        registry = OrderRegistry()
+        owners = ["0x" + f"{i:02x}" * 20 for i in range(1, 9)]
+        for owner in owners:
+            registry.add(
+                owner,
+                b"hash",
                 ConditionalOrder(
-                    id="1",
-                    params=None,
+                    id=owner,
+                    params=params,
                     proof=None,
                     orders={},
                     composableCow=None,
                     offchainInput=b"",
-                )
-            ]
-        }
+                ),
+            )
+        sharding = OwnerSharding(participants[0], participants)
+        mine = [owner for owner in owners if sharding.is_mine(owner)]
+        assert 0 < len(mine) < len(owners)
+        for owner in mine:
+            self.behaviour.scheduler.schedule(owner, 0)
+        self.behaviour.context.shared_state[ORDERS] = registry
+        self.behaviour.context.shared_state[SHARDING] = sharding
+
+        # the other agent dropped out
+        self.behaviour.context.shared_state[PARTICIPANTS] = participants[:1]
+        self.behaviour._update_sharding()
+        assert len(self.behaviour.scheduler) == len(owners)
+        # and came back
+        self.behaviour.context.shared_state[PARTICIPANTS] = participants
+        self.behaviour._update_sharding()
+        assert [owner for owner in owners if owner in self.behaviour.scheduler] == mine
+
+    def test_orders(self) -> None:
+        """Test orders property of MonitoringBehaviour."""
+        self.behaviour.context.shared_state[ORDERS] = {"owner1": []}
+        assert self.behaviour.context.shared_state[ORDERS] == {"owner1": []}
+
+    def test_check_orders_are_tradeable_with_full_pipeline(self) -> None:
+        """Test the _check_orders_are_tradeable method of the MonitoringBehaviour class where no more requests can be in flight."""
+        self.behaviour.params.sweep_pipeline = SweepPipeline(1, 60)
+        self.behaviour.params.sweep_pipeline.add("nonce", [], time.time())
+        registry = OrderRegistry()
+        registry.add(
+            "owner1",
+            b"hash",
+            ConditionalOrder(
+                id="1",
+                params=None,
+                proof=None,
+                orders={},
+                composableCow=None,
+                offchainInput=b"",
+            ),
+        )
+        self.behaviour.context.shared_state[ORDERS] = registry
+        self.behaviour.scheduler.schedule("1", 0)
         self.behaviour._check_orders_are_tradeable()
         assert self.behaviour.context.contract_api_dialogues.create.call_count == 0
         assert self.behaviour.context.outbox.put_message.call_count == 0
+        assert "1" in self.behaviour.scheduler
 
     def test_check_orders_are_tradeable_with_no_orders(self) -> None:
         """Test the _check_orders_are_tradeable method of the MonitoringBehaviour class where there are no orders."""
-        self.behaviour.params.in_flight_req = False
-        self.behaviour.context.shared_state[ORDERS] = {}
+        self.behaviour.context.shared_state[ORDERS] = OrderRegistry()
         self.behaviour._check_orders_are_tradeable()
         assert self.behaviour.context.contract_api_dialogues.create.call_count == 0
         assert self.behaviour.context.outbox.put_message.call_count == 0
 
     def test_check_orders_are_tradeable_with_valid_orders(self) -> None:
         """Test the _check_orders_are_tradeable method of the MonitoringBehaviour class where the orders are valid."""
-        self.behaviour.params.in_flight_req = False
         self.behaviour.context.contract_api_dialogues.create = MagicMock(
             return_value=(MagicMock(), MagicMock())
         )
         params = ConditionalOrderParamsStruct("handler", b"salt", b"static_input")
-        self.behaviour.context.shared_state[ORDERS] = {
-            "owner1": [
-                ConditionalOrder(
-                    id="1",
-                    params=params,
-                    proof=None,
-                    orders={},
-                    composableCow=None,
-                    offchainInput=b"offchain_input",
-                )
-            ]
-        }
+        registry = OrderRegistry()
+        registry.add(
+            "owner1",
+            b"hash",
+            ConditionalOrder(
+                id=b"1",
+                params=params,
+                proof=None,
+                orders={},
+                composableCow=None,
+                offchainInput=b"offchain_input",
+            ),
+        )
+        self.behaviour.context.shared_state[ORDERS] = registry
+        self.behaviour.scheduler.schedule(b"1", 0)
+        self.behaviour.params.multicall_chunk_size = 50
+        self.behaviour.params.rpc_batch_size = 20
+        self.behaviour.params.sweep_max_workers = 8
+        self.behaviour.params.seconds_per_block = 5
+        self.behaviour.params.sweep_timeout = 20.0
+        self.behaviour.params.rpc_breaker_threshold = 2
+        self.behaviour.params.rpc_breaker_cooldown = 90.0
+        self.behaviour.params.tradeable_order_cache_size = 512
         self.behaviour._check_orders_are_tradeable()
         assert self.behaviour.context.outbox.put_message.call_count == 1
+        assert len(self.behaviour.params.sweep_pipeline) == 1
+        kwargs = self.behaviour.context.contract_api_dialogues.create.call_args[1]
+        assert dict(kwargs["kwargs"])["multicall_chunk_size"] == 50
+        assert dict(kwargs["kwargs"])["rpc_batch_size"] == 20
+        assert dict(kwargs["kwargs"])["max_workers"] == 8
+        assert dict(kwargs["kwargs"])["seconds_per_block"] == 5
+        assert dict(kwargs["kwargs"])["sweep_timeout"] == 20.0
+        assert dict(kwargs["kwargs"])["breaker_threshold"] == 2
+        assert dict(kwargs["kwargs"])["breaker_cooldown"] == 90.0
+        assert dict(kwargs["kwargs"])["cache_size"] == 512
+        order = dict(kwargs["kwargs"])["orders"][0]
+        assert order["submittedParts"] == []
+        # the bytes are sent as hex strings
+        assert order["id"] == "0x31"
+        assert order["params"] == [
+            "handler",
+            "0x" + b"salt".hex(),
+            "0x" + b"static_input".hex(),
+        ]
+        assert order["offchainInput"] == "0x" + b"offchain_input".hex()
+        assert order["proof"] == []
+        assert self.behaviour.scheduler.in_flight == {b"1"}
+
+    def test_check_orders_are_tradeable_with_orders_not_due(self) -> None:
+        """Test the _check_orders_are_tradeable method of the MonitoringBehaviour class where no order is due."""
+        params = ConditionalOrderParamsStruct("handler", b"salt", b"static_input")
+        registry = OrderRegistry()
+        registry.add(
+            "owner1",
+            b"hash",
+            ConditionalOrder(
+                id="1",
+                params=params,
+                proof=None,
+                orders={},
+                composableCow=None,
+                offchainInput=b"",
+            ),
+        )
+        self.behaviour.context.shared_state[ORDERS] = registry
+        self.behaviour.scheduler.schedule("1", 2**40)
+        self.behaviour._check_orders_are_tradeable()
+        assert self.behaviour.context.outbox.put_message.call_count == 0
+        assert "1" in self.behaviour.scheduler
+
+    def _add_orders(self, count: int) -> OrderRegistry:
+        """Add due orders to the registry."""
+        self.behaviour.context.contract_api_dialogues.create = MagicMock(
+            side_effect=lambda **kwargs: (
+                MagicMock(dialogue_reference=(str(uuid4()), "")),
+                MagicMock(),
+            )
+        )
+        params = ConditionalOrderParamsStruct("handler", b"salt", b"static_input")
+        registry = OrderRegistry()
+        for i in range(count):
+            order = ConditionalOrder(
+                id=str(i).encode(),
+                params=params,
+                proof=None,
+                orders={},
+                composableCow=None,
+                offchainInput=b"",
+            )
+            registry.add("owner1", str(i).encode(), order)
+            self.behaviour.scheduler.schedule(order.id, 0)
+        self.behaviour.context.shared_state[ORDERS] = registry
+        return registry
+
+    def test_check_orders_are_tradeable_in_chunks(self) -> None:
+        """Test that the due orders are checked in chunks of concurrent requests."""
+        self._add_orders(5)
+        self.behaviour.params.sweep_chunk_size = 2
+        self.behaviour.params.sweep_pipeline = SweepPipeline(2, 60)
+        self.behaviour._check_orders_are_tradeable()
+        assert self.behaviour.context.outbox.put_message.call_count == 2
+        assert len(self.behaviour.params.sweep_pipeline) == 2
+        assert self.behaviour.scheduler.in_flight == {b"0", b"1", b"2", b"3"}
+        assert b"4" in self.behaviour.scheduler
+
+    def test_check_orders_are_tradeable_timed_out(self) -> None:
+        """Test that the orders of a request that timed out are checked again."""
+        self._add_orders(1)
+        self.behaviour.params.sweep_pipeline = SweepPipeline(1, 60)
+        self.behaviour.params.sweep_retry_interval = 0
+        self.behaviour._check_orders_are_tradeable()
+        assert self.behaviour.scheduler.in_flight == {b"0"}
+
+        with patch.object(time, "time", return_value=time.time() + 60):
+            self.behaviour._check_orders_are_tradeable()
+        assert self.behaviour.context.logger.warning.call_count == 1
+        # the order was checked again in a new request
+        assert self.behaviour.context.outbox.put_message.call_count == 2
+        assert len(self.behaviour.params.sweep_pipeline) == 1
+
+    def test_do_backfill_first_boot(self) -> None:
+        """Test the _do_backfill method of the MonitoringBehaviour class when there is no checkpoint."""
+        self.behaviour.context.params.start_block = 100
+        self.behaviour.context.params.backfill_block_range = 50
+        self.behaviour.context.params.backfill_in_flight = None
+        self.behaviour.context.params.backfill_request_timeout = 120
+        self.behaviour.context.contract_api_dialogues.create = MagicMock(
+            return_value=(MagicMock(dialogue_reference=("backfill", "")), MagicMock())
+        )
+        self.behaviour._do_backfill()
+        assert self.behaviour.params.backfill_from_block == 100
+        assert self.behaviour.params.backfill_in_flight == "backfill"
+        kwargs = self.behaviour.context.contract_api_dialogues.create.call_args.kwargs
+        assert kwargs["callable"] == "get_order_events"
+        assert dict(kwargs["kwargs"]) == {"from_block": 100, "max_block_range": 50}
+        assert self.behaviour.context.outbox.put_message.call_count == 1
+
+        # no new request while one is in flight
+        self.behaviour._do_backfill()
+        assert self.behaviour.context.outbox.put_message.call_count == 1
+
+    def test_do_backfill_timeout(self) -> None:
+        """Test that a backfill request that got no response is sent again."""
+        self.behaviour._backfill_required = False
+        self.behaviour.context.params.backfill_from_block = 100
+        self.behaviour.context.params.backfill_in_flight = "lost"
+        self.behaviour.context.params.backfill_request_timeout = 120
+        self.behaviour.context.params.backfill_sent_at = time.time()
+        self.behaviour.context.contract_api_dialogues.create = MagicMock(
+            return_value=(MagicMock(dialogue_reference=("backfill", "")), MagicMock())
+        )
+        self.behaviour._do_backfill()
+        assert self.behaviour.context.outbox.put_message.call_count == 0
+
+        self.behaviour.context.params.backfill_sent_at = time.time() - 120
+        self.behaviour._do_backfill()
+        assert self.behaviour.context.logger.warning.call_count == 1
+        assert self.behaviour.context.outbox.put_message.call_count == 1
+        assert self.behaviour.params.backfill_in_flight == "backfill"
+        kwargs = self.behaviour.context.contract_api_dialogues.create.call_args.kwargs
+        assert dict(kwargs["kwargs"])["from_block"] == 100
+
+    def test_do_backfill_from_checkpoint(self) -> None:
+        """Test the _do_backfill method of the MonitoringBehaviour class when resuming from a checkpoint."""
+        self.behaviour.context.params.start_block = 100
+        self.behaviour.context.params.backfill_in_flight = None
+        self.behaviour.context.shared_state[CHECKPOINT] = (1000, "0x01")
+        self.behaviour.context.contract_api_dialogues.create = MagicMock(
+            return_value=(MagicMock(), MagicMock())
+        )
+        self.behaviour._do_backfill()
+        assert self.behaviour.params.backfill_from_block == 1001
+
+    def test_do_backfill_caught_up(self) -> None:
+        """Test the _do_backfill method of the MonitoringBehaviour class once caught up."""
+        self.behaviour._backfill_required = False
+        self.behaviour.context.params.backfill_from_block = None
+        self.behaviour.context.params.backfill_in_flight = None
+        self.behaviour._do_backfill()
+        assert self.behaviour.context.outbox.put_message.call_count == 0
 
     def test_do_subscription_with_polling(self) -> None:
         """Test the _do_subscription method of the MonitoringBehaviour class where the polling is used."""
@@ -20,23 +20,91 @@
 
 """Tests for the handlers of the order_monitoring skill."""
 
-from typing import Any, Optional
-from unittest.mock import MagicMock
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from unittest.mock import MagicMock, patch
+
+import pytest
+from eth_abi import encode
+from web3 import Web3
 
 from packages.valory.protocols.contract_api import ContractApiMessage
 from packages.valory.skills.order_monitoring.handlers import (
+    CHECKPOINT,
     ContractHandler,
     GPV2SETTLEMENT_CONTRACT_ADDRESS,
+    MONITORING_STATS,
     ORDERS,
+    PARTICIPANTS,
+    PENDING_EVENTS,
+    READY_ORDERS,
     WebSocketHandler,
 )
 from packages.valory.skills.order_monitoring.order_utils import (
-    ConditionalOrder,
     ConditionalOrderParamsStruct,
+    OrderStatus,
+    PROOF_LOCATION_EMITTED,
     Proof,
+    get_conditional_order_id,
+    hash_conditional_order_params,
+)
+from packages.valory.skills.order_monitoring.pipeline import SweepPipeline
+from packages.valory.skills.order_monitoring.registry import OrderRegistry
+
+
+OWNER = "0x" + "33" * 20
+DUMMY_PARAMS = {
+    "handler": "0x" + "11" * 20,
+    "salt": b"\x01" * 32,
+    "staticInput": b"static_input",
+}
+COMPOSABLE_COW_ABI_PATH = (
+    Path(__file__).parents[3]
+    / "contracts"
+    / "composable_cow"
+    / "build"
+    / "ComposableCow.json"
 )
 
 
+def merkle_root_set_event(
+    owner: str, root: bytes, location: int, orders: List[Any]
+) -> Dict[str, Any]:
+    """Get a MerkleRootSet event as decoded from its log by the contract."""
+    contract = Web3().eth.contract(
+        abi=json.loads(COMPOSABLE_COW_ABI_PATH.read_text())["abi"]
+    )
+    proof_data = encode(
+        ["bytes[]"],
+        [
+            [
+                encode(
+                    ["bytes32[]", "(address,bytes32,bytes)"],
+                    [path, (params["handler"], params["salt"], params["staticInput"])],
+                )
+                for path, params in orders
+            ]
+        ],
+    )
+    log = {
+        "address": "0x" + "44" * 20,
+        "topics": [
+            Web3.keccak(text="MerkleRootSet(address,bytes32,(uint256,bytes))"),
+            bytes(12) + bytes.fromhex(owner[2:]),
+        ],
+        "data": encode(["bytes32", "(uint256,bytes)"], [root, (location, proof_data)]),
+        "blockNumber": 1,
+        "blockHash": b"\x00" * 32,
+        "transactionHash": b"\x00" * 32,
+        "transactionIndex": 0,
+        "logIndex": 0,
+    }
+    event = contract.events.MerkleRootSet().process_log(log)
+    return {**event["args"], "composableCow": event["address"]}
+
+
 class TestWebSocketHandler:
     """Test the WebSocketHandler class."""
 
@@ -62,6 +130,17 @@ class TestWebSocketHandler:
         assert "ready_orders" in self.handler.context.shared_state
         assert "disconnection_point" in self.handler.context.shared_state
 
+    def test_setup_keeps_loaded_orders(self) -> None:
+        """Test that the setup of WebSocketHandler does not reset loaded orders."""
+        registry = OrderRegistry()
+        self.handler.context.shared_state[ORDERS] = registry
+        self.handler.context.shared_state[READY_ORDERS] = [{"order_uid": "0x01"}]
+        self.handler.setup()
+        assert self.handler.context.shared_state[ORDERS] is registry
+        assert self.handler.context.shared_state[READY_ORDERS] == [
+            {"order_uid": "0x01"}
+        ]
+
     def test_orders(self) -> None:
         """Test orders property of WebSocketHandler."""
         self.handler.context.shared_state["orders"] = {"owner1": []}
@@ -81,11 +160,11 @@ class TestWebSocketHandler:
     def test_handle_data_message(self) -> None:
         """Test handle_data_message method of WebSocketHandler."""
         message = MagicMock(
-            content='{"params": {"result": {"transactionHash": "hash"}}, "other_field": "value"}'
+            content='{"params": {"result": {"transactionHash": "hash", "blockNumber": "0x10"}}, "other_field": "value"}'
         )
         self.handler._process_tx = MagicMock()
         self.handler.handle(message)
-        self.handler._process_tx.assert_called_once_with("hash")
+        self.handler._process_tx.assert_called_once_with("hash", 16)
 
     def test_process_tx(self) -> None:
         """Test _process_tx method of WebSocketHandler."""
@@ -99,6 +178,17 @@ class TestWebSocketHandler:
         self.handler._process_tx(tx_hash)
         self.handler.context.contract_api_dialogues.create.assert_called_once()
 
+    def test_process_tx_pending(self) -> None:
+        """Test that the block of a transaction is pending until its events are processed."""
+        self.handler.setup()
+        contract_api_msg = MagicMock(dialogue_reference=("nonce", ""))
+        self.handler.context.contract_api_dialogues.create.return_value = (
+            contract_api_msg,
+            MagicMock(),
+        )
+        self.handler._process_tx("hash", 16)
+        assert self.handler.context.shared_state[PENDING_EVENTS] == {"nonce": 16}
+
     def test_teardown(self) -> None:
         """Test teardown method of WebSocketHandler."""
         self.handler.teardown()
@@ -117,6 +207,14 @@ class TestContractHandler:
         )
         self.handler.context.shared_state = {}
         self.handler.context.logger = MagicMock()
+        self.handler.context.params.store_path = None
+        self.handler.context.params.use_sharding = False
+        self.handler.context.params.max_orders = None
+        self.handler.context.params.max_orders_per_owner = None
+        self.handler.context.params.order_types = {}
+        self.handler.context.params.poll_backoff_max_interval = 3600
+        self.handler.context.params.sweep_retry_interval = 30
+        self.handler.context.params.sweep_pipeline = SweepPipeline(4, 60)
         self.handler.setup()
 
     def test_orders(self) -> None:
@@ -153,7 +251,11 @@ class TestContractHandler:
             "owner": "owner",
             "params": ("param1", b"param2", b"param3"),
         }
-        merkle_root_set = {"owner": "owner", "merkleRoot": "root", "orders": []}
+        merkle_root_set = {
+            "owner": "owner",
+            "root": b"\x01" * 32,
+            "proof": {"location": 0, "data": b""},
+        }
         events = {
             "conditional_orders": [conditional_order],
             "merkle_root_set": [merkle_root_set],
@@ -168,7 +270,40 @@ class TestContractHandler:
         self.handler._add_contract.assert_called_once_with(
             "owner", ("param1", b"param2", b"param3"), None, None
         )
-        self.handler._flush_contracts.assert_called_once_with("owner", "root")
+        self.handler._flush_contracts.assert_called_once_with("owner", b"\x01" * 32)
+
+    def test_handle_merkle_root_set(self) -> None:
+        """Test that the orders emitted with a merkle root replace the ones of the previous root."""
+        old_params = {**DUMMY_PARAMS, "salt": b"\x02" * 32}
+        self.handler._add_contract(OWNER, old_params, Proof(b"\x0a" * 32, []), None)
+        path = [b"\x0b" * 32, b"\x0c" * 32]
+        event = merkle_root_set_event(
+            OWNER, b"\x0d" * 32, PROOF_LOCATION_EMITTED, [(path, DUMMY_PARAMS)]
+        )
+        contract_api_msg = MagicMock(
+            performative=ContractApiMessage.Performative.STATE,
+            state=MagicMock(
+                body={
+                    "type": "event_processing",
+                    "data": {"conditional_orders": [], "merkle_root_set": [event]},
+                }
+            ),
+        )
+        self.handler.handle(contract_api_msg)
+        (order,) = self.handler.orders.owner_orders(OWNER)
+        assert order.params.salt == DUMMY_PARAMS["salt"]
+        assert order.params.staticInput == DUMMY_PARAMS["staticInput"]
+        assert order.proof == Proof(b"\x0d" * 32, path)
+        assert order.composableCow == "0x" + "44" * 20
+
+    def test_handle_merkle_root_set_not_emitted(self) -> None:
+        """Test that the orders of a merkle root that are not emitted are skipped."""
+        event = merkle_root_set_event(OWNER, b"\x0d" * 32, 0, [])
+        self.handler._handle_event_processing(
+            {"conditional_orders": [], "merkle_root_set": [event]}
+        )
+        assert len(self.handler.orders) == 0
+        assert self.handler.context.logger.info.call_count == 1
 
     def test_get_domain(self) -> None:
         """Test get_domain method of ContractHandler."""
@@ -182,39 +317,621 @@ class TestContractHandler:
         assert self.handler.get_domain(order) == expected_domain
 
     def test_add_contract_existing_owner(self) -> None:
-        """
-        Test _add_contract method of ContractHandler for existing owner.
-        """
-        params = {"handler": "param1", "salt": b"param2", "staticInput": b"param3"}
-        self.handler.context.shared_state[ORDERS]["owner"] = []
-        self.handler._add_contract("owner", params, None, None)
-        assert len(self.handler.orders["owner"]) == 1
-        assert self.handler.context.logger.info.call_count == 1
+        """Test _add_contract method of ContractHandler for existing owner."""
+        other_params = {**DUMMY_PARAMS, "salt": b"\x02" * 32}
+        self.handler._add_contract(OWNER, other_params, None, None)
+        self.handler._add_contract(OWNER, DUMMY_PARAMS, None, None)
+        assert len(self.handler.orders.owner_orders(OWNER)) == 2
+        assert self.handler.context.logger.info.call_count == 2
 
     def test_add_contract_new_owner(self) -> None:
-        """
-        Test _add_contract method of ContractHandler for new owner.
-        """
-        params = {"handler": "param1", "salt": b"param2", "staticInput": b"param3"}
-        self.handler._add_contract("owner", params, None, None)
+        """Test _add_contract method of ContractHandler for new owner."""
+        self.handler._add_contract(OWNER, DUMMY_PARAMS, None, None)
         assert len(self.handler.orders) == 1
-        assert len(self.handler.orders["owner"]) == 1
+        assert len(self.handler.orders.owner_orders(OWNER)) == 1
         assert self.handler.context.logger.info.call_count == 1
+        expected_id = get_conditional_order_id(
+            OWNER, hash_conditional_order_params(DUMMY_PARAMS)
+        )
+        assert self.handler.orders.get_by_id(expected_id) is not None
+
+    def test_add_contract_duplicate(self) -> None:
+        """Test _add_contract method of ContractHandler for an already registered order."""
+        self.handler._add_contract(OWNER, DUMMY_PARAMS, None, None)
+        (order,) = self.handler.orders.owner_orders(OWNER)
+        self.handler.scheduler.schedule(order.id, 2**40)
+        self.handler._add_contract(OWNER, dict(DUMMY_PARAMS), None, None)
+        assert len(self.handler.orders) == 1
+        assert self.handler.context.logger.info.call_count == 2
+        # the order is checked again now, as its start may have changed
+        assert self.handler.scheduler.next_due() <= int(time.time())
+
+    def test_handle_get_tradeable_order_drop_orders(self) -> None:
+        """Test _handle_get_tradeable_order removes the dropped orders."""
+        self.handler._add_contract(OWNER, DUMMY_PARAMS, None, None)
+        (order,) = self.handler.orders.owner_orders(OWNER)
+        self.handler._handle_get_tradeable_order([], [{"id": order.id}])
+        assert len(self.handler.orders) == 0
+
+    @pytest.mark.parametrize(
+        "reason",
+        [
+            "PollNever",
+            "ProofNotAuthed",
+            "SingleOrderNotAuthed",
+            "InterfaceNotSupported",
+            "InvalidHandler",
+        ],
+    )
+    def test_handle_get_tradeable_order_drop_orders_with_reason(
+        self, reason: str
+    ) -> None:
+        """Test _handle_get_tradeable_order removes the orders that reverted with a never error."""
+        self.handler._add_contract(OWNER, DUMMY_PARAMS, None, None)
+        (order,) = self.handler.orders.owner_orders(OWNER)
+        self.handler.scheduler.pop_due(2**40)
+        self.handler._handle_get_tradeable_order(
+            [], [{"id": order.id, "from": OWNER, "reason": reason}]
+        )
+        assert len(self.handler.orders) == 0
+        assert order.id not in self.handler.scheduler
+        assert self.handler.scheduler.in_flight == set()
+        self.handler.context.logger.info.assert_any_call(
+            f"Dropping order {order.id}, reverted with {reason}"
+        )
 
     def test_flush_contracts(self) -> None:
-        """
-        Test _flush_contracts method of ContractHandler.
-        """
-        owner = "owner"
-        root = "root"
-        conditional_order = ConditionalOrder(
-            id="id",
-            params=ConditionalOrderParamsStruct("param1", b"param2", b"param3"),
-            proof=Proof("root", "path"),
-            orders={},
-            composableCow=None,
-            offchainInput=b"",
-        )
-        self.handler.context.shared_state[ORDERS] = {owner: [conditional_order]}
-        self.handler._flush_contracts(owner, root)
-        assert len(self.handler.orders[owner]) == 0
+        """Test _flush_contracts method of ContractHandler."""
+        owner = OWNER
+        old_root = "0x" + "aa" * 32
+        new_root = "0x" + "cc" * 32
+        path = ["0x" + "bb" * 32]
+        old_params = DUMMY_PARAMS
+        new_params = {**DUMMY_PARAMS, "salt": b"\x02" * 32}
+        single_params = {**DUMMY_PARAMS, "salt": b"\x03" * 32}
+        self.handler._add_contract(owner, old_params, Proof(old_root, path), None)
+        self.handler._add_contract(owner, new_params, Proof(new_root, path), None)
+        self.handler._add_contract(owner, single_params, None, None)
+
+        self.handler._flush_contracts(owner, new_root)
+
+        remaining = self.handler.orders.owner_orders(owner)
+        assert len(remaining) == 2
+        assert remaining[0].proof == Proof(new_root, path)
+        assert remaining[1].proof is None
+        assert self.handler.orders.roots(owner) == [bytes.fromhex("cc" * 32)]
+
+    def test_reschedule_checked_orders(self) -> None:
+        """Test that the orders that were not tradeable are checked again later."""
+        self.handler.context.params.sweep_retry_interval = 30
+        self.handler._add_contract(OWNER, DUMMY_PARAMS, None, None)
+        other_params = {**DUMMY_PARAMS, "salt": b"\x02" * 32}
+        self.handler._add_contract(OWNER, other_params, None, None)
+        dropped, kept = self.handler.orders.owner_orders(OWNER)
+        assert len(self.handler.scheduler) == 2
+
+        assert len(self.handler.scheduler.pop_due(2**40)) == 2
+        self.handler._handle_get_tradeable_order([], [{"id": dropped.id}])
+        assert self.handler.scheduler.in_flight == set()
+        assert kept.id in self.handler.scheduler
+        assert dropped.id not in self.handler.scheduler
+        assert self.handler.scheduler.next_due() > time.time()
+
+    def test_reschedule_checked_orders_unknown_handler(self) -> None:
+        """Test that the orders of unknown handlers are polled with an exponential backoff."""
+        self.handler.context.params.poll_backoff_max_interval = 100
+        self.handler._add_contract(OWNER, DUMMY_PARAMS, None, None)
+        (order,) = self.handler.orders.owner_orders(OWNER)
+        assert order.orderType is None
+        delays = []
+        with patch(
+            "packages.valory.skills.order_monitoring.handlers.time.time",
+            return_value=1000,
+        ):
+            for _ in range(3):
+                self.handler.scheduler.pop_due(2**40)
+                self.handler._handle_get_tradeable_order([], [])
+                delays.append(self.handler.scheduler.next_due() - 1000)
+        assert delays == [30, 60, 100]
+
+    def test_reschedule_checked_orders_between_windows(self) -> None:
+        """Test that the orders between two TWAP windows are checked when the next window opens."""
+        self.handler.context.params.sweep_retry_interval = 30
+        self.handler._add_contract(OWNER, DUMMY_PARAMS, None, None)
+        (order,) = self.handler.orders.owner_orders(OWNER)
+        self.handler.scheduler.pop_due(2**40)
+        next_window_start = int(time.time()) + 3600
+        self.handler._handle_get_tradeable_order(
+            [],
+            [],
+            None,
+            None,
+            None,
+            [{"id": order.id, "timestamp": next_window_start}],
+        )
+        assert self.handler.scheduler.get(order.id) == next_window_start
+
+    def test_handle_tradeable_order_response(self) -> None:
+        """Test that a response only completes the orders of its request."""
+        self.handler.context.params.sweep_retry_interval = 30
+        self.handler._add_contract(OWNER, DUMMY_PARAMS, None, None)
+        other_params = {**DUMMY_PARAMS, "salt": b"\x02" * 32}
+        self.handler._add_contract(OWNER, other_params, None, None)
+        first, second = self.handler.orders.owner_orders(OWNER)
+        self.handler.scheduler.pop_due(2**40)
+        pipeline = self.handler.params.sweep_pipeline
+        pipeline.add("first", [first.id], time.time())
+        pipeline.add("second", [second.id], time.time())
+
+        data = {"tradeable_orders": [], "drop_orders": []}
+        contract_api_msg = MagicMock(
+            performative=ContractApiMessage.Performative.STATE,
+            state=MagicMock(body={"type": "tradable_order", "data": data}),
+            dialogue_reference=("first", "responder"),
+        )
+        self.handler.handle(contract_api_msg)
+        assert len(pipeline) == 1
+        assert self.handler.scheduler.in_flight == {second.id}
+        assert first.id in self.handler.scheduler
+
+        # an error also completes the request, so that its orders are checked again
+        contract_api_msg = MagicMock(
+            performative=ContractApiMessage.Performative.ERROR,
+            dialogue_reference=("second", "responder"),
+        )
+        self.handler.handle(contract_api_msg)
+        assert len(pipeline) == 0
+        assert self.handler.scheduler.in_flight == set()
+        assert second.id in self.handler.scheduler
+
+    def test_handle_tradeable_order_response_per_chunk(self) -> None:
+        """Test that the tradeable orders of a chunk are ready while the other chunks are in flight."""
+        self.handler._add_contract(OWNER, DUMMY_PARAMS, None, None)
+        other_params = {**DUMMY_PARAMS, "salt": b"\x02" * 32}
+        self.handler._add_contract(OWNER, other_params, None, None)
+        first, second = self.handler.orders.owner_orders(OWNER)
+        self.handler.scheduler.pop_due(2**40)
+        pipeline = self.handler.params.sweep_pipeline
+        pipeline.add("first", [first.id], time.time())
+        pipeline.add("second", [second.id], time.time())
+
+        tradeable_order = {
+            "id": first.id,
+            "chainId": 1,
+            "from": OWNER,
+            "sellAmount": 10,
+            "buyAmount": 1,
+            "feeAmount": 0,
+            "sellTokenBalance": "0x5a28e9363bb942b639270062aa6bb295f434bcdfc42c97267bf003f272060dc9",
+            "buyTokenBalance": "0x5a28e9363bb942b639270062aa6bb295f434bcdfc42c97267bf003f272060dc9",
+            "kind": "0xf3b277728b3fee749481eb3e0b3b48980dbbab78658fc419025cb16eee346775",
+        }
+        data = {"tradeable_orders": [tradeable_order], "drop_orders": []}
+        contract_api_msg = MagicMock(
+            performative=ContractApiMessage.Performative.STATE,
+            state=MagicMock(body={"type": "tradable_order", "data": data}),
+            dialogue_reference=("first", "responder"),
+        )
+        with patch(
+            "packages.valory.skills.order_monitoring.handlers.compute_order_uid",
+            return_value="0x" + "aa" * 56,
+        ):
+            self.handler.handle(contract_api_msg)
+        assert [ready["order_uid"] for ready in self.handler.ready_orders] == [
+            "0x" + "aa" * 56
+        ]
+        assert self.handler.scheduler.in_flight == {second.id}
+
+    def test_evict_expired_orders(self) -> None:
+        """Test that the orders are evicted once a block is past their end."""
+        self.handler._add_contract(OWNER, DUMMY_PARAMS, None, None)
+        other_params = {**DUMMY_PARAMS, "salt": b"\x02" * 32}
+        self.handler._add_contract(OWNER, other_params, None, None)
+        expired, kept = self.handler.orders.owner_orders(OWNER)
+        # the end of these orders is only known after a sweep
+        assert len(self.handler.expiries) == 0
+        self.handler.scheduler.pop_due(2**40)
+        expiries = [
+            {"id": expired.id, "end_timestamp": 100},
+            {"id": kept.id, "end_timestamp": 300},
+        ]
+        self.handler._handle_get_tradeable_order([], [], expiries, 200)
+        assert self.handler.orders.owner_orders(OWNER) == [kept]
+        assert expired.id not in self.handler.scheduler
+        assert self.handler.expiries.get(kept.id) == 300
+
+        # any block header is enough to evict the orders, without sweeping them
+        self.handler._handle_event_processing({"block_timestamp": 300})
+        assert len(self.handler.orders) == 0
+        assert kept.id not in self.handler.scheduler
+
+    def test_start_timestamps(self) -> None:
+        """Test that the start timestamps read from the cabinet are cached until the order is created again."""
+        self.handler._add_contract(OWNER, DUMMY_PARAMS, None, None)
+        (order,) = self.handler.orders.owner_orders(OWNER)
+        self.handler.scheduler.pop_due(2**40)
+        self.handler._handle_get_tradeable_order(
+            [],
+            [],
+            [{"id": order.id, "end_timestamp": 2**40}],
+            None,
+            [{"id": order.id, "start_timestamp": 100}],
+        )
+        assert self.handler.orders.get_start_timestamp(order.id) == 100
+        assert order.id in self.handler.expiries
+
+        self.handler._add_contract(OWNER, DUMMY_PARAMS, None, None)
+        assert self.handler.orders.get_start_timestamp(order.id) is None
+        assert order.id not in self.handler.expiries
+
+    def test_handle_get_tradeable_order_parts(self) -> None:
+        """Test that an order is kept across its parts, and that each part is only made ready once."""
+        self.handler._add_contract(OWNER, DUMMY_PARAMS, None, None)
+        (order,) = self.handler.orders.owner_orders(OWNER)
+        tradeable_order = {
+            "chainId": 1,
+            "from": OWNER,
+            "sellAmount": 10,
+            "buyAmount": 1,
+            "feeAmount": 0,
+            "sellTokenBalance": "0x5a28e9363bb942b639270062aa6bb295f434bcdfc42c97267bf003f272060dc9",
+            "buyTokenBalance": "0x5a28e9363bb942b639270062aa6bb295f434bcdfc42c97267bf003f272060dc9",
+            "kind": "0xf3b277728b3fee749481eb3e0b3b48980dbbab78658fc419025cb16eee346775",
+        }
+        uids = ["0x" + "aa" * 56, "0x" + "aa" * 56, "0x" + "bb" * 56]
+        with patch(
+            "packages.valory.skills.order_monitoring.handlers.compute_order_uid",
+            side_effect=uids,
+        ):
+            for _ in uids:
+                self.handler._handle_get_tradeable_order(
+                    [{**tradeable_order, "id": order.id}], []
+                )
+        assert self.handler.orders.get_by_id(order.id) is order
+        assert order.orders == {
+            uids[0]: OrderStatus["SUBMITTED"],
+            uids[2]: OrderStatus["SUBMITTED"],
+        }
+        assert [ready["order_uid"] for ready in self.handler.ready_orders] == [
+            uids[0],
+            uids[2],
+        ]
+
+    def test_handle_get_tradeable_order_removed(self) -> None:
+        """Test that the parts of an order removed while it was checked are not made ready."""
+        tradeable_order = {
+            "chainId": 1,
+            "from": OWNER,
+            "sellAmount": 10,
+            "buyAmount": 1,
+            "feeAmount": 0,
+            "sellTokenBalance": "0x5a28e9363bb942b639270062aa6bb295f434bcdfc42c97267bf003f272060dc9",
+            "buyTokenBalance": "0x5a28e9363bb942b639270062aa6bb295f434bcdfc42c97267bf003f272060dc9",
+            "kind": "0xf3b277728b3fee749481eb3e0b3b48980dbbab78658fc419025cb16eee346775",
+        }
+        with patch(
+            "packages.valory.skills.order_monitoring.handlers.compute_order_uid",
+            return_value="0x" + "aa" * 56,
+        ):
+            self.handler._handle_get_tradeable_order(
+                [{**tradeable_order, "id": b"\x01" * 32}], []
+            )
+        assert self.handler.ready_orders == []
+        assert len(self.handler.orders) == 0
+
+    def test_add_contract_sharded(self) -> None:
+        """Test that only the orders of the owners of the agent are scheduled."""
+        participants = ["0x" + "aa" * 20, "0x" + "bb" * 20]
+        self.handler.context.params.use_sharding = True
+        self.handler.context.shared_state[PARTICIPANTS] = participants
+        self.handler.context.agent_address = participants[0]
+        self.handler.setup()
+        owners = ["0x" + f"{i:02x}" * 20 for i in range(1, 9)]
+        for owner in owners:
+            self.handler._add_contract(owner, DUMMY_PARAMS, None, None)
+
+        assert len(self.handler.orders) == len(owners)
+        mine = [owner for owner in owners if self.handler.sharding.is_mine(owner)]
+        assert 0 < len(mine) < len(owners)
+        assert len(self.handler.scheduler) == len(mine)
+
+    def test_add_contract_over_cap(self) -> None:
+        """Test that the oldest order of the owner is evicted over the per owner cap."""
+        self.handler.orders.max_orders_per_owner = 1
+        self.handler._add_contract(OWNER, DUMMY_PARAMS, None, None)
+        (oldest,) = self.handler.orders.owner_orders(OWNER)
+        other_params = {**DUMMY_PARAMS, "salt": b"\x02" * 32}
+        self.handler._add_contract(OWNER, other_params, None, None)
+
+        (order,) = self.handler.orders.owner_orders(OWNER)
+        assert order.params.salt == b"\x02" * 32
+        assert oldest.id not in self.handler.scheduler
+        assert order.id in self.handler.scheduler
+        assert self.handler.context.logger.warning.call_count == 1
+
+    def test_monitoring_stats(self) -> None:
+        """Test that the size of the registry is published after each message."""
+        assert self.handler.context.shared_state[MONITORING_STATS]["orders"] == 0
+        events = {
+            "conditional_orders": [{"owner": OWNER, "params": DUMMY_PARAMS}],
+            "merkle_root_set": [],
+        }
+        contract_api_msg = MagicMock(
+            performative=ContractApiMessage.Performative.STATE,
+            state=MagicMock(body={"type": "event_processing", "data": events}),
+        )
+        self.handler.handle(contract_api_msg)
+        stats = self.handler.context.shared_state[MONITORING_STATS]
+        assert stats["orders"] == 1
+        assert stats["owners"] == 1
+        assert stats["bytes"] == self.handler.orders.nbytes > 0
+        assert stats["scheduler"] == {"orders": 1, "entries": 1, "in_flight": 0}
+        assert stats["expiries"] == {"orders": 0, "entries": 0}
+
+    def test_monitoring_stats_rpc(self) -> None:
+        """Test that the state of the endpoint and of the cache is published, and the endpoint changes logged."""
+        stats = self.handler.context.shared_state[MONITORING_STATS]
+        assert stats["rpc"] is None and stats["tradeable_order_cache"] is None
+        status = {"endpoint": "http://node", "state": "open", "failures": 3}
+        for degraded in (True, True, False):
+            data = {
+                "tradeable_orders": [],
+                "drop_orders": [],
+                "rpc": {**status, "degraded": degraded},
+                "cache": {"size": 1, "max_size": 4096, "hits": 2, "misses": 1},
+            }
+            contract_api_msg = MagicMock(
+                performative=ContractApiMessage.Performative.STATE,
+                state=MagicMock(body={"type": "tradable_order", "data": data}),
+            )
+            self.handler.handle(contract_api_msg)
+            rpc = self.handler.context.shared_state[MONITORING_STATS]["rpc"]
+            assert rpc["degraded"] is degraded
+        cache = self.handler.context.shared_state[MONITORING_STATS][
+            "tradeable_order_cache"
+        ]
+        assert cache["hits"] == 2
+        # only the change to the degraded mode is warned about
+        assert self.handler.context.logger.warning.call_count == 1
+
+    def test_flush_contracts_no_orders(self) -> None:
+        """Test _flush_contracts method of ContractHandler for an owner without orders."""
+        self.handler._flush_contracts(OWNER, "0x" + "aa" * 32)
+        assert len(self.handler.orders) == 0
+
+
+class TestContractHandlerWithStore:
+    """Test ContractHandler class of order_monitoring skill with a durable store."""
+
+    def _handler(self, store_path: Path) -> ContractHandler:
+        """Get a set up handler."""
+        context = MagicMock()
+        handler = ContractHandler(name="handler", skill_context=context)
+        handler.context.shared_state = {}
+        handler.context.params.store_path = str(store_path)
+        handler.context.params.use_sharding = False
+        handler.context.params.max_orders = None
+        handler.context.params.max_orders_per_owner = None
+        handler.context.params.order_types = {}
+        handler.context.params.backfill_from_block = None
+        handler.context.params.backfill_in_flight = None
+        handler.context.params.sweep_pipeline = SweepPipeline(4, 60)
+        handler.setup()
+        return handler
+
+    def test_restart(self, tmp_path: Path) -> None:
+        """Test that the orders survive a restart."""
+        store_path = tmp_path / "orders.db"
+        handler = self._handler(store_path)
+        events = {
+            "conditional_orders": [{"owner": OWNER, "params": DUMMY_PARAMS}],
+            "merkle_root_set": [],
+            "block_number": 1,
+        }
+        handler._handle_event_processing(events)
+        # the ready orders are replaced once some of them are placed
+        handler.context.shared_state[READY_ORDERS] = [{"order_uid": "0x01"}]
+        handler.teardown()
+
+        handler = self._handler(store_path)
+        assert len(handler.orders) == 1
+        (order,) = handler.orders.owner_orders(OWNER)
+        assert order.params == ConditionalOrderParamsStruct(*DUMMY_PARAMS.values())
+        assert handler.ready_orders == [{"order_uid": "0x01"}]
+        handler.teardown()
+
+    def test_commit_per_block(self, tmp_path: Path) -> None:
+        """Test that the events are committed once their block is over."""
+        handler = self._handler(tmp_path / "orders.db")
+        store = handler.orders.store
+        other_params = {**DUMMY_PARAMS, "salt": b"\x02" * 32}
+        for block_number, params in ((1, DUMMY_PARAMS), (1, other_params)):
+            handler._handle_event_processing(
+                {
+                    "conditional_orders": [{"owner": OWNER, "params": params}],
+                    "block_number": block_number,
+                }
+            )
+        assert store.pending == 2
+        assert len(list(store.load())) == 0
+
+        handler._handle_event_processing({"block_number": 2})
+        assert store.pending == 0
+        assert len(list(store.load())) == 2
+        handler.teardown()
+
+    def test_commit_ready_orders_changed(self, tmp_path: Path) -> None:
+        """Test that the ready orders are only staged once changed, and nothing is committed without changes."""
+        handler = self._handler(tmp_path / "orders.db")
+        store = handler.orders.store
+        with patch.object(
+            store, "set_ready_orders", wraps=store.set_ready_orders
+        ) as set_ready_orders, patch.object(
+            store, "commit", wraps=store.commit
+        ) as commit:
+            handler._handle_get_tradeable_order([], [])
+            set_ready_orders.assert_not_called()
+            commit.assert_not_called()
+
+            handler._ready_orders_dirty = True
+            handler._handle_get_tradeable_order([], [])
+            assert set_ready_orders.call_count == commit.call_count == 1
+
+            handler.context.shared_state[READY_ORDERS] = []
+            handler._handle_get_tradeable_order([], [])
+            handler._handle_get_tradeable_order([], [])
+            assert set_ready_orders.call_count == commit.call_count == 2
+        handler.teardown()
+
+    def test_checkpoint_per_block(self, tmp_path: Path) -> None:
+        """Test that a block is checkpointed once all its events are processed."""
+        store_path = tmp_path / "orders.db"
+        handler = self._handler(store_path)
+        assert handler.context.shared_state[CHECKPOINT] is None
+        handler._handle_event_processing(
+            {
+                "conditional_orders": [{"owner": OWNER, "params": DUMMY_PARAMS}],
+                "block_number": 1,
+                "block_hash": "0x01",
+            }
+        )
+        assert handler.context.shared_state[CHECKPOINT] is None
+
+        handler._handle_event_processing({"block_number": 2, "block_hash": "0x02"})
+        assert handler.context.shared_state[CHECKPOINT] == (1, "0x01")
+        handler.teardown()
+
+        handler = self._handler(store_path)
+        assert handler.context.shared_state[CHECKPOINT] == (1, "0x01")
+        assert len(handler.orders) == 1
+        handler.teardown()
+
+    def test_checkpoint_out_of_order(self, tmp_path: Path) -> None:
+        """Test that the checkpoint does not move past a block whose events are still pending."""
+        handler = self._handler(tmp_path / "orders.db")
+        handler.pending_events.update({"first": 1, "second": 2, "third": 3})
+
+        def process(nonce: str, block_number: int) -> None:
+            """Process the events of a request."""
+            contract_api_msg = MagicMock(
+                performative=ContractApiMessage.Performative.STATE,
+                state=MagicMock(
+                    body={
+                        "type": "event_processing",
+                        "data": {
+                            "block_number": block_number,
+                            "block_hash": hex(block_number),
+                        },
+                    }
+                ),
+                dialogue_reference=(nonce, "responder"),
+            )
+            handler.handle(contract_api_msg)
+
+        process("second", 2)
+        process("third", 3)
+        # the events of block 1 are still pending
+        assert handler.context.shared_state[CHECKPOINT] is None
+        process("first", 1)
+        assert handler.context.shared_state[CHECKPOINT] is None
+        handler.pending_events["fourth"] = 4
+        process("fourth", 4)
+        assert handler.context.shared_state[CHECKPOINT] == (3, "0x3")
+        assert handler.pending_events == {}
+        handler.teardown()
+
+    def test_checkpoint_failed_events(self, tmp_path: Path) -> None:
+        """Test that the checkpoint does not move past a block whose events could not be processed."""
+        handler = self._handler(tmp_path / "orders.db")
+        handler.pending_events["failed"] = 1
+        contract_api_msg = MagicMock(
+            performative=ContractApiMessage.Performative.ERROR,
+            dialogue_reference=("failed", "responder"),
+        )
+        handler.handle(contract_api_msg)
+        for block_number in (2, 3):
+            handler._handle_event_processing(
+                {"block_number": block_number, "block_hash": "0x02"}
+            )
+        assert handler.context.shared_state[CHECKPOINT] is None
+        assert handler.pending_events == {"failed": 1}
+        handler.teardown()
+
+    def test_no_checkpoint_while_backfilling(self, tmp_path: Path) -> None:
+        """Test that new blocks do not move the checkpoint while backfilling."""
+        handler = self._handler(tmp_path / "orders.db")
+        handler.params.backfill_from_block = 10
+        for block_number in (100, 101):
+            handler._handle_event_processing(
+                {"block_number": block_number, "block_hash": "0x01"}
+            )
+        assert handler.context.shared_state[CHECKPOINT] is None
+        handler.teardown()
+
+    def test_backfill(self, tmp_path: Path) -> None:
+        """Test that each backfilled range is checkpointed until caught up."""
+        handler = self._handler(tmp_path / "orders.db")
+        store = handler.orders.store
+        handler.params.backfill_from_block = 10
+        handler._handle_event_processing(
+            {
+                "conditional_orders": [{"owner": OWNER, "params": DUMMY_PARAMS}],
+                "merkle_root_set": [],
+                "block_number": 19,
+                "block_hash": "0x13",
+                "latest_block": 25,
+            }
+        )
+        assert handler.context.shared_state[CHECKPOINT] == (19, "0x13")
+        assert store.load_checkpoint() == (19, "0x13")
+        assert len(list(store.load())) == 1
+        assert handler.params.backfill_from_block == 20
+
+        handler._handle_event_processing(
+            {"block_number": 25, "block_hash": "0x19", "latest_block": 25}
+        )
+        assert store.load_checkpoint() == (25, "0x19")
+        assert handler.params.backfill_from_block is None
+        handler.teardown()
+
+    def test_backfill_error(self, tmp_path: Path) -> None:
+        """Test that a backfill request that failed is requested again, without moving the checkpoint."""
+        handler = self._handler(tmp_path / "orders.db")
+        handler.params.backfill_from_block = 10
+        handler.params.backfill_in_flight = "backfill"
+        contract_api_msg = MagicMock(
+            performative=ContractApiMessage.Performative.ERROR,
+            dialogue_reference=("backfill", "responder"),
+        )
+        handler.handle(contract_api_msg)
+        assert handler.params.backfill_in_flight is None
+        assert handler.params.backfill_from_block == 10
+        assert handler.context.shared_state[CHECKPOINT] is None
+        assert handler.context.logger.warning.call_count == 2
+        handler.teardown()
+
+    def test_backfill_exception(self, tmp_path: Path) -> None:
+        """Test that a backfill response that cannot be processed does not stop the backfill."""
+        handler = self._handler(tmp_path / "orders.db")
+        handler.params.backfill_from_block = 10
+        handler.params.backfill_in_flight = "backfill"
+        contract_api_msg = MagicMock(
+            performative=ContractApiMessage.Performative.STATE,
+            state=MagicMock(
+                body={
+                    "type": "event_processing",
+                    "data": {
+                        "conditional_orders": [{"owner": OWNER}],
+                        "block_number": 19,
+                        "block_hash": "0x13",
+                        "latest_block": 25,
+                    },
+                }
+            ),
+            dialogue_reference=("backfill", "responder"),
+        )
+        with pytest.raises(KeyError):
+            handler.handle(contract_api_msg)
+        assert handler.params.backfill_in_flight is None
+        assert handler.params.backfill_from_block == 10
+        handler.teardown()
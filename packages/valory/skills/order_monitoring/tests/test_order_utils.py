@@ -24,12 +24,19 @@ from datetime import datetime, timezone
 import pytest
 
 from packages.valory.skills.order_monitoring.order_utils import (
+    ConditionalOrder,
+    ConditionalOrderParamsStruct,
+    EMPTY_ORDERS,
+    Proof,
     balance_to_string,
     compute_order_uid,
     extract_order_uid_params,
+    get_conditional_order_id,
+    hash_conditional_order_params,
     hash_domain,
     kind_to_string,
     timestamp,
+    to_bytes,
 )
 
 
@@ -170,3 +177,77 @@ def test_extract_order_uid_params_bad_uid() -> None:
     with pytest.raises(ValueError) as e:
         extract_order_uid_params(bad_order_uid)
     assert str(e.value) == "Invalid order UID length"
+
+
+def test_to_bytes() -> None:
+    """Test to_bytes."""
+    assert to_bytes("0x0102") == b"\x01\x02"
+    assert to_bytes("0102") == b"\x01\x02"
+    assert to_bytes(b"\x01\x02") == b"\x01\x02"
+
+
+def test_hash_conditional_order_params() -> None:
+    """Test hash_conditional_order_params."""
+    params = {
+        "handler": "0x" + "11" * 20,
+        "salt": b"\x01" * 32,
+        "staticInput": b"static_input",
+    }
+    params_hash = hash_conditional_order_params(params)
+    assert len(params_hash) == 32
+    assert params_hash == hash_conditional_order_params(
+        {**params, "salt": "0x" + "01" * 32}
+    )
+    assert params_hash != hash_conditional_order_params(
+        {**params, "salt": b"\x02" * 32}
+    )
+
+
+def test_conditional_order_is_compact() -> None:
+    """Test that conditional orders are slotted and share their immutable parts."""
+    handler = "".join(["0x", "11" * 20])
+    composable_cow = "".join(["0x", "22" * 20])
+    orders = [
+        ConditionalOrder(
+            id=bytes([i]),
+            params=ConditionalOrderParamsStruct(
+                "".join(["0x", "11" * 20]), "0x" + "01" * 32, b"static_input"
+            ),
+            proof=None,
+            orders={},
+            composableCow="".join(["0x", "22" * 20]),
+            offchainInput=b"",
+        )
+        for i in range(2)
+    ]
+    for order in orders:
+        assert not hasattr(order, "__dict__")
+        assert not hasattr(order.params, "__dict__")
+        assert order.orders is EMPTY_ORDERS
+        assert order.params.handler is orders[0].params.handler
+        assert order.composableCow is orders[0].composableCow
+        assert order.params.salt == b"\x01" * 32
+    assert orders[0].params.handler == handler
+    assert orders[0].composableCow == composable_cow
+    assert orders[0].params == orders[1].params
+    assert orders[0] != orders[1]
+
+
+def test_proof() -> None:
+    """Test that proofs are kept as raw bytes."""
+    proof = Proof("0x" + "aa" * 32, ["0x" + "bb" * 32, b"\xcc" * 32])
+    assert proof.merkleRoot == b"\xaa" * 32
+    assert proof.path == (b"\xbb" * 32, b"\xcc" * 32)
+    assert proof == Proof(b"\xaa" * 32, [b"\xbb" * 32, b"\xcc" * 32])
+
+
+def test_get_conditional_order_id() -> None:
+    """Test get_conditional_order_id."""
+    params_hash = b"\x01" * 32
+    order_id = get_conditional_order_id(DUMMY_OWNER, params_hash)
+    assert len(order_id) == 32
+    assert order_id == get_conditional_order_id(DUMMY_OWNER, params_hash)
+    assert order_id != get_conditional_order_id(DUMMY_OWNER, b"\x02" * 32)
+    assert order_id != get_conditional_order_id(
+        "0x0000000000000000000000000000000000000001", params_hash
+    )
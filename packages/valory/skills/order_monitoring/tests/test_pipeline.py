@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2023 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""This module contains tests for the pipeline of the tradeability requests."""
+
+from packages.valory.skills.order_monitoring.pipeline import SweepPipeline
+
+
+def test_pipeline() -> None:
+    """Test tracking the requests in flight."""
+    pipeline = SweepPipeline(2, 60)
+    assert pipeline.available == 2
+    pipeline.add("a", [b"1", b"2"], 0)
+    pipeline.add("b", [b"3"], 30)
+    assert len(pipeline) == 2
+    assert pipeline.available == 0
+    assert pipeline.complete("a") == [b"1", b"2"]
+    assert pipeline.complete("a") is None
+    assert pipeline.available == 1
+
+
+def test_pipeline_expire() -> None:
+    """Test that the requests without a response time out."""
+    pipeline = SweepPipeline(2, 60)
+    pipeline.add("a", [b"1"], 0)
+    pipeline.add("b", [b"2"], 30)
+    assert pipeline.expire(59) == []
+    assert pipeline.expire(60) == [("a", [b"1"])]
+    # a late response is not tracked anymore
+    assert pipeline.complete("a") is None
+    assert len(pipeline) == 1
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2023 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+# pylint: skip-file
+
+"""This module contains tests for the order registry."""
+
+from typing import Optional
+
+from packages.valory.skills.order_monitoring.order_utils import ConditionalOrder, Proof
+from packages.valory.skills.order_monitoring.registry import OrderRegistry
+
+
+ROOT_1 = b"\x01" * 32
+ROOT_2 = b"\x02" * 32
+
+
+def _order(id: str, root: Optional[bytes] = None) -> ConditionalOrder:
+    """Get a dummy conditional order."""
+    return ConditionalOrder(
+        id=id,
+        params=None,
+        proof=Proof(root, []) if root is not None else None,
+        orders={},
+        composableCow=None,
+        offchainInput=b"",
+    )
+
+
+class TestOrderRegistry:
+    """Test the OrderRegistry class."""
+
+    def setup(self) -> None:
+        """Set up the test case."""
+        self.registry = OrderRegistry()
+
+    def test_add(self) -> None:
+        """Test adding orders."""
+        assert self.registry.add("owner1", b"hash1", _order("1"))
+        assert self.registry.add("owner1", b"hash2", _order("2"))
+        assert self.registry.add("owner2", b"hash1", _order("3"))
+        assert len(self.registry) == 3
+        assert self.registry.owners() == ["owner1", "owner2"]
+        assert [o.id for o in self.registry.owner_orders("owner1")] == ["1", "2"]
+        assert [(owner, o.id) for owner, o in self.registry.items()] == [
+            ("owner1", "1"),
+            ("owner1", "2"),
+            ("owner2", "3"),
+        ]
+
+    def test_add_duplicate(self) -> None:
+        """Test that the same params of the same owner are only added once."""
+        assert self.registry.add("owner1", b"hash1", _order("1"))
+        assert not self.registry.add("owner1", b"hash1", _order("2"))
+        assert len(self.registry) == 1
+        assert "2" not in self.registry
+        assert self.registry.get("owner1", b"hash1").id == "1"
+
+    def test_get(self) -> None:
+        """Test getting orders."""
+        self.registry.add("owner1", b"hash1", _order("1"))
+        assert self.registry.get("owner1", b"hash1").id == "1"
+        assert self.registry.get("owner1", b"hash2") is None
+        assert self.registry.get("owner2", b"hash1") is None
+        assert self.registry.get_by_id("1").id == "1"
+        assert self.registry.get_by_id("2") is None
+
+    def test_remove(self) -> None:
+        """Test removing orders."""
+        self.registry.add("owner1", b"hash1", _order("1"))
+        self.registry.add("owner1", b"hash2", _order("2"))
+        assert self.registry.remove("owner1", b"hash1").id == "1"
+        assert self.registry.remove("owner1", b"hash1") is None
+        assert "1" not in self.registry
+        assert self.registry.remove_by_id("2").id == "2"
+        assert self.registry.remove_by_id("2") is None
+        assert len(self.registry) == 0
+        assert self.registry.owners() == []
+        assert list(self.registry) == []
+
+    def test_roots(self) -> None:
+        """Test the merkle root index."""
+        self.registry.add("owner1", b"hash1", _order("1", ROOT_1))
+        self.registry.add("owner1", b"hash2", _order("2", ROOT_1))
+        self.registry.add("owner1", b"hash3", _order("3", ROOT_2))
+        self.registry.add("owner1", b"hash4", _order("4"))
+        self.registry.add("owner2", b"hash1", _order("5", ROOT_1))
+        assert self.registry.roots("owner1") == [ROOT_1, ROOT_2]
+        assert self.registry.roots("owner2") == [ROOT_1]
+        assert self.registry.roots("owner3") == []
+
+        self.registry.remove_by_id("3")
+        assert self.registry.roots("owner1") == [ROOT_1]
+
+    def test_remove_root(self) -> None:
+        """Test removing the orders under a merkle root."""
+        self.registry.add("owner1", b"hash1", _order("1", ROOT_1))
+        self.registry.add("owner1", b"hash2", _order("2", ROOT_1))
+        self.registry.add("owner1", b"hash3", _order("3", ROOT_2))
+        self.registry.add("owner1", b"hash4", _order("4"))
+        self.registry.add("owner2", b"hash1", _order("5", ROOT_1))
+
+        removed = self.registry.remove_root("owner1", ROOT_1)
+        assert sorted(o.id for o in removed) == ["1", "2"]
+        assert [o.id for o in self.registry.owner_orders("owner1")] == ["3", "4"]
+        assert [o.id for o in self.registry.owner_orders("owner2")] == ["5"]
+        assert self.registry.roots("owner1") == [ROOT_2]
+        assert self.registry.remove_root("owner1", ROOT_1) == []
+
+    def test_admit_per_owner_cap(self) -> None:
+        """Test that the oldest orders of an owner are evicted over the per owner cap."""
+        registry = OrderRegistry(max_orders_per_owner=2)
+        for i in range(2):
+            registry.add("owner1", f"hash{i}".encode(), _order(str(i)))
+        registry.add("owner2", b"hash", _order("other"))
+
+        evicted = registry.admit("owner1")
+        assert [order.id for order in evicted] == ["0"]
+        assert registry.admit("owner2") == []
+        registry.add("owner1", b"hash2", _order("2"))
+        assert [order.id for order in registry.owner_orders("owner1")] == ["1", "2"]
+        assert registry.stats()["evicted"] == 1
+
+    def test_admit_global_cap(self) -> None:
+        """Test that the oldest orders are evicted over the global cap."""
+        registry = OrderRegistry(max_orders=2)
+        registry.add("owner1", b"hash1", _order("1"))
+        registry.add("owner2", b"hash2", _order("2"))
+
+        evicted = registry.admit("owner3")
+        assert [order.id for order in evicted] == ["1"]
+        assert registry.owners() == ["owner2"]
+
+    def test_bytes_accounting(self) -> None:
+        """Test that the size of the registry follows its orders."""
+        assert self.registry.nbytes == 0
+        self.registry.add("owner1", b"hash1", _order("1", ROOT_1))
+        self.registry.add("owner1", b"hash2", _order("2"))
+        size = self.registry.nbytes
+        assert size > 0
+        self.registry.remove("owner1", b"hash2")
+        assert 0 < self.registry.nbytes < size
+        self.registry.remove("owner1", b"hash1")
+        assert self.registry.nbytes == 0
+        assert self.registry.stats() == {
+            "orders": 0,
+            "owners": 0,
+            "bytes": 0,
+            "evicted": 0,
+            "max_orders": None,
+            "max_orders_per_owner": None,
+        }
+
+    def test_set_order_status(self) -> None:
+        """Test setting the status of the discrete orders of a conditional order."""
+        self.registry.add("owner1", b"hash1", _order("1"))
+        other = _order("2")
+        self.registry.add("owner1", b"hash2", other)
+        size = self.registry.nbytes
+        assert self.registry.set_order_status("1", "0xuid", 1)
+        assert self.registry.get_by_id("1").orders == {"0xuid": 1}
+        # the empty orders of the other orders are left untouched
+        assert other.orders == {}
+        assert self.registry.nbytes > size
+        assert not self.registry.set_order_status("3", "0xuid", 1)
+        self.registry.remove_by_id("1")
+        self.registry.remove_by_id("2")
+        assert self.registry.nbytes == 0
+
+    def test_get_order_type(self) -> None:
+        """Test that the order types are found by handler, whatever the case of its address."""
+        registry = OrderRegistry(order_types={"0x" + "aB" * 20: "twap"})
+        assert registry.get_order_type("0x" + "Ab" * 20) == "twap"
+        assert registry.get_order_type("0x" + "cd" * 20) is None
+        assert registry.get_order_type(None) is None
+
+    def test_start_timestamps(self) -> None:
+        """Test the cache of the start timestamps read from the cabinet."""
+        self.registry.add("owner1", b"hash1", _order("1"))
+        self.registry.set_start_timestamp("1", 0)
+        assert self.registry.get_start_timestamp("1") is None
+        self.registry.set_start_timestamp("1", 100)
+        assert self.registry.get_start_timestamp("1") == 100
+        # unknown orders are not cached
+        self.registry.set_start_timestamp("2", 100)
+        assert self.registry.get_start_timestamp("2") is None
+        self.registry.invalidate_start_timestamp("1")
+        assert self.registry.get_start_timestamp("1") is None
+        self.registry.set_start_timestamp("1", 200)
+        self.registry.remove_by_id("1")
+        assert self.registry.get_start_timestamp("1") is None
@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2023 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""This module contains tests for the scheduler of the tradeability checks."""
+
+import pytest
+from eth_abi import encode
+
+from packages.valory.contracts.composable_cow.order_types import (
+    TWAP_ORDER_TYPE,
+    decode_static_data,
+)
+from packages.valory.contracts.composable_cow.twap import TWAPData, TWAP_STRUCT_ABI
+from packages.valory.skills.order_monitoring.order_utils import (
+    ConditionalOrder,
+    ConditionalOrderParamsStruct,
+)
+from packages.valory.skills.order_monitoring.scheduler import (
+    OrderExpiries,
+    OrderScheduler,
+    get_end_timestamp,
+    get_next_check_timestamp,
+    get_static_data,
+    get_submitted_parts,
+)
+
+
+def _twap_order(t0: int, n: int, t: int, span: int) -> ConditionalOrder:
+    """Get a TWAP conditional order."""
+    static_input = encode(
+        [type_ for type_, _ in TWAP_STRUCT_ABI],
+        ["0x" + "11" * 20, "0x" + "22" * 20, "0x" + "33" * 20]
+        + [10, 1, t0, n, t, span]
+        + [b"\x00" * 32],
+    )
+    return ConditionalOrder(
+        id=b"1",
+        params=ConditionalOrderParamsStruct(
+            "0x" + "44" * 20, b"\x01" * 32, static_input
+        ),
+        proof=None,
+        orders=None,
+        composableCow=None,
+        offchainInput=b"",
+        orderType=TWAP_ORDER_TYPE,
+    )
+
+
+def test_decode_static_data() -> None:
+    """Test decode_static_data."""
+    order = _twap_order(t0=1000, n=4, t=100, span=0)
+    data = decode_static_data(TWAP_ORDER_TYPE, order.params.staticInput)
+    assert isinstance(data, TWAPData)
+    assert (data.t0, data.n, data.t, data.span) == (1000, 4, 100, 0)
+    assert decode_static_data(TWAP_ORDER_TYPE, b"not a twap") is None
+    assert decode_static_data(None, order.params.staticInput) is None
+
+
+def test_get_static_data() -> None:
+    """Test that orders that share their static input share its decoded struct."""
+    order = _twap_order(t0=1000, n=4, t=100, span=0)
+    other = _twap_order(t0=1000, n=4, t=100, span=0)
+    assert get_static_data(order) is get_static_data(other)
+    order.staticData = TWAPData(*([None] * 5 + [2000, 4, 100, 0, None]))
+    assert get_static_data(order).t0 == 2000
+    assert get_end_timestamp(order) == 2400
+
+
+def test_get_submitted_parts() -> None:
+    """Test that the submitted parts of a TWAP are found from the validTo of their uids."""
+    order = _twap_order(t0=0, n=4, t=100, span=0)
+    order.orders = {"0x" + "00" * 52 + f"{1000 + k * 100 + 99:08x}": 1 for k in (0, 2)}
+    # the start of the order is not known
+    assert get_submitted_parts(order) == []
+    assert get_submitted_parts(order, 1000) == [0, 2]
+    order.orders = {}
+    assert get_submitted_parts(order, 1000) == []
+
+
+@pytest.mark.parametrize(
+    "t0, span, timestamp, expected",
+    [
+        # not started yet
+        (1000, 0, 500, 1000),
+        # within a part without span
+        (1000, 0, 1150, 1150),
+        # within the span of a part
+        (1000, 50, 1120, 1120),
+        # after the span of a part, due at the next part
+        (1000, 50, 1160, 1200),
+        # after the span of the last part, due so that the order can be dropped
+        (1000, 50, 1360, 1360),
+        # expired
+        (1000, 0, 5000, 5000),
+        # the start is only known on chain
+        (0, 0, 500, 500),
+    ],
+)
+def test_get_next_check_timestamp(
+    t0: int, span: int, timestamp: int, expected: int
+) -> None:
+    """Test get_next_check_timestamp."""
+    order = _twap_order(t0=t0, n=4, t=100, span=span)
+    assert get_next_check_timestamp(order, timestamp) == expected
+
+
+def test_get_next_check_timestamp_cached_start() -> None:
+    """Test that the parts of a TWAP that starts when it is created are scheduled from its cached start."""
+    order = _twap_order(t0=0, n=4, t=100, span=50)
+    # the start is not known, the order is due so that the sweep reads it
+    assert get_next_check_timestamp(order, 1160) == 1160
+    assert get_end_timestamp(order) is None
+    # not started yet
+    assert get_next_check_timestamp(order, 500, 1000) == 1000
+    # within the span of the first part
+    assert get_next_check_timestamp(order, 1020, 1000) == 1020
+    # after the span of the first part, due when the second one opens
+    assert get_next_check_timestamp(order, 1160, 1000) == 1200
+    # within the span of the second part, then after it
+    assert get_next_check_timestamp(order, 1210, 1000) == 1210
+    assert get_next_check_timestamp(order, 1250, 1000) == 1300
+    assert get_end_timestamp(order, 1000) == 1350
+
+
+def test_get_next_check_timestamp_not_twap() -> None:
+    """Test get_next_check_timestamp for an order that is not a TWAP."""
+    order = ConditionalOrder(
+        id=b"1",
+        params=ConditionalOrderParamsStruct("0x" + "44" * 20, b"\x01" * 32, b"other"),
+        proof=None,
+        orders=None,
+        composableCow=None,
+        offchainInput=b"",
+    )
+    assert get_next_check_timestamp(order, 123) == 123
+
+
+@pytest.mark.parametrize(
+    "t0, span, expected",
+    [(1000, 0, 1400), (1000, 50, 1350), (0, 0, None)],
+)
+def test_get_end_timestamp(t0: int, span: int, expected: int) -> None:
+    """Test get_end_timestamp."""
+    order = _twap_order(t0=t0, n=4, t=100, span=span)
+    assert get_end_timestamp(order) == expected
+
+
+class TestOrderScheduler:
+    """Test the OrderScheduler class."""
+
+    def test_pop_due(self) -> None:
+        """Test that only the due orders are popped, earliest first."""
+        scheduler = OrderScheduler()
+        scheduler.schedule(b"1", 30)
+        scheduler.schedule(b"2", 10)
+        scheduler.schedule(b"3", 20)
+        assert scheduler.next_due() == 10
+        assert scheduler.pop_due(25) == [b"2", b"3"]
+        assert scheduler.in_flight == {b"2", b"3"}
+        assert len(scheduler) == 1
+        assert scheduler.pop_due(25) == []
+
+    def test_reschedule_and_unschedule(self) -> None:
+        """Test that stale entries are skipped."""
+        scheduler = OrderScheduler()
+        scheduler.schedule(b"1", 10)
+        scheduler.schedule(b"2", 10)
+        scheduler.schedule(b"1", 50)
+        scheduler.unschedule(b"2")
+        assert b"2" not in scheduler
+        assert scheduler.next_due() == 50
+        assert scheduler.pop_due(40) == []
+        assert scheduler.pop_due(50) == [b"1"]
+
+    def test_complete(self) -> None:
+        """Test that completing a sweep clears the orders in flight."""
+        scheduler = OrderScheduler()
+        scheduler.schedule(b"1", 10)
+        scheduler.schedule(b"2", 10)
+        scheduler.pop_due(10)
+        scheduler.unschedule(b"2")
+        assert scheduler.complete() == [b"1"]
+        assert scheduler.in_flight == set()
+
+    def test_pop_due_in_chunks(self) -> None:
+        """Test that the due orders can be popped and completed a chunk at a time."""
+        scheduler = OrderScheduler()
+        for i in range(3):
+            scheduler.schedule(bytes([i]), i)
+        first = scheduler.pop_due(10, limit=2)
+        second = scheduler.pop_due(10, limit=2)
+        assert (first, second) == ([b"\x00", b"\x01"], [b"\x02"])
+        assert scheduler.complete(second + [b"\x09"]) == [b"\x02"]
+        assert scheduler.in_flight == {b"\x00", b"\x01"}
+        assert scheduler.stats() == {"orders": 0, "entries": 0, "in_flight": 2}
+
+    def test_stale_entries_are_compacted(self) -> None:
+        """Test that the heap is rebuilt once the stale entries outnumber the live ones."""
+        scheduler = OrderScheduler()
+        for i in range(100):
+            scheduler.schedule(bytes([i]), i)
+        for timestamp in range(100, 1000):
+            scheduler.schedule(b"\x00", timestamp)
+            assert scheduler.stale <= len(scheduler)
+        for i in range(1, 100):
+            scheduler.unschedule(bytes([i]))
+        assert len(scheduler) == 1
+        assert scheduler.stale <= 1
+        assert scheduler.next_due() == 999
+        assert scheduler.pop_due(999) == [b"\x00"]
+
+
+def test_backoff() -> None:
+    """Test that the polls of an order back off exponentially, up to a maximum."""
+    scheduler = OrderScheduler()
+    scheduler.schedule(b"1", 0)
+    assert [scheduler.backoff(b"1", 30, 100) for _ in range(4)] == [30, 60, 100, 100]
+    scheduler.reset_backoff(b"1")
+    assert scheduler.backoff(b"1", 30, 100) == 30
+    scheduler.unschedule(b"1")
+    assert scheduler.backoff(b"1", 30, 100) == 30
+
+
+def test_get_next_check_timestamp_unknown_handler() -> None:
+    """Test that the orders of unknown handlers are always due, even if their static input is a TWAP."""
+    order = _twap_order(t0=1000, n=4, t=100, span=0)
+    order.orderType = None
+    assert get_static_data(order) is None
+    assert get_next_check_timestamp(order, 500) == 500
+    assert get_end_timestamp(order) is None
+
+
+def test_order_expiries() -> None:
+    """Test that the orders are popped once their end has passed."""
+    expiries = OrderExpiries()
+    expiries.push(b"1", 100)
+    expiries.push(b"2", 200)
+    expiries.push(b"3", 300)
+    expiries.discard(b"3")
+    assert expiries.get(b"2") == 200
+    assert expiries.pop_expired(99) == []
+    assert expiries.pop_expired(200) == [b"1", b"2"]
+    assert len(expiries) == 0
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2023 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""This module contains tests for the sharding of the owners."""
+
+from packages.valory.skills.order_monitoring.sharding import OwnerSharding
+
+
+PARTICIPANTS = ["0x" + f"{i:02x}" * 20 for i in range(0xA0, 0xA4)]
+OWNERS = ["0x" + i.to_bytes(20, "big").hex() for i in range(1000)]
+
+
+def test_each_owner_has_a_single_agent() -> None:
+    """Test that every owner is checked by exactly one agent."""
+    shardings = [OwnerSharding(agent, PARTICIPANTS) for agent in PARTICIPANTS]
+    for owner in OWNERS:
+        assert sum(sharding.is_mine(owner) for sharding in shardings) == 1
+
+
+def test_assignment_is_balanced() -> None:
+    """Test that the owners are spread across the agents."""
+    sharding = OwnerSharding(PARTICIPANTS[0], PARTICIPANTS)
+    counts = {participant: 0 for participant in PARTICIPANTS}
+    for owner in OWNERS:
+        counts[sharding.get_participant(owner)] += 1
+    assert all(150 < count < 350 for count in counts.values())
+
+
+def test_assignment_is_consistent() -> None:
+    """Test that the assignment does not depend on the order or the case of the addresses."""
+    sharding = OwnerSharding(PARTICIPANTS[0], PARTICIPANTS)
+    other = OwnerSharding(
+        PARTICIPANTS[1],
+        [participant.upper() for participant in reversed(PARTICIPANTS)],
+    )
+    for owner in OWNERS:
+        assert sharding.get_participant(owner) == other.get_participant(owner.upper())
+
+
+def test_adding_an_agent_only_moves_its_owners() -> None:
+    """Test that adding an agent only moves owners to the new agent."""
+    sharding = OwnerSharding(PARTICIPANTS[0], PARTICIPANTS)
+    new_participant = "0x" + "ff" * 20
+    grown = OwnerSharding(PARTICIPANTS[0], PARTICIPANTS + [new_participant])
+    for owner in OWNERS:
+        participant = grown.get_participant(owner)
+        assert participant in (sharding.get_participant(owner), new_participant)
+
+
+def test_no_participants() -> None:
+    """Test that an agent without participants checks all the owners."""
+    sharding = OwnerSharding(PARTICIPANTS[0])
+    assert sharding.get_participant(OWNERS[0]) is None
+    assert sharding.is_mine(OWNERS[0])
+
+
+def test_dropped_agent_is_taken_over() -> None:
+    """Test that the owners of an agent that drops out are taken over by the others."""
+    sharding = OwnerSharding(PARTICIPANTS[0], PARTICIPANTS)
+    before = {owner: sharding.get_participant(owner) for owner in OWNERS}
+    assert sharding.set_participants(PARTICIPANTS[:-1])
+    assert not sharding.set_participants(list(reversed(PARTICIPANTS[:-1])))
+    for owner in OWNERS:
+        participant = sharding.get_participant(owner)
+        assert participant != PARTICIPANTS[-1]
+        if before[owner] != PARTICIPANTS[-1]:
+            assert participant == before[owner]
+
+
+def test_owner_cache_is_bounded() -> None:
+    """Test that the least recently used owners are evicted from the cache."""
+    sharding = OwnerSharding(PARTICIPANTS[0], PARTICIPANTS, max_cached_owners=10)
+    for owner in OWNERS[:20]:
+        sharding.get_participant(owner)
+    assert len(sharding._owners) == 10
+    assert list(sharding._owners) == [owner.lower() for owner in OWNERS[10:20]]
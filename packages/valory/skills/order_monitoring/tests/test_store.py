@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2023 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+# pylint: skip-file
+
+"""This module contains tests for the order store."""
+
+from pathlib import Path
+
+from packages.valory.skills.order_monitoring.order_utils import (
+    ConditionalOrder,
+    ConditionalOrderParamsStruct,
+    Proof,
+)
+from packages.valory.skills.order_monitoring.registry import OrderRegistry
+from packages.valory.skills.order_monitoring.store import OrderStore
+
+
+OWNER = "0x" + "33" * 20
+HANDLER = "0x" + "11" * 20
+
+
+def _order(id: bytes, with_proof: bool = False) -> ConditionalOrder:
+    """Get a dummy conditional order."""
+    return ConditionalOrder(
+        id=id,
+        params=ConditionalOrderParamsStruct(HANDLER, b"\x01" * 32, b"static"),
+        proof=Proof(b"\xaa" * 32, [b"\xbb" * 32, b"\xcc" * 32]) if with_proof else None,
+        orders={"0x01": 1} if with_proof else None,
+        composableCow="0x" + "22" * 20,
+        offchainInput=b"",
+    )
+
+
+class TestOrderStore:
+    """Test the OrderStore class."""
+
+    def test_commit_and_load(self, tmp_path: Path) -> None:
+        """Test that only the committed changes are loaded."""
+        path = str(tmp_path / "orders.db")
+        store = OrderStore(path)
+        store.put(OWNER, b"hash1", _order(b"1"))
+        store.put(OWNER, b"hash2", _order(b"2", with_proof=True))
+        assert store.pending == 2
+        assert list(store.load()) == []
+
+        store.commit()
+        assert store.pending == 0
+        loaded = list(store.load())
+        assert loaded == [
+            (OWNER, b"hash1", _order(b"1")),
+            (OWNER, b"hash2", _order(b"2", with_proof=True)),
+        ]
+        store.close()
+
+    def test_delete(self, tmp_path: Path) -> None:
+        """Test deleting orders."""
+        store = OrderStore(str(tmp_path / "orders.db"))
+        store.put(OWNER, b"hash1", _order(b"1"))
+        store.put(OWNER, b"hash2", _order(b"2"))
+        store.commit()
+        store.delete(b"1")
+        # deleting a staged order cancels its insertion
+        store.put(OWNER, b"hash3", _order(b"3"))
+        store.delete(b"3")
+        store.commit()
+        assert [order.id for _, _, order in store.load()] == [b"2"]
+        store.close()
+
+    def test_ready_orders(self, tmp_path: Path) -> None:
+        """Test persisting the ready orders."""
+        path = str(tmp_path / "orders.db")
+        store = OrderStore(path)
+        store.set_ready_orders([{"order_uid": "0x01"}, {"order_uid": "0x02"}])
+        store.close()
+
+        store = OrderStore(path)
+        assert store.load_ready_orders() == [
+            {"order_uid": "0x01"},
+            {"order_uid": "0x02"},
+        ]
+        store.set_ready_orders([])
+        store.commit()
+        assert store.load_ready_orders() == []
+        store.close()
+
+    def test_registry_write_through(self, tmp_path: Path) -> None:
+        """Test that a registry with a store writes its changes through."""
+        path = str(tmp_path / "orders.db")
+        registry = OrderRegistry(OrderStore(path))
+        registry.add(OWNER, b"hash1", _order(b"1", with_proof=True))
+        registry.add(OWNER, b"hash2", _order(b"2"))
+        registry.remove_by_id(b"2")
+        registry.store.close()
+
+        registry = OrderRegistry(OrderStore(path))
+        assert registry.load() == 1
+        assert registry.get_by_id(b"1") == _order(b"1", with_proof=True)
+        assert registry.roots(OWNER) == [b"\xaa" * 32]
+        # loading does not stage any write
+        assert registry.store.pending == 0
+        registry.store.close()
+
+    def test_start_timestamps(self, tmp_path: Path) -> None:
+        """Test that the start timestamps are persisted, and deleted with their orders."""
+        path = str(tmp_path / "orders.db")
+        registry = OrderRegistry(OrderStore(path))
+        registry.add(OWNER, b"hash1", _order(b"1"))
+        registry.add(OWNER, b"hash2", _order(b"2"))
+        registry.add(OWNER, b"hash3", _order(b"3"))
+        registry.set_start_timestamp(b"1", 100)
+        registry.set_start_timestamp(b"2", 200)
+        registry.set_start_timestamp(b"3", 300)
+        registry.store.commit()
+        registry.remove_by_id(b"2")
+        registry.invalidate_start_timestamp(b"3")
+        registry.store.close()
+
+        store = OrderStore(path)
+        assert store.load_start_timestamps() == {b"1": 100}
+        registry = OrderRegistry(store)
+        registry.load()
+        assert registry.get_start_timestamp(b"1") == 100
+        assert registry.get_start_timestamp(b"3") is None
+        store.close()
+
+    def test_checkpoint(self, tmp_path: Path) -> None:
+        """Test that the checkpoint is committed along with the orders."""
+        path = str(tmp_path / "orders.db")
+        store = OrderStore(path)
+        assert store.load_checkpoint() is None
+        store.put(OWNER, b"hash1", _order(b"1"))
+        store.set_checkpoint(10, "0x0a")
+        assert store.pending == 2
+        assert store.load_checkpoint() is None
+        store.commit()
+        store.set_checkpoint(11, "0x0b")
+        store.close()
+
+        store = OrderStore(path)
+        assert store.load_checkpoint() == (11, "0x0b")
+        assert len(list(store.load())) == 1
+        store.close()
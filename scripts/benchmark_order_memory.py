@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2023 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""
+This script benchmarks the memory used by the conditional orders of the order_monitoring skill.
+
+It compares the RSS per order of the slotted records kept in the `OrderRegistry`
+against the dataclasses previously used by the skill, held in the same indexes
+by owner and params hash and by id. Each representation is measured in a fresh
+interpreter.
+
+Usage (from the repository root):
+
+    python scripts/benchmark_order_memory.py --orders 100000 --owners 1000
+"""
+
+import argparse
+import gc
+import os
+import resource
+import subprocess  # nosec
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from uuid import uuid4
+
+
+ROOT_DIR = Path(__file__).parent.parent
+LEGACY = "legacy"
+COMPACT = "compact"
+STATIC_INPUT_SIZE = 320  # a TWAP static input is 10 abi-encoded words
+TWAP_HANDLER = "6cf1e9ca41f7611def408122793c358a3d11e5a5"
+COMPOSABLE_COW = "fdafc9d1902f4e0b84f65f49f244b32b31013b74"
+
+
+@dataclass
+class LegacyConditionalOrderParamsStruct:
+    """Conditional order params dataclass, as previously used by the skill."""
+
+    handler: str
+    salt: str
+    staticInput: str
+
+
+@dataclass
+class LegacyProof:
+    """Proof dataclass, as previously used by the skill."""
+
+    merkleRoot: str
+    path: List[str]
+
+
+@dataclass
+class LegacyConditionalOrder:
+    """Conditional order dataclass, as previously used by the skill."""
+
+    id: str
+    params: LegacyConditionalOrderParamsStruct
+    proof: Optional[LegacyProof]
+    orders: Dict[str, int]
+    composableCow: str
+    offchainInput: Optional[bytes]
+
+
+def _rss() -> int:
+    """Get the resident set size of the current process, in bytes."""
+    try:
+        with open("/proc/self/statm", encoding="utf-8") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:  # pragma: nocover
+        # not on linux, fall back to the peak rss
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return usage if sys.platform == "darwin" else usage * 1024
+
+
+def _events(n_orders: int, n_owners: int) -> List[Dict]:
+    """Get ConditionalOrderCreated-like events; strings are built per event, as when decoding logs."""
+    return [
+        {
+            "owner": f"0x{(i % n_owners).to_bytes(20, 'big').hex()}",
+            "params": {
+                "handler": f"0x{TWAP_HANDLER}",
+                "salt": os.urandom(32),
+                "staticInput": os.urandom(STATIC_INPUT_SIZE),
+            },
+            "composableCow": f"0x{COMPOSABLE_COW}",
+        }
+        for i in range(n_orders)
+    ]
+
+
+def _build_legacy(events: List[Dict]) -> object:
+    """Build the registry indexes with the dataclasses previously used by the skill."""
+    # pylint: disable=import-outside-toplevel
+    from packages.valory.skills.order_monitoring.order_utils import (
+        hash_conditional_order_params,
+    )
+
+    # the same indexes as the `OrderRegistry`, so that only the records differ
+    owners: Dict[str, Dict[bytes, LegacyConditionalOrder]] = {}
+    ids: Dict[str, Tuple[str, bytes]] = {}
+    for event in events:
+        owner, params = event["owner"], event["params"]
+        params_hash = hash_conditional_order_params(params)
+        order = LegacyConditionalOrder(
+            id=uuid4().hex,
+            params=LegacyConditionalOrderParamsStruct(
+                handler=params["handler"],
+                salt=params["salt"],
+                staticInput=params["staticInput"],
+            ),
+            proof=None,
+            orders={},
+            composableCow=event["composableCow"],
+            offchainInput=b"",
+        )
+        owners.setdefault(owner, {})[params_hash] = order
+        ids[order.id] = (owner, params_hash)
+    return owners, ids
+
+
+def _build_compact(events: List[Dict]) -> object:
+    """Build the registry using the compact records."""
+    # pylint: disable=import-outside-toplevel
+    from packages.valory.skills.order_monitoring.order_utils import (
+        ConditionalOrder,
+        ConditionalOrderParamsStruct,
+        get_conditional_order_id,
+        hash_conditional_order_params,
+    )
+    from packages.valory.skills.order_monitoring.registry import OrderRegistry
+
+    registry = OrderRegistry()
+    for event in events:
+        params = event["params"]
+        params_hash = hash_conditional_order_params(params)
+        registry.add(
+            event["owner"],
+            params_hash,
+            ConditionalOrder(
+                id=get_conditional_order_id(event["owner"], params_hash),
+                params=ConditionalOrderParamsStruct(
+                    handler=params["handler"],
+                    salt=params["salt"],
+                    staticInput=params["staticInput"],
+                ),
+                proof=None,
+                orders=None,
+                composableCow=event["composableCow"],
+                offchainInput=b"",
+            ),
+        )
+    return registry
+
+
+def measure(kind: str, n_orders: int, n_owners: int) -> float:
+    """Measure the rss per order of a representation, in the current process."""
+    builder = _build_legacy if kind == LEGACY else _build_compact
+    # warm up the imports and the allocator before taking the baseline
+    builder(_events(1, 1))
+    events = _events(n_orders, n_owners)
+    gc.collect()
+    before = _rss()
+    registry = builder(events)
+    # the events are what the ledger connection hands over, they are not retained
+    del events
+    gc.collect()
+    after = _rss()
+    assert registry is not None  # nosec
+    return (after - before) / n_orders
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", maxsplit=2)[1])
+    parser.add_argument("--orders", type=int, default=100_000)
+    parser.add_argument("--owners", type=int, default=1_000)
+    parser.add_argument("--child", choices=(LEGACY, COMPACT), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        print(measure(args.child, args.orders, args.owners))
+        return
+
+    results = {}
+    for kind in (LEGACY, COMPACT):
+        output = subprocess.check_output(  # nosec
+            [
+                sys.executable,
+                __file__,
+                "--child",
+                kind,
+                "--orders",
+                str(args.orders),
+                "--owners",
+                str(args.owners),
+            ],
+            cwd=ROOT_DIR,
+            env={
+                **os.environ,
+                "PYTHONPATH": os.pathsep.join(
+                    filter(None, [str(ROOT_DIR), os.environ.get("PYTHONPATH", "")])
+                ),
+            },
+        )
+        results[kind] = float(output.decode().strip().splitlines()[-1])
+
+    print(f"orders: {args.orders}, owners: {args.owners}")
+    for kind, per_order in results.items():
+        print(f"{kind:>8}: {per_order:8.1f} bytes/order")
+    saving = 1 - results[COMPACT] / results[LEGACY]
+    print(f"  saving: {saving:8.1%}")
+
+
+if __name__ == "__main__":
+    main()